@@ -4,6 +4,7 @@ from .users import router as users_router
 from .files import router as files_router
 from .tasks import router as tasks_router
 from .annotations import router as annotations_router
+from .changes import router as changes_router
 
 # 创建主路由
 api_router = APIRouter(prefix="/api")
@@ -13,4 +14,5 @@ api_router.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(users_router, prefix="/users", tags=["User Management"])
 api_router.include_router(files_router, prefix="/files", tags=["File Management"])
 api_router.include_router(tasks_router, prefix="/tasks", tags=["Task Management"])
-api_router.include_router(annotations_router, prefix="/annotations", tags=["Annotation"]) 
\ No newline at end of file
+api_router.include_router(annotations_router, prefix="/annotations", tags=["Annotation"])
+api_router.include_router(changes_router, prefix="/changes", tags=["Changes"])
@@ -1,8 +1,12 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import JSONResponse
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel
+from pydantic_core import from_json
+import hashlib
 import json
+import time
 
 from ..models.user import UserInDB, UserRole
 from ..models.annotation import (
@@ -12,12 +16,26 @@ from ..models.annotation import (
 from ..models.task import DocumentStatus
 from ..core.security import get_current_user
 from ..core.storage import StorageManager
+from ..core.change_log import ACTION_DELETED, ENTITY_ANNOTATION, get_change_log
 from ..core.annotation_validator import AnnotationValidator
+from ..core.json_pointer import parse_pointer, project
+from ..core.record_index import KIND_SINGLE, get_record_index_store
+from ..core.logger import get_logger
+from ..core.template_worker import get_template_worker_pool
+from ..config import settings
 
+logger = get_logger(__name__)
 router = APIRouter()
 storage = StorageManager()
 annotation_validator = AnnotationValidator()
 
+# 表单配置：任务的模板可能被切换（模板迁移），每次用ETag复验
+FORM_CONFIG_CACHE_CONTROL = "private, no-cache"
+# 模板JSON Schema：每次用ETag复验；请求中的版本号与当前模板哈希一致时内容永不改变
+SCHEMA_CACHE_CONTROL = "private, no-cache"
+SCHEMA_VERSIONED_CACHE_CONTROL = "private, max-age=31536000, immutable"
+JSON_SCHEMA_DIALECT = "https://json-schema.org/draft/2020-12/schema"
+
 
 class AnnotationValidationRequest(BaseModel):
     """标注数据验证请求 - 已注释，待重写"""
@@ -70,7 +88,10 @@ class DocumentContentResponse(BaseModel):
     """文档内容响应"""
     document_id: str
     content: Dict[str, Any]
-    formatted_content: str
+    formatted_content: Optional[str] = None  # include_formatted=false 时不返回
+    offset: int = 0  # 分页时本页第一条记录的序号
+    next_offset: Optional[int] = None  # 分页时下一页的offset，已到末尾时为None
+    total: Optional[int] = None  # 分页时的记录总数
 
 
 class FormFieldConfig(BaseModel):
@@ -170,9 +191,18 @@ async def get_task_documents(
 async def get_document_content(
     task_id: str,
     document_id: str,
+    offset: int = Query(0, ge=0, description="分页读取时的起始记录序号（上一页的 next_offset）"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页记录数，不指定时返回全部内容"),
+    include_formatted: bool = Query(True, description="是否返回格式化的 formatted_content"),
+    fields: Optional[List[str]] = Query(None, description="只返回这些字段（JSON Pointer，如 /text），可重复指定"),
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """获取文档内容 - 优先返回标注结果，如果没有则返回原始JSON文档内容"""
+    """获取文档内容 - 优先返回标注结果，如果没有则返回原始JSON文档内容
+
+    数组文档（JSON数组、JSONL）包装为 {"items": [...], "type": "array", "count": 总数}。
+    指定 limit（或 offset）时按记录分页，只读取、解析本页的记录；指定 fields 时每条记录（对象文档为整个文档）
+    只保留 {JSON Pointer: 值}，不存在的字段省略。
+    """
     # 检查任务权限
     task = storage.get_task_by_id(task_id)
     if not task:
@@ -200,27 +230,68 @@ async def get_document_content(
             detail="文档不存在"
         )
     
+    pointers = None
+    if fields:
+        try:
+            pointers = [(pointer, parse_pointer(pointer)) for pointer in fields]
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    
+    def build_response(content: Any, **page) -> DocumentContentResponse:
+        if isinstance(content, list):
+            items = [project(item, pointers) for item in content] if pointers else content
+            # 如果内容是数组，包装成对象
+            content = {"items": items, "type": "array", "count": page.get("total", len(items))}
+        elif pointers:
+            content = project(content, pointers)
+        return DocumentContentResponse(
+            document_id=document_id,
+            content=content,
+            # 格式化内容用于显示
+            formatted_content=json.dumps(content, ensure_ascii=False, indent=2) if include_formatted else None,
+            **page
+        )
+    
     # 优先尝试读取标注结果
     annotation_result_path = f"annotations/{task_id}/{document_id}.json"
+    
+    if limit is not None or offset:
+        # 分页读取：有标注结果时读取标注结果，否则读取原始文档
+        content_path = annotation_result_path
+        if not (storage.data_dir / content_path).exists():
+            content_path = document.file_path
+        if not (storage.data_dir / content_path).exists():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="文档文件不存在"
+            )
+        
+        record_index = get_record_index_store()
+        index = record_index.get_or_build(content_path)
+        records, total, has_more = record_index.read_records(content_path, offset, limit or 100)
+        try:
+            items = [from_json(record) for record in records]
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"文档格式错误: {str(e)}"
+            )
+        
+        if index["kind"] == KIND_SINGLE:
+            # 顶层不是数组的文档只有一条记录，不分页
+            return build_response(items[0] if items else {})
+        return build_response(items, offset=offset, total=total,
+                              next_offset=offset + len(items) if has_more else None)
+    
     result_content = storage.get_file_content(annotation_result_path)
     
     if result_content:
         # 找到标注结果，使用标注后的内容
         try:
-            content = json.loads(result_content)
-            
-            # 如果内容是数组，包装成对象
-            if isinstance(content, list):
-                content = {"items": content, "type": "array", "count": len(content)}
-            
-            # 格式化内容用于显示
-            formatted_content = json.dumps(content, ensure_ascii=False, indent=2)
-            
-            return DocumentContentResponse(
-                document_id=document_id,
-                content=content,
-                formatted_content=formatted_content
-            )
+            return build_response(json.loads(result_content))
         except json.JSONDecodeError as e:
             # 标注结果文件格式错误，继续尝试原始文档
             pass
@@ -235,20 +306,7 @@ async def get_document_content(
     
     try:
         # 解析JSON内容
-        content = json.loads(content_str)
-        
-        # 如果内容是数组，包装成对象
-        if isinstance(content, list):
-            content = {"items": content, "type": "array", "count": len(content)}
-        
-        # 格式化内容用于显示
-        formatted_content = json.dumps(content, ensure_ascii=False, indent=2)
-        
-        return DocumentContentResponse(
-            document_id=document_id,
-            content=content,
-            formatted_content=formatted_content
-        )
+        return build_response(json.loads(content_str))
     except json.JSONDecodeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -260,6 +318,8 @@ async def get_document_content(
 async def get_form_config(
     task_id: str,
     document_id: str,
+    request: Request,
+    response: Response,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """根据模板动态生成表单字段配置"""
@@ -298,21 +358,31 @@ async def get_form_config(
         )
     
     try:
-        # 使用简化版文档校验模块解析模板
-        from app.core.simple_document_validator import SimpleDocumentValidator
+        template_fields = task.template.fields or {}
+        template_hash = (task.template.validation_result or {}).get("template_hash")
         
-        # 构建完整的模板文件路径
-        template_full_path = storage.data_dir / task.template.file_path
-        
-        validator = SimpleDocumentValidator(str(template_full_path))
-        if not validator.main_model:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="模板文件无效"
-            )
+        if template_fields.get("annotation_fields") is not None:
+            # 使用任务创建时预先提取的模板结构，无需重新加载模板
+            annotation_schema = template_fields["annotation_fields"]
+            main_model_name = template_fields.get("main_model")
+        else:
+            # 旧任务没有保存模板结构，回退到（带缓存的）模板加载
+            template_full_path = storage.data_dir / task.template.file_path
+            template_info = annotation_validator.get_template_info(str(template_full_path))
+            if not template_info:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="模板文件无效"
+                )
+            annotation_schema = template_info["annotation_fields"]
+            main_model_name = template_info["schema_name"]
         
-        # 获取标注字段配置
-        annotation_schema = validator.get_annotation_schema()
+        # 模板文件及其内容不变时表单配置不变，以模板路径和内容哈希作为ETag
+        etag = f'"{template_hash}-{hashlib.sha256(task.template.file_path.encode()).hexdigest()[:8]}"' \
+            if template_hash else None
+        if etag and request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                            headers={"ETag": etag, "Cache-Control": FORM_CONFIG_CACHE_CONTROL})
         
         # 转换为前端表单配置格式
         fields = []
@@ -334,15 +404,21 @@ async def get_form_config(
         
         template_info = {
             "template_path": task.template.file_path,
-            "main_model": validator.main_model.__name__,
+            "main_model": main_model_name,
             "fields_count": len(fields)
         }
         
+        response.headers["Cache-Control"] = FORM_CONFIG_CACHE_CONTROL
+        if etag:
+            response.headers["ETag"] = etag
+        
         return FormConfigResponse(
             fields=fields,
             template_info=template_info
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -350,6 +426,65 @@ async def get_form_config(
         )
 
 
+@router.get("/{task_id}/schema", summary="获取模板JSON Schema")
+async def get_template_schema(
+    task_id: str,
+    request: Request,
+    version: Optional[str] = Query(None, description="模板版本（模板哈希），与当前版本一致时响应可永久缓存"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """返回任务模板主模型的JSON Schema及标注字段信息，供客户端在本地校验标注数据
+
+    以模板内容哈希作为版本和ETag，模板未变化时返回304。标注字段在Schema的属性中带有 is_annotation 标记，
+    annotation_fields 另外列出标注字段路径（列表元素用 name[] 表示）、类型、必填和约束。
+    """
+    task = storage.get_task_by_id(task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    if current_user.role == UserRole.ANNOTATOR and task.assignee_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问此任务"
+        )
+    
+    if not task.template or not task.template.file_path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务未配置模板"
+        )
+    
+    template_schema = annotation_validator.get_template_schema(str(storage.data_dir / task.template.file_path))
+    if not template_schema:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="模板文件无效"
+        )
+    
+    template_hash = template_schema["template_hash"]
+    etag = f'"{template_hash}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": SCHEMA_VERSIONED_CACHE_CONTROL if version == template_hash else SCHEMA_CACHE_CONTROL
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return JSONResponse(
+        content={
+            "template_path": task.template.file_path,
+            "template_hash": template_hash,
+            "main_model": template_schema["main_model"],
+            "json_schema": {"$schema": JSON_SCHEMA_DIALECT, **template_schema["json_schema"]},
+            "annotation_fields": template_schema["annotation_fields"]
+        },
+        headers=headers
+    )
+
+
 @router.get("/{task_id}/progress", response_model=TaskProgressResponse, summary="获取任务进度统计")
 async def get_task_progress(
     task_id: str,
@@ -468,20 +603,16 @@ async def save_annotation(
         annotation_data is not None and annotation_data):
         
         try:
-            print(f"[DEBUG] 开始校验标注数据，任务: {task_id}, 文档: {document_id}")
-            print(f"[DEBUG] 模板路径: {task.template.file_path}")
-            print(f"[DEBUG] 标注数据: {annotation_data}")
+            logger.debug("开始校验标注数据，任务: %s, 文档: %s, 模板: %s",
+                         task_id, document_id, task.template.file_path)
             
             full_template_path = storage.data_dir / task.template.file_path
-            print(f"[DEBUG] 完整模板路径: {full_template_path}")
             
             validation_result = annotation_validator.validate_annotation_data(
                 str(full_template_path), 
                 annotation_data
             )
             
-            print(f"[DEBUG] 校验结果: {validation_result}")
-            
             if not validation_result["valid"]:
                 error_response = {
                     "message": str(validation_result.get("error", "标注数据验证失败")),
@@ -509,10 +640,11 @@ async def save_annotation(
                         
                         error_response["raw_errors"] = serializable_raw_errors
                     except Exception as e:
-                        print(f"[WARNING] 无法序列化原始错误: {e}")
+                        logger.warning("无法序列化原始错误: %s", e)
                         error_response["raw_errors_note"] = "原始错误信息无法序列化"
                 
-                print(f"[DEBUG] 返回校验错误: {error_response}")
+                logger.debug("标注数据校验失败，任务: %s, 文档: %s, 错误数: %d",
+                             task_id, document_id, len(error_response["error_details"]))
                 
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -521,15 +653,12 @@ async def save_annotation(
             
             # 使用验证后的数据
             annotation_data = validation_result.get("validated_data", annotation_data)
-            print(f"[DEBUG] 校验通过，使用验证后的数据")
             
         except HTTPException:
             raise
         except Exception as e:
             error_msg = f"数据验证过程中发生错误: {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            import traceback
-            print(f"[ERROR] 异常堆栈: {traceback.format_exc()}")
+            logger.exception(error_msg)
             
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -539,7 +668,8 @@ async def save_annotation(
                 }
             )
     else:
-        print(f"[DEBUG] 跳过校验 - 模板: {task.template is not None}, 路径: {task.template.file_path if task.template else None}, 数据: {annotation_data is not None}")
+        logger.debug("跳过校验 - 任务: %s, 文档: %s, 模板: %s", task_id, document_id,
+                     task.template.file_path if task.template else None)
     
     # 获取或创建标注数据
     annotation = storage.get_annotation(task_id, document_id)
@@ -599,21 +729,13 @@ async def submit_annotation(
     # 如果任务有模板，进行提交前验证
     if task.template and task.template.file_path:
         try:
-            import sys
-            from pathlib import Path
-            
-            # 添加项目根目录到Python路径
-            project_root = Path(__file__).parent.parent.parent.parent
-            if str(project_root) not in sys.path:
-                sys.path.insert(0, str(project_root))
-            
-            from simple_document_validator import SimpleDocumentValidator
-            
             # 构建完整的模板文件路径
             template_full_path = storage.data_dir / task.template.file_path
             
-            validator = SimpleDocumentValidator(str(template_full_path))
-            validation_result = validator.validate_document(annotation_submit.annotation_data)
+            # 使用缓存的验证器，避免每次提交都重新加载模板
+            validation_result = annotation_validator.validate_annotation_data(
+                str(template_full_path), annotation_submit.annotation_data
+            )
             
             if not validation_result["valid"]:
                 raise HTTPException(
@@ -622,7 +744,7 @@ async def submit_annotation(
                 )
         except Exception as e:
             # 如果验证失败，记录错误但不阻止提交
-            print(f"模板验证失败: {str(e)}")
+            logger.warning("提交前模板验证失败: %s", str(e))
     
     # 获取或创建标注数据
     annotation = storage.get_annotation(task_id, document_id)
@@ -772,11 +894,59 @@ async def get_annotation_by_task_and_document(
     return annotation
 
 
-@router.post("/{task_id}/{document_id}", response_model=Annotation, summary="保存标注数据")
+# 原始JSON请求体的OpenAPI描述（这些接口直接读取请求体字节进行校验）
+RAW_ANNOTATION_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"type": "object", "additionalProperties": True}}}
+    }
+}
+
+
+def _validate_raw_annotation_body(task, raw_body: bytes) -> Dict[str, Any]:
+    """校验原始请求体并返回解析后的标注数据
+    
+    有模板时直接用pydantic-core从字节校验，通过后才解析为字典用于保存。
+    """
+    if task.template and task.template.file_path:
+        full_template_path = storage.data_dir / task.template.file_path
+        validation_result = annotation_validator.validate_annotation_json(
+            str(full_template_path),
+            raw_body
+        )
+        
+        if not validation_result["valid"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "message": "标注数据验证失败",
+                    "error": validation_result.get("error"),
+                    "error_details": validation_result.get("error_details")
+                }
+            )
+    
+    try:
+        annotation_data = json.loads(raw_body)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"请求体不是有效的JSON: {str(e)}"
+        )
+    
+    if not isinstance(annotation_data, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="标注数据必须是JSON对象"
+        )
+    return annotation_data
+
+
+@router.post("/{task_id}/{document_id}", response_model=Annotation, summary="保存标注数据",
+             openapi_extra=RAW_ANNOTATION_BODY)
 async def save_annotation_by_task_and_document(
     task_id: str,
     document_id: str,
-    annotation_data: Dict[str, Any],
+    request: Request,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """保存标注数据"""
@@ -789,26 +959,8 @@ async def save_annotation_by_task_and_document(
                 detail="任务不存在"
             )
         
-        # 如果任务有模板，验证数据
-        if task.template and task.template.file_path:
-            full_template_path = storage.data_dir / task.template.file_path
-            validation_result = annotation_validator.validate_annotation_data(
-                str(full_template_path), 
-                annotation_data
-            )
-            
-            if not validation_result["valid"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail={
-                        "message": "标注数据验证失败",
-                        "error": validation_result.get("error"),
-                        "error_details": validation_result.get("error_details")
-                    }
-                )
-            
-            # 使用验证后的数据
-            annotation_data = validation_result.get("validated_data", annotation_data)
+        # 如果任务有模板，直接从请求体字节验证数据
+        annotation_data = _validate_raw_annotation_body(task, await request.body())
         
         # 创建或更新标注
         annotation = Annotation(
@@ -830,11 +982,12 @@ async def save_annotation_by_task_and_document(
         )
 
 
-@router.put("/{task_id}/{document_id}", response_model=Annotation, summary="更新标注数据")
+@router.put("/{task_id}/{document_id}", response_model=Annotation, summary="更新标注数据",
+            openapi_extra=RAW_ANNOTATION_BODY)
 async def update_annotation_by_task_and_document(
     task_id: str,
     document_id: str,
-    annotation_data: Dict[str, Any],
+    request: Request,
     current_user: UserInDB = Depends(get_current_user)
 ):
     """更新标注数据"""
@@ -863,26 +1016,8 @@ async def update_annotation_by_task_and_document(
                 detail="任务不存在"
             )
         
-        # 如果任务有模板，验证数据
-        if task.template and task.template.file_path:
-            full_template_path = storage.data_dir / task.template.file_path
-            validation_result = annotation_validator.validate_annotation_data(
-                str(full_template_path), 
-                annotation_data
-            )
-            
-            if not validation_result["valid"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail={
-                        "message": "标注数据验证失败",
-                        "error": validation_result.get("error"),
-                        "error_details": validation_result.get("error_details")
-                    }
-                )
-            
-            # 使用验证后的数据
-            annotation_data = validation_result.get("validated_data", annotation_data)
+        # 如果任务有模板，直接从请求体字节验证数据
+        annotation_data = _validate_raw_annotation_body(task, await request.body())
         
         # 更新标注数据
         existing_annotation.annotation_data = annotation_data
@@ -926,6 +1061,7 @@ async def delete_annotation_by_task_and_document(
         annotation_file = storage.data_dir / "tasks" / task_id / "annotations" / f"{document_id}.json"
         if annotation_file.exists():
             annotation_file.unlink()
+            get_change_log().record(ENTITY_ANNOTATION, ACTION_DELETED, task_id, [document_id])
         
         return {"message": "标注数据删除成功"}
         
@@ -935,4 +1071,39 @@ async def delete_annotation_by_task_and_document(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除标注数据失败: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+
+def prewarm_templates() -> Dict[str, int]:
+    """预热最近更新的任务所使用的模板（启动后在后台线程中执行）
+
+    启用模板工作进程时在工作进程中加载模板，只生成模板产物缓存（字节码、元数据），不在API进程中执行模板；
+    否则加载模板到验证器缓存。首次打开任务时不必再编译模板，只需要模板结构时不必执行模板。
+    数量不超过验证器缓存的容量，避免预热时互相淘汰。
+    """
+    started = time.monotonic()
+    tasks = sorted(storage.get_all_tasks(), key=lambda task: task.updated_at or task.created_at, reverse=True)
+    template_paths = []
+    for task in tasks:
+        if task.template and task.template.file_path and task.template.file_path not in template_paths:
+            template_paths.append(task.template.file_path)
+    template_paths = template_paths[:max(0, annotation_validator.max_entries)]
+    
+    loaded = 0
+    for template_path in template_paths:
+        template_full_path = str(storage.data_dir / template_path)
+        if settings.template_worker_enabled:
+            try:
+                result = get_template_worker_pool().load_template(
+                    template_full_path, timeout=settings.template_worker_timeout
+                )
+            except Exception as e:
+                logger.warning("模板预热失败: %s，%s", template_path, str(e))
+                continue
+            if result.get("valid"):
+                loaded += 1
+        elif annotation_validator.preload(template_full_path):
+            loaded += 1
+    
+    logger.info("模板预热完成: %d/%d 个模板，耗时 %.2f 秒", loaded, len(template_paths), time.monotonic() - started)
+    return {"templates": len(template_paths), "loaded": loaded}
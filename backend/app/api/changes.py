@@ -0,0 +1,57 @@
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from ..models.user import UserInDB, UserRole
+from ..core.change_log import ENTITY_ANNOTATION, ENTITY_DOCUMENT, ENTITY_TASK, get_change_log
+from ..core.security import get_current_user
+from ..core.storage import StorageManager
+
+router = APIRouter()
+storage = StorageManager()
+
+# 长轮询的最长等待时间（秒）
+MAX_WAIT_SECONDS = 60
+
+
+@router.get("", summary="获取数据变更记录")
+async def get_changes(
+    after: int = Query(0, ge=0, description="游标：只返回序号大于它的变更"),
+    limit: int = Query(100, ge=1, le=1000, description="每页数量"),
+    wait: float = Query(0, ge=0, le=MAX_WAIT_SECONDS, description="没有新变更时最多等待的秒数（长轮询）"),
+    entity: Optional[str] = Query(None, pattern=f"^({ENTITY_TASK}|{ENTITY_DOCUMENT}|{ENTITY_ANNOTATION})$",
+                                  description="只返回某类数据的变更"),
+    task_id: Optional[str] = Query(None, description="只返回某个任务的变更"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """按序号顺序分页返回任务、文档、标注数据的变更记录
+
+    以上次返回的 next_cursor 作为 after 继续读取；has_more 为false时已读到最新。
+    wait>0 且没有新变更时，请求会保持到有新变更或超时，超时返回空列表和原游标。
+    非管理员只能看到自己创建或被分配的任务的变更（已删除任务的变更不返回）。
+    """
+    allowed_task_ids = None
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        allowed_task_ids = {
+            task.id for task in storage.get_all_tasks()
+            if current_user.id in (task.assignee_id, task.creator_id)
+        }
+
+    def accept(entry) -> bool:
+        if entity and entry["entity"] != entity:
+            return False
+        if task_id and entry["task_id"] != task_id:
+            return False
+        return allowed_task_ids is None or entry["task_id"] in allowed_task_ids
+
+    change_log = get_change_log()
+    deadline = time.monotonic() + wait
+    while True:
+        page = change_log.read(after, limit, accept)
+        remaining = deadline - time.monotonic()
+        if page["changes"] or page["has_more"] or remaining <= 0:
+            return page
+        # 本页的记录都被过滤掉时从新游标处继续等待
+        after = page["next_cursor"]
+        await change_log.wait_for_changes(after, remaining)
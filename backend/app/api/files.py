@@ -1,27 +1,39 @@
 import os
 import uuid
-import shutil
+import asyncio
+import threading
 import json
 import mimetypes
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic_core import from_json, to_json
 
 from ..models.user import UserInDB, UserRole
 from ..models.file import (
     FileInfo, FileUpload, FilePreview, FileType, FileListResponse,
     FileDeleteResponse, TemplateValidationResponse, BatchFileUpload,
-    FileDownloadInfo
+    FileDownloadInfo, PreviewUnit, ChunkedUploadCreate, ChunkedUploadStatus, BatchFileUploadResult
 )
 from ..core.security import get_current_user
 from ..core.storage import StorageManager
+from ..core.chunked_upload import IncomingFile, UploadError, get_upload_manager
+from ..core.http_range import ranged_file_response
+from ..core.record_index import get_record_index_store
+from ..core.zip_stream import iter_zip
 from ..config import settings
 
 router = APIRouter()
 storage = StorageManager()
 
+# 普通上传时每次从请求中读取的大小
+UPLOAD_READ_SIZE = 1024 * 1024
+# 移动上传文件到文件库目录时检查重名
+_placement_lock = threading.Lock()
+
 
 def check_file_permissions(current_user: UserInDB, file_info: FileInfo = None, operation: str = "read"):
     """检查文件操作权限"""
@@ -66,28 +78,14 @@ async def get_files(
         )
 
 
-@router.post("/upload", response_model=FileUpload, summary="上传文件")
-async def upload_file(
-    file: UploadFile = File(...),
-    file_type: FileType = Form(..., description="文件类型"),
-    current_user: UserInDB = Depends(get_current_user)
-):
-    """上传单个文件"""
-    if not check_file_permissions(current_user, operation="upload"):
+def _check_upload_filename(filename: str, file_type: FileType):
+    """检查文件名和扩展名是否允许上传"""
+    if not filename or Path(filename).name != filename:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="没有上传权限"
-        )
-    
-    # 检查文件大小
-    if file.size and file.size > settings.max_file_size:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"文件大小超过限制 ({settings.max_file_size // (1024*1024)}MB)"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"文件名无效: {filename}"
         )
-    
-    # 检查文件扩展名
-    file_ext = Path(file.filename).suffix.lower()
+    file_ext = Path(filename).suffix.lower()
     if file_type == FileType.DOCUMENT:
         allowed_exts = settings.allowed_document_extensions
     elif file_type == FileType.TEMPLATE:
@@ -100,11 +98,14 @@ async def upload_file(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"不支持的文件类型: {file_ext}，允许的类型: {', '.join(allowed_exts)}"
         )
-    
+
+
+def _place_uploaded_file(incoming: IncomingFile, file_type: FileType, current_user: UserInDB) -> FileInfo:
+    """把接收完毕的文件移到文件库目录，验证模板，保存记录索引，返回文件信息（不写入元数据）"""
     # 生成文件ID和路径
     file_id = f"file_{uuid.uuid4().hex[:8]}"
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    safe_filename = f"{timestamp}_{file.filename}"
+    safe_filename = f"{timestamp}_{incoming.filename}"
     
     # 确定保存路径
     if file_type == FileType.DOCUMENT:
@@ -115,24 +116,16 @@ async def upload_file(
         save_dir = Path(settings.data_dir) / "public_files" / "exports"
     
     save_dir.mkdir(parents=True, exist_ok=True)
-    file_path = save_dir / safe_filename
-    
-    # 保存文件
-    try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"文件保存失败: {str(e)}"
-        )
-    
-    # 获取文件大小
-    file_size = file_path.stat().st_size
+    with _placement_lock:
+        # 同一秒内上传同名文件时加上文件ID，避免覆盖
+        file_path = save_dir / safe_filename
+        if file_path.exists():
+            file_path = save_dir / f"{timestamp}_{file_id}_{incoming.filename}"
+        os.replace(incoming.path, file_path)
+    relative_path = str(file_path.relative_to(Path(settings.data_dir)))
     
     # 如果是模板文件，进行验证
     if file_type == FileType.TEMPLATE:
-        relative_path = str(file_path.relative_to(Path(settings.data_dir)))
         validation_result = storage.validate_python_template(relative_path)
         if not validation_result["valid"]:
             # 删除无效文件
@@ -142,67 +135,269 @@ async def upload_file(
                 detail=f"模板文件验证失败: {validation_result['error']}"
             )
     
-    # 保存文件信息到元数据
-    relative_path = str(file_path.relative_to(Path(settings.data_dir)))
-    file_info = FileInfo(
+    if incoming.scanner:
+        # 接收时已扫描出记录边界，直接保存记录索引
+        get_record_index_store().save(relative_path, incoming.scanner)
+    
+    return FileInfo(
         id=file_id,
-        filename=file.filename,
+        filename=incoming.filename,
         file_path=relative_path,
         file_type=file_type,
-        file_size=file_size,
+        file_size=incoming.size,
         uploader_id=current_user.id,
         uploaded_at=datetime.now()
     )
-    
-    storage.save_file_info(file_info)
-    
+
+
+def _upload_response(file_info: FileInfo) -> FileUpload:
     return FileUpload(
-        file_id=file_id,
-        filename=file.filename,
-        file_path=relative_path,
-        file_size=file_size,
-        file_type=file_type,
+        file_id=file_info.id,
+        filename=file_info.filename,
+        file_path=file_info.file_path,
+        file_size=file_info.file_size,
+        file_type=file_info.file_type,
         message="文件上传成功"
     )
 
 
+def _store_uploaded_file(incoming: IncomingFile, file_type: FileType, current_user: UserInDB) -> FileUpload:
+    """保存接收完毕的文件，并将文件信息写入元数据"""
+    file_info = _place_uploaded_file(incoming, file_type, current_user)
+    storage.save_file_info(file_info)
+    return _upload_response(file_info)
+
+
+async def _receive_upload(file: UploadFile, file_type: FileType) -> IncomingFile:
+    """把上传的文件写入临时文件，写入和内容检查在线程池中执行
+
+    边写入边检查大小（不依赖客户端声明的大小），文档文件同时检查每条记录的JSON语法、扫描记录边界。
+    """
+    # 检查文件大小
+    if file.size and file.size > settings.max_file_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"文件大小超过限制 ({settings.max_file_size // (1024*1024)}MB)"
+        )
+    
+    # 检查文件扩展名
+    _check_upload_filename(file.filename, file_type)
+    
+    # 先写入临时文件，检查通过后再移到文件库目录
+    temp_dir = Path(settings.data_dir) / "uploads"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    incoming = IncomingFile(temp_dir / f"{uuid.uuid4().hex}.part", file.filename,
+                            file_type == FileType.DOCUMENT, settings.max_file_size)
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_READ_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(incoming.write, chunk)
+        await run_in_threadpool(incoming.finish)
+    except UploadError as e:
+        incoming.path.unlink(missing_ok=True)
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except Exception as e:
+        incoming.path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"文件保存失败: {str(e)}"
+        )
+    return incoming
+
+
+@router.post("/upload", response_model=FileUpload, summary="上传文件")
+async def upload_file(
+    file: UploadFile = File(...),
+    file_type: FileType = Form(..., description="文件类型"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """上传单个文件"""
+    if not check_file_permissions(current_user, operation="upload"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="没有上传权限"
+        )
+    
+    incoming = await _receive_upload(file, file_type)
+    return await run_in_threadpool(_store_uploaded_file, incoming, file_type, current_user)
+
+
+async def _get_upload_session(upload_id: str, current_user: UserInDB):
+    """获取当前用户的分片上传会话（管理员可访问所有会话）
+
+    服务重启后首次访问会话时需要重新读取已接收的内容，在线程池中执行。
+    """
+    owner_id = None if current_user.role in [UserRole.SUPER_ADMIN, UserRole.ADMIN] else current_user.id
+    try:
+        return await run_in_threadpool(get_upload_manager().get, upload_id, owner_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@router.post("/uploads", response_model=ChunkedUploadStatus, status_code=status.HTTP_201_CREATED,
+             summary="创建分片上传")
+async def create_chunked_upload(
+    upload_request: ChunkedUploadCreate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """创建分片上传会话，之后按顺序 PUT /uploads/{upload_id}?offset=... 上传各分片，最后 POST .../complete
+
+    每个分片不超过返回的 chunk_size；sha256 为整个文件的校验和（可选），完成上传时核对。
+    """
+    if not check_file_permissions(current_user, operation="upload"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="没有上传权限"
+        )
+    _check_upload_filename(upload_request.filename, upload_request.file_type)
+    
+    upload_manager = get_upload_manager()
+    try:
+        session = await run_in_threadpool(
+            upload_manager.create, current_user.id, upload_request.filename, upload_request.file_type.value,
+            upload_request.total_size, upload_request.file_type == FileType.DOCUMENT, upload_request.sha256
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    return upload_manager.status(session)
+
+
+@router.get("/uploads/{upload_id}", response_model=ChunkedUploadStatus, summary="查询分片上传进度")
+async def get_chunked_upload(
+    upload_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """查询已接收的字节数，连接中断后从 received 处继续上传"""
+    session = await _get_upload_session(upload_id, current_user)
+    return get_upload_manager().status(session)
+
+
+@router.put("/uploads/{upload_id}", response_model=ChunkedUploadStatus, summary="上传分片")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="分片在文件中的起始字节位置"),
+    x_chunk_sha256: Optional[str] = Header(None, description="分片内容的SHA-256（十六进制），不一致时拒绝该分片"),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """上传从 offset 开始的一个分片（请求体为分片的原始内容）
+
+    分片必须连续：offset 大于已接收的字节数时返回409；与已接收部分重叠时只写入未接收的部分。
+    文档文件的记录JSON语法错误时返回400，上传会话不能继续。
+    """
+    session = await _get_upload_session(upload_id, current_user)
+    upload_manager = get_upload_manager()
+    total_size = session.meta["total_size"]
+    
+    # 接收请求体时检查大小，不等整个分片到达
+    data = bytearray()
+    async for part in request.stream():
+        data += part
+        if len(data) > upload_manager.chunk_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"分片大小超过限制 ({upload_manager.chunk_size // (1024*1024)}MB)"
+            )
+        if offset + len(data) > total_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="分片超出文件总大小"
+            )
+    
+    # 校验和、记录检查和写入在线程池中执行，持有会话锁直到完成
+    async with session.lock:
+        try:
+            await run_in_threadpool(upload_manager.append, session, offset, bytes(data), x_chunk_sha256)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        return upload_manager.status(session)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=FileUpload, summary="完成分片上传")
+async def complete_chunked_upload(
+    upload_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """所有分片上传完毕后保存文件（接收分片时已完成检查和索引，这里只移动文件、保存文件信息）"""
+    session = await _get_upload_session(upload_id, current_user)
+    upload_manager = get_upload_manager()
+    async with session.lock:
+        try:
+            incoming = await run_in_threadpool(upload_manager.complete, session)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        try:
+            result = await run_in_threadpool(_store_uploaded_file, incoming, FileType(session.meta["file_type"]),
+                                             current_user)
+        finally:
+            await run_in_threadpool(upload_manager.discard, upload_id)
+    return result
+
+
+@router.delete("/uploads/{upload_id}", summary="取消分片上传")
+async def cancel_chunked_upload(
+    upload_id: str,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """取消上传，删除已接收的内容"""
+    await _get_upload_session(upload_id, current_user)
+    await run_in_threadpool(get_upload_manager().discard, upload_id)
+    return {"upload_id": upload_id, "message": "上传已取消"}
+
+
 @router.post("/upload/batch", response_model=BatchFileUpload, summary="批量上传文件")
 async def upload_files_batch(
     files: List[UploadFile] = File(...),
     file_type: FileType = Form(..., description="文件类型"),
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """批量上传文件"""
+    """批量上传文件
+
+    最多同时处理 batch_upload_concurrency 个文件（写入、内容检查、模板验证在线程池中执行），
+    全部处理完后一次性写入所有成功文件的信息；results 按提交顺序给出每个文件的结果。
+    """
     if not check_file_permissions(current_user, operation="upload"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="没有上传权限"
         )
     
+    semaphore = asyncio.Semaphore(max(1, settings.batch_upload_concurrency))
+    
+    async def process(file: UploadFile) -> FileInfo:
+        async with semaphore:
+            incoming = await _receive_upload(file, file_type)
+            return await run_in_threadpool(_place_uploaded_file, incoming, file_type, current_user)
+    
+    outcomes = await asyncio.gather(*(process(file) for file in files), return_exceptions=True)
+    
+    file_infos = [outcome for outcome in outcomes if isinstance(outcome, FileInfo)]
+    if file_infos:
+        await run_in_threadpool(storage.save_file_infos, file_infos)
+    
     successful_uploads = []
     failed_uploads = []
-    
-    for file in files:
-        try:
-            # 重用单文件上传逻辑
-            result = await upload_file(file, file_type, current_user)
-            successful_uploads.append(result)
-        except HTTPException as e:
-            failed_uploads.append({
-                "filename": file.filename,
-                "error": e.detail
-            })
-        except Exception as e:
-            failed_uploads.append({
-                "filename": file.filename,
-                "error": str(e)
-            })
+    results = []
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, FileInfo):
+            successful_uploads.append(_upload_response(outcome))
+            results.append(BatchFileUploadResult(filename=file.filename, success=True, file_id=outcome.id))
+            continue
+        error = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+        failed_uploads.append({
+            "filename": file.filename,
+            "error": error
+        })
+        results.append(BatchFileUploadResult(filename=file.filename, success=False, error=error))
     
     return BatchFileUpload(
         successful_uploads=successful_uploads,
         failed_uploads=failed_uploads,
         total_uploaded=len(successful_uploads),
-        total_failed=len(failed_uploads)
+        total_failed=len(failed_uploads),
+        results=results
     )
 
 
@@ -253,9 +448,10 @@ async def delete_file(
 @router.get("/{file_id}/download", summary="下载文件")
 async def download_file(
     file_id: str,
+    request: Request,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """下载文件"""
+    """下载文件，支持断点续传（Range / If-Range）和缓存验证（ETag / Last-Modified）"""
     if not check_file_permissions(current_user, operation="download"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -283,11 +479,7 @@ async def download_file(
     if content_type is None:
         content_type = "application/octet-stream"
     
-    return FileResponse(
-        path=str(file_path),
-        filename=file_info.filename,
-        media_type=content_type
-    )
+    return ranged_file_response(request, file_path, content_type, file_info.filename)
 
 
 @router.get("/download/batch", summary="批量下载文件")
@@ -302,38 +494,73 @@ async def download_files_batch(
             detail="没有下载权限"
         )
     
-    import zipfile
-    import io
-    
     file_id_list = [fid.strip() for fid in file_ids.split(",")]
     
-    # 创建内存中的ZIP文件
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for file_id in file_id_list:
-            file_info = storage.get_file_by_id(file_id)
-            if file_info:
-                file_path = Path(settings.data_dir) / file_info.file_path
-                if file_path.exists():
-                    zip_file.write(file_path, file_info.filename)
-    
-    zip_buffer.seek(0)
+    # 先确定要打包的文件，压缩包内容边读取边压缩边发送
+    files = []
+    for file_id in file_id_list:
+        file_info = storage.get_file_by_id(file_id)
+        if file_info:
+            file_path = Path(settings.data_dir) / file_info.file_path
+            if file_path.exists():
+                files.append((file_path, file_info.filename))
     
     return StreamingResponse(
-        io.BytesIO(zip_buffer.read()),
+        iter_zip(files),
         media_type="application/zip",
         headers={"Content-Disposition": "attachment; filename=files.zip"}
     )
 
 
+def _read_preview_window(file_path: Path, offset: int, size: int) -> Tuple[str, int, Optional[int]]:
+    """读取从 offset 开始最多 size 字节的内容，返回 (文本, 实际字节数, 下一页起始位置)"""
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read(size)
+        at_end = not f.read(1)
+    
+    if not at_end:
+        # 在最后一个换行处截断，保证JSONL的每一行完整；没有换行时去掉末尾不完整的UTF-8字符
+        newline = data.rfind(b"\n")
+        if newline >= 0:
+            data = data[:newline + 1]
+        else:
+            for cut in range(len(data), max(len(data) - 4, 0), -1):
+                try:
+                    data[:cut].decode('utf-8')
+                    data = data[:cut]
+                    break
+                except UnicodeDecodeError:
+                    continue
+    return data.decode('utf-8', errors='replace'), len(data), None if at_end else offset + len(data)
+
+
+def _compact_record(record: bytes) -> str:
+    """记录转为单行文本，跨行的JSON数组元素重新序列化为紧凑格式"""
+    if b"\n" in record:
+        try:
+            record = to_json(from_json(record))
+        except ValueError:
+            record = b" ".join(line.strip() for line in record.splitlines())
+    return record.decode('utf-8', errors='replace')
+
+
 @router.get("/{file_id}/preview", response_model=FilePreview, summary="预览文件")
 async def preview_file(
     file_id: str,
-    max_size: int = Query(1024*1024, description="最大预览大小（字节）"),
+    max_size: int = Query(1024*1024, ge=1, description="最大预览大小（字节），也是按字节分页预览时每页的大小"),
+    offset: Optional[int] = Query(None, ge=0, description="分页预览的起始位置（上一页的 next_offset）"),
+    unit: PreviewUnit = Query(PreviewUnit.BYTES, description="分页单位：bytes按字节，records按记录（仅JSON/JSONL）"),
+    limit: int = Query(100, ge=1, le=1000, description="按记录预览时每页的记录数"),
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """预览文件内容"""
+    """预览文件内容
+
+    unit=records 时返回第 offset 条起的 limit 条记录，每条一行（紧凑JSON）；有记录索引时从最近的检查点开始读取，
+    否则从文件开头逐条扫描，只读取到本页末尾。
+    按字节预览时，文件不超过 max_size 且未指定 offset 时返回完整内容（JSON格式化）；否则按字节分页返回原始内容，
+    每页在最后一个换行处截断（没有换行时在完整字符处截断），用 next_offset 继续读取。
+    """
     if not check_file_permissions(current_user, operation="read"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -348,11 +575,51 @@ async def preview_file(
             detail="文件不存在"
         )
     
-    # 检查文件大小
-    if file_info.file_size > max_size:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"文件过大，无法预览（最大{max_size//1024}KB）"
+    # 确定文件类型
+    file_ext = Path(file_info.filename).suffix.lower()
+    if file_ext in [".json", ".jsonl"]:
+        file_type = "json"
+    elif file_ext == ".py":
+        file_type = "python"
+    else:
+        file_type = "text"
+    
+    file_path = Path(settings.data_dir) / file_info.file_path
+    if unit == PreviewUnit.RECORDS:
+        if file_type != "json":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="只有JSON/JSONL文件支持按记录预览"
+            )
+        if not file_path.exists():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="无法读取文件内容"
+            )
+        records, total, has_more = get_record_index_store().read_records(file_info.file_path, offset or 0, limit)
+        return FilePreview(
+            filename=file_info.filename,
+            content="\n".join(_compact_record(record) for record in records),
+            file_type=file_type,
+            file_size=file_path.stat().st_size,
+            unit=unit,
+            offset=offset or 0,
+            length=len(records),
+            next_offset=(offset or 0) + len(records) if has_more else None,
+            total_records=total
+        )
+    
+    # 大文件或指定了起始位置时分页预览
+    if file_path.exists() and (offset is not None or file_path.stat().st_size > max_size):
+        content, length, next_offset = _read_preview_window(file_path, offset or 0, max_size)
+        return FilePreview(
+            filename=file_info.filename,
+            content=content,
+            file_type=file_type,
+            file_size=file_path.stat().st_size,
+            offset=offset or 0,
+            length=length,
+            next_offset=next_offset
         )
     
     # 读取文件内容
@@ -363,10 +630,7 @@ async def preview_file(
             detail="无法读取文件内容"
         )
     
-    # 确定文件类型
-    file_ext = Path(file_info.filename).suffix.lower()
-    if file_ext in [".json", ".jsonl"]:
-        file_type = "json"
+    if file_type == "json":
         # 尝试格式化JSON
         try:
             if file_ext == ".json":
@@ -382,16 +646,13 @@ async def preview_file(
                 content = '\n'.join(formatted_lines)
         except json.JSONDecodeError:
             pass  # 保持原始内容
-    elif file_ext == ".py":
-        file_type = "python"
-    else:
-        file_type = "text"
     
     return FilePreview(
         filename=file_info.filename,
         content=content,
         file_type=file_type,
-        file_size=file_info.file_size
+        file_size=file_info.file_size,
+        length=file_info.file_size
     )
 
 
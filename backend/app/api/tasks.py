@@ -1,18 +1,66 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import itertools
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Callable, List, Optional, Dict, Any, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status, Query
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from pydantic_core import to_json
 
 from ..models.user import UserInDB, UserRole
 from ..models.task import (
     Task, TaskCreate, TaskUpdate, TaskQuery, TaskListResponse, 
-    TaskStatistics, TaskStatus, DocumentStatus
+    TaskStatistics, TaskStatus, DocumentStatus, ValidationJobInfo, RevalidationRequest,
+    MigrationPlanRequest, MigrationJobRequest, ExportFormat, ExportRequest, BatchExportRequest
 )
 from ..models.file import FileType
+from ..config import settings
 from ..core.security import get_current_user
 from ..core.storage import StorageManager
 from ..core.simple_document_validator import SimpleDocumentValidator
+from ..core.template_worker import get_template_worker_pool
+from ..core.http_range import ranged_file_response
+from ..core.logger import get_logger
+from ..core.annotation_revalidation import (
+    STATUS_FAILED, STATUS_PASSED, STATUS_EMPTY, validate_annotation_files
+)
+from ..core.task_export import (
+    gzip_chunks, iter_task_jsonl, iter_task_table, load_export_metadata, new_export_id, save_export_metadata,
+    table_field_paths, write_export_file
+)
+from ..core.change_log import (
+    ACTION_DELETED, ACTION_MIGRATED, ENTITY_ANNOTATION, ENTITY_TASK, get_change_log, parse_watermark
+)
+from ..core.template_migration import (
+    MAX_FAILURES, compute_plan_id, diff_schemas, migrate_annotation_files, validate_operations
+)
+from ..core.validation_report import ValidationReport, load_report_summary, prune_reports, report_paths
+from ..core.validation_jobs import (
+    ValidationJob, ValidationJobManager, ValidationJobCancelled, ValidationJobError
+)
 
+logger = get_logger(__name__)
 router = APIRouter()
 storage = StorageManager()
+validation_jobs = ValidationJobManager(
+    max_workers=settings.validation_job_max_concurrency,
+    retention_seconds=settings.validation_job_retention_seconds
+)
+
+# 文档校验错误报告的存放目录
+REPORTS_DIR = storage.data_dir / "validation_reports"
+# 进度推送（SSE）：断线后浏览器重连的间隔（毫秒）与每次读取的变更数
+SSE_RETRY_MS = 3000
+SSE_PAGE_SIZE = 500
+
+# 任务导出文件的存放目录
+EXPORTS_DIR = storage.data_dir / "public_files" / "exports"
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.JSONL: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.TSV: "text/tab-separated-values"
+}
 
 
 @router.get("/", response_model=TaskListResponse, summary="获取任务列表")
@@ -51,14 +99,88 @@ async def get_task_statistics(current_user: UserInDB = Depends(get_current_user)
     return storage.get_task_statistics(current_user.id)
 
 
-@router.post("/", response_model=Task, summary="创建任务")
-async def create_task(
-    task_create: TaskCreate,
+def _sse_event(event: str, event_id: int, data: Any) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), to_json(data))
+
+
+def _task_snapshot(task: Task) -> Dict[str, Any]:
+    return {"task_id": task.id, "status": task.status.value, "progress": task.progress.model_dump()}
+
+
+def _parse_last_event_id(last_event_id: Optional[str]) -> Optional[int]:
+    """解析 Last-Event-ID（变更序号），没有或格式错误时返回None"""
+    if last_event_id and last_event_id.strip().isdigit():
+        return int(last_event_id.strip())
+    return None
+
+
+async def _progress_event_stream(after: Optional[int], accept: Callable[[Dict[str, Any]], bool],
+                                 snapshot: Callable[[], List[Task]]) -> AsyncIterator[bytes]:
+    """按变更日志推送进度事件
+
+    新连接先发送一次 snapshot 事件（当前各任务的状态与进度），之后每条变更发送一个以实体类型命名的事件
+    （task/document/annotation），事件ID为变更序号；断线重连时浏览器带上 Last-Event-ID，从该序号之后继续。
+    没有变更时只等待，每隔 sse_heartbeat_seconds 发送一行注释作为心跳。
+    """
+    change_log = get_change_log()
+    yield b"retry: %d\n\n" % SSE_RETRY_MS
+    if after is None:
+        after = change_log.last_sequence
+        yield _sse_event("snapshot", after, {"tasks": [_task_snapshot(task) for task in snapshot()]})
+    
+    while True:
+        page = change_log.read(after, SSE_PAGE_SIZE, accept)
+        for entry in page["changes"]:
+            yield _sse_event(entry["entity"], entry["seq"], entry)
+        after = page["next_cursor"]
+        if page["has_more"]:
+            continue
+        if not await change_log.wait_for_changes(after, settings.sse_heartbeat_seconds):
+            yield b": heartbeat\n\n"
+
+
+def _sse_response(events: AsyncIterator[bytes]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/events", summary="订阅任务进度（SSE）")
+async def stream_task_events(
+    last_event_id: Optional[str] = Header(None),
     current_user: UserInDB = Depends(get_current_user)
 ):
-    """创建任务"""
+    """以 Server-Sent Events 推送当前用户可见的全部任务的进度变化（任务列表、仪表盘使用）
+
+    标注员只收到分配给自己的任务的事件；任务信息变化（如重新分配）时重新判断是否可见。
+    """
+    visible_tasks: Optional[set] = None
+    if current_user.role == UserRole.ANNOTATOR:
+        visible_tasks = {task.id for task in storage.get_all_tasks() if task.assignee_id == current_user.id}
+    
+    def accept(entry: Dict[str, Any]) -> bool:
+        if visible_tasks is None:
+            return True
+        if entry["entity"] == ENTITY_TASK:
+            task = None if entry["action"] == ACTION_DELETED else storage.get_task_by_id(entry["task_id"])
+            if task and task.assignee_id == current_user.id:
+                visible_tasks.add(task.id)
+            elif entry["task_id"] in visible_tasks:
+                # 不再可见的任务发送最后一条变更，客户端据此移除
+                visible_tasks.discard(entry["task_id"])
+                return True
+        return entry["task_id"] in visible_tasks
     
-    # 验证文档文件是否存在
+    def snapshot() -> List[Task]:
+        return [task for task in storage.get_all_tasks() if visible_tasks is None or task.id in visible_tasks]
+    
+    return _sse_response(_progress_event_stream(_parse_last_event_id(last_event_id), accept, snapshot))
+
+
+def _check_task_create(task_create: TaskCreate, current_user: UserInDB):
+    """校验创建任务请求中的文件引用、模板格式与分配权限（不读取文档内容）"""
     if not task_create.documents:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -76,29 +198,6 @@ async def create_task(
                 detail=f"文档文件不存在: {doc_path}"
             )
     
-    # 验证JSON文件格式
-    json_validation_errors = []
-    for doc_path in task_create.documents:
-        # 只验证JSON和JSONL文件
-        if doc_path.lower().endswith(('.json', '.jsonl')):
-            json_validation = storage.validate_json_format(doc_path)
-            if not json_validation.get("valid"):
-                json_validation_errors.append({
-                    "file_path": doc_path,
-                    "error": json_validation.get("error", "JSON格式错误")
-                })
-    
-    # 如果有JSON格式错误，直接返回错误
-    if json_validation_errors:
-        error_message = "JSON文件格式校验失败，请检查以下文件："
-        for error in json_validation_errors:
-            error_message += f"\n文件: {error['file_path']}\n错误: {error['error']}\n"
-        
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=error_message
-        )
-    
     # 验证模板文件
     if task_create.template_path:
         template_files = storage.get_all_files(FileType.TEMPLATE)
@@ -117,74 +216,157 @@ async def create_task(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"模板文件格式错误: {validation_result.get('error', '未知错误')}"
             )
-        
-        # 使用模板校验文档数据
+    
+    # 检查权限
+    if current_user.role == UserRole.ANNOTATOR:
+        # 标注员只能创建分配给自己的任务
+        if task_create.assignee_id and task_create.assignee_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="标注员只能创建分配给自己的任务"
+            )
+        task_create.assignee_id = current_user.id
+    
+    # 验证分配人是否存在
+    if task_create.assignee_id:
+        assignee = storage.get_user_by_id(task_create.assignee_id)
+        if not assignee:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="指定的分配人不存在"
+            )
+
+
+def _check_json_format(doc_path: str) -> Optional[Dict[str, Any]]:
+    """验证单个JSON/JSONL文档格式，返回错误信息或None"""
+    # 只验证JSON和JSONL文件
+    if not doc_path.lower().endswith(('.json', '.jsonl')):
+        return None
+    
+    json_validation = storage.validate_json_format(doc_path)
+    if json_validation.get("valid"):
+        return None
+    return {
+        "file_path": doc_path,
+        "error": json_validation.get("error", "JSON格式错误")
+    }
+
+
+def _format_json_format_errors(json_validation_errors: List[Dict[str, Any]]) -> str:
+    """生成JSON格式错误提示"""
+    error_message = "JSON文件格式校验失败，请检查以下文件："
+    for error in json_validation_errors:
+        error_message += f"\n文件: {error['file_path']}\n错误: {error['error']}\n"
+    return error_message
+
+
+def _new_validation_report(owner_id: str) -> ValidationReport:
+    """创建校验报告，同时清理超过保留期的旧报告"""
+    removed = prune_reports(REPORTS_DIR, settings.validation_report_retention_seconds)
+    if removed:
+        logger.info("已清理过期的校验报告: %d 个", removed)
+    return ValidationReport(REPORTS_DIR, owner_id, settings.validation_report_examples)
+
+
+def _get_document_validator(template_full_path) -> Tuple[Callable[..., Dict[str, Any]], Callable[[], None]]:
+    """返回 (使用模板校验文档文件的函数, 用完后释放模板的函数)，启用工作进程池时在子进程中执行"""
+    if settings.template_worker_enabled:
+        pool = get_template_worker_pool()
+
+        def validate_in_worker(doc_full_path: str, **kwargs) -> Dict[str, Any]:
+            return pool.validate_file(
+                str(template_full_path), doc_full_path,
+                timeout=settings.template_worker_validate_timeout,
+                **kwargs
+            )
+        return validate_in_worker, lambda: None
+
+    validator = SimpleDocumentValidator(str(template_full_path))
+    if not validator.main_model:
+        validator.release()
+        raise ValidationJobError("模板文件无效")
+    return validator.validate_file, validator.release
+
+
+def _format_validation_report(summary: Dict[str, Any]) -> str:
+    """根据校验报告汇总生成文档数据校验错误提示"""
+    error_message = (
+        f"文档数据校验失败，共 {summary['total_records']} 条记录，"
+        f"其中 {summary['invalid_records']} 条有错误（共 {summary['error_count']} 个错误）"
+    )
+    for file_summary in summary["files"]:
+        if file_summary["invalid_count"]:
+            error_message += (
+                f"\n文件: {file_summary['file_path']}，"
+                f"总计: {file_summary['total']} 条记录，其中 {file_summary['invalid_count']} 条有错误"
+            )
+    
+    error_message += "\n\n错误分类统计："
+    for group in summary["groups"]:
+        field = group["field"] or "整条记录"
+        positions = "、".join(f"{example['index'] + 1}" for example in group["examples"])
+        error_message += f"\n  - 字段 '{field}' [{group['type']}] {group['count']} 次: {group['message']}（示例: 第 {positions} 条）"
+    if summary["group_count"] > len(summary["groups"]):
+        error_message += f"\n  ... 还有 {summary['group_count'] - len(summary['groups'])} 类错误"
+    
+    error_message += f"\n\n完整错误报告: /api/tasks/validation-reports/{summary['report_id']}/download"
+    return error_message
+
+
+@router.post("/", response_model=Task, summary="创建任务")
+async def create_task(
+    task_create: TaskCreate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """创建任务"""
+    _check_task_create(task_create, current_user)
+    
+    # 验证JSON文件格式
+    json_validation_errors = []
+    for doc_path in task_create.documents:
+        json_error = _check_json_format(doc_path)
+        if json_error:
+            json_validation_errors.append(json_error)
+    
+    # 如果有JSON格式错误，直接返回错误
+    if json_validation_errors:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=_format_json_format_errors(json_validation_errors)
+        )
+    
+    # 使用模板校验文档数据
+    if task_create.template_path:
         try:
             # 获取模板文件的完整路径
             template_full_path = storage.data_dir / task_create.template_path
             
             # 创建文档验证器
-            validator = SimpleDocumentValidator(str(template_full_path))
+            validate_file, release_validator = _get_document_validator(template_full_path)
             
-            # 校验每个文档文件
-            document_validation_errors = []
-            for doc_path in task_create.documents:
-                doc_full_path = storage.data_dir / doc_path
-                
-                if doc_full_path.exists():
-                    # 验证文档文件
-                    validation_result = validator.validate_file(str(doc_full_path))
+            # 校验每个文档文件，错误写入校验报告
+            report = _new_validation_report(current_user.id)
+            try:
+                for doc_path in task_create.documents:
+                    doc_full_path = storage.data_dir / doc_path
                     
-                    if validation_result.get("invalid_count", 0) > 0:
-                        # 收集详细的验证错误信息
-                        doc_errors = {
-                            "file_path": doc_path,
-                            "total_documents": validation_result.get("total", 0),
-                            "invalid_count": validation_result.get("invalid_count", 0),
-                            "errors": []
-                        }
-                        
-                        # 提取具体的错误信息
-                        for result in validation_result.get("results", []):
-                            if not result.get("valid"):
-                                error_info = {
-                                    "index": result.get("index", result.get("line_number", 0)),
-                                    "message": result.get("error", "未知错误")
-                                }
-                                
-                                # 如果有详细的字段错误信息
-                                if "error_details" in result:
-                                    error_info["field_errors"] = []
-                                    for field_error in result["error_details"]:
-                                        error_info["field_errors"].append({
-                                            "field": ".".join(str(loc) for loc in field_error.get("loc", [])),
-                                            "message": field_error.get("msg", ""),
-                                            "type": field_error.get("type", "")
-                                        })
-                                
-                                doc_errors["errors"].append(error_info)
-                        
-                        document_validation_errors.append(doc_errors)
+                    if doc_full_path.exists():
+                        # 验证文档文件，未通过的记录在校验过程中直接写入报告
+                        validation_result = validate_file(
+                            str(doc_full_path),
+                            error_callback=report.error_callback(doc_path)
+                        )
+                        report.add_file_result(doc_path, validation_result)
+            finally:
+                report.close()
+                release_validator()
             
-            # 如果有校验错误，返回详细错误信息
-            if document_validation_errors:
-                error_message = "文档数据校验失败，请检查以下文件："
-                for doc_error in document_validation_errors:
-                    error_message += f"\n\n文件: {doc_error['file_path']}"
-                    error_message += f"\n总计: {doc_error['total_documents']} 条记录，其中 {doc_error['invalid_count']} 条有错误"
-                    
-                    for error in doc_error['errors'][:3]:  # 只显示前3个错误
-                        error_message += f"\n  - 第 {error['index'] + 1} 条记录: {error['message']}"
-                        if 'field_errors' in error:
-                            for field_error in error['field_errors'][:2]:  # 只显示前2个字段错误
-                                error_message += f"\n    字段 '{field_error['field']}': {field_error['message']}"
-                    
-                    if len(doc_error['errors']) > 3:
-                        error_message += f"\n  ... 还有 {len(doc_error['errors']) - 3} 个错误"
-                
+            # 如果有校验错误，返回聚合后的错误信息，完整错误通过报告下载
+            if report.error_count:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=error_message
+                    detail=_format_validation_report(report.summary(settings.validation_report_max_groups)),
+                    headers={"X-Validation-Report-Id": report.report_id}
                 )
                 
         except HTTPException:
@@ -197,33 +379,11 @@ async def create_task(
                 detail=f"文档数据校验时发生错误: {str(e)}"
             )
     
-    # 检查权限
-    if current_user.role == UserRole.ANNOTATOR:
-        # 标注员只能创建分配给自己的任务
-        if task_create.assignee_id and task_create.assignee_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="标注员只能创建分配给自己的任务"
-            )
-        task_create.assignee_id = current_user.id
-    
-    # 验证分配人是否存在
-    if task_create.assignee_id:
-        assignee = storage.get_user_by_id(task_create.assignee_id)
-        if not assignee:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="指定的分配人不存在"
-            )
-    
     try:
         return storage.create_task(task_create, current_user.id)
     except Exception as e:
         # 添加详细的错误日志
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"任务创建失败: {str(e)}")
-        print(f"错误详情: {error_details}")
+        logger.exception("任务创建失败: %s", str(e))
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -231,6 +391,773 @@ async def create_task(
         )
 
 
+def _run_create_task_job(job: ValidationJob, task_create: TaskCreate, creator_id: str) -> Dict[str, Any]:
+    """后台校验任务：校验全部文档，通过后才创建任务"""
+    has_template = bool(task_create.template_path)
+    
+    # 验证JSON文件格式
+    json_validation_errors = []
+    for doc_path in task_create.documents:
+        job.check_cancelled()
+        if not has_template:
+            job.start_document(storage.get_file_size(doc_path))
+        json_error = _check_json_format(doc_path)
+        if json_error:
+            json_validation_errors.append(json_error)
+        if not has_template:
+            job.finish_document(invalid_records=1 if json_error else 0, error_count=1 if json_error else 0)
+    
+    if json_validation_errors:
+        raise ValidationJobError(_format_json_format_errors(json_validation_errors), json_validation_errors)
+    
+    # 使用模板校验文档数据
+    if has_template:
+        template_full_path = storage.data_dir / task_create.template_path
+        validate_file, release_validator = _get_document_validator(template_full_path)
+        
+        report = _new_validation_report(job.owner_id)
+        try:
+            for doc_path in task_create.documents:
+                job.check_cancelled()
+                doc_full_path = storage.data_dir / doc_path
+                job.start_document(storage.get_file_size(doc_path))
+                
+                if not doc_full_path.exists():
+                    job.finish_document()
+                    continue
+                
+                errors_before = report.error_count
+                validation_result = validate_file(
+                    str(doc_full_path),
+                    progress_callback=job.update_document,
+                    should_stop=job.is_cancelled,
+                    error_callback=report.error_callback(doc_path)
+                )
+                if validation_result.get("cancelled"):
+                    raise ValidationJobCancelled()
+                
+                report.add_file_result(doc_path, validation_result)
+                job.finish_document(
+                    records=validation_result.get("total", 0),
+                    invalid_records=validation_result.get("invalid_count", 0),
+                    error_count=report.error_count - errors_before
+                )
+        finally:
+            report.close()
+            release_validator()
+        
+        if report.error_count:
+            summary = report.summary(settings.validation_report_max_groups)
+            raise ValidationJobError(
+                _format_validation_report(summary),
+                summary["groups"],
+                result={"report_id": report.report_id}
+            )
+    
+    # 全部校验通过后才创建任务
+    job.check_cancelled()
+    new_task = storage.create_task(task_create, creator_id)
+    return {"task_id": new_task.id}
+
+
+def _get_validation_job(job_id: str, current_user: UserInDB) -> ValidationJob:
+    """获取后台校验任务并检查访问权限"""
+    job = validation_jobs.get(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="校验任务不存在"
+        )
+    
+    if job.owner_id != current_user.id and current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问此校验任务"
+        )
+    return job
+
+
+@router.post("/validation-jobs", response_model=ValidationJobInfo, status_code=status.HTTP_202_ACCEPTED,
+             summary="后台校验并创建任务")
+async def create_task_validation_job(
+    task_create: TaskCreate,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """将文档校验放入后台执行，全部通过后自动创建任务，返回校验任务ID"""
+    _check_task_create(task_create, current_user)
+    
+    bytes_total = sum(storage.get_file_size(doc_path) for doc_path in task_create.documents)
+    job = validation_jobs.submit(
+        current_user.id,
+        lambda job: _run_create_task_job(job, task_create, current_user.id),
+        documents_total=len(task_create.documents),
+        bytes_total=bytes_total
+    )
+    return job.snapshot()
+
+
+@router.get("/validation-jobs/{job_id}", response_model=ValidationJobInfo, summary="获取后台校验任务进度")
+async def get_task_validation_job(job_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """获取后台校验任务的进度（记录数、错误数、预计剩余时间）"""
+    return _get_validation_job(job_id, current_user).snapshot()
+
+
+@router.delete("/validation-jobs/{job_id}", response_model=ValidationJobInfo, summary="取消后台校验任务")
+async def cancel_task_validation_job(job_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """取消尚未结束的后台校验任务"""
+    job = _get_validation_job(job_id, current_user)
+    if not validation_jobs.cancel(job_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="校验任务已结束，无法取消"
+        )
+    return job.snapshot()
+
+
+def _get_batch_validator(template_full_path: Path) -> Tuple[Callable[[List[str]], List[Dict[str, Any]]],
+                                                             Callable[[], None]]:
+    """返回 (批量重新校验标注文件的函数, 用完后释放模板的函数)，启用工作进程池时在子进程中并行执行"""
+    if settings.template_worker_enabled:
+        pool = get_template_worker_pool()
+        return lambda file_paths: pool.validate_annotations(
+            str(template_full_path), file_paths,
+            timeout=settings.template_worker_validate_timeout
+        ), lambda: None
+    
+    validator = SimpleDocumentValidator(str(template_full_path))
+    if not validator.main_model:
+        validator.release()
+        raise ValidationJobError("模板文件无效")
+    return lambda file_paths: validate_annotation_files(validator, file_paths), validator.release
+
+
+def _revalidate_task(job: ValidationJob, task: Task, mark_rework: bool) -> Dict[str, Any]:
+    """重新校验单个任务的全部标注数据，写入逐文档索引并标记返工"""
+    started = time.monotonic()
+    validate_batch, release_validator = _get_batch_validator(storage.data_dir / task.template.file_path)
+    file_paths = [str(path) for path in storage.get_annotation_files(task.id)]
+    batch_size = max(1, settings.revalidation_batch_size)
+    batches = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+    
+    documents: Dict[str, Dict[str, Any]] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, settings.revalidation_workers),
+                                thread_name_prefix="revalidation") as executor:
+            futures = [executor.submit(validate_batch, batch) for batch in batches]
+            try:
+                for future in as_completed(futures):
+                    job.check_cancelled()
+                    results = future.result()
+                    for result in results:
+                        documents[result.pop("document_id")] = result
+                    job.finish_documents(
+                        len(results),
+                        records=sum(result["records"] for result in results),
+                        invalid_records=sum(result["invalid_records"] for result in results),
+                        error_count=sum(result["error_count"] for result in results),
+                        bytes_done=sum(result["bytes"] for result in results)
+                    )
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        # 线程池退出后已没有批次在使用验证器，释放模板模块
+        release_validator()
+    
+    failed_ids = [doc_id for doc_id, result in documents.items() if result["status"] == STATUS_FAILED]
+    passed_ids = [doc_id for doc_id, result in documents.items() if result["status"] == STATUS_PASSED]
+    if mark_rework:
+        storage.mark_documents_for_rework(task.id, failed_ids, passed_ids)
+    
+    elapsed = time.monotonic() - started
+    summary = {
+        "task_id": task.id,
+        "documents": len(documents),
+        "passed": len(passed_ids),
+        "failed": len(failed_ids),
+        "empty": sum(1 for result in documents.values() if result["status"] == STATUS_EMPTY),
+        "marked_rework": len(failed_ids) if mark_rework else 0,
+        "bytes": sum(result["bytes"] for result in documents.values()),
+        "elapsed_seconds": round(elapsed, 3)
+    }
+    storage.save_revalidation_index(task.id, {
+        "job_id": job.id,
+        "template_path": task.template.file_path,
+        "template_hash": (task.template.validation_result or {}).get("template_hash"),
+        "validated_at": datetime.now().isoformat(),
+        "summary": summary,
+        "documents": documents
+    })
+    return summary
+
+
+def _run_revalidation_job(job: ValidationJob, tasks: List[Task], mark_rework: bool) -> Dict[str, Any]:
+    """后台任务：按当前模板重新校验若干任务的已保存标注数据"""
+    started = time.monotonic()
+    task_summaries = []
+    for task in tasks:
+        job.check_cancelled()
+        task_summaries.append(_revalidate_task(job, task, mark_rework))
+    
+    elapsed = time.monotonic() - started
+    documents = sum(summary["documents"] for summary in task_summaries)
+    total_bytes = sum(summary["bytes"] for summary in task_summaries)
+    return {
+        "tasks": task_summaries,
+        "documents": documents,
+        "passed": sum(summary["passed"] for summary in task_summaries),
+        "failed": sum(summary["failed"] for summary in task_summaries),
+        "marked_rework": sum(summary["marked_rework"] for summary in task_summaries),
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(documents / elapsed, 1) if elapsed > 0 else None,
+        "mb_per_second": round(total_bytes / 1024 / 1024 / elapsed, 2) if elapsed > 0 else None
+    }
+
+
+def _submit_revalidation_job(tasks: List[Task], mark_rework: bool, current_user: UserInDB) -> ValidationJobInfo:
+    """提交批量重新校验任务"""
+    files = [path for task in tasks for path in storage.get_annotation_files(task.id)]
+    job = validation_jobs.submit(
+        current_user.id,
+        lambda job: _run_revalidation_job(job, tasks, mark_rework),
+        documents_total=len(files),
+        bytes_total=sum(path.stat().st_size for path in files)
+    )
+    return job.snapshot()
+
+
+@router.post("/revalidation-jobs", response_model=ValidationJobInfo, status_code=status.HTTP_202_ACCEPTED,
+             summary="按模板批量重新校验标注数据")
+async def create_template_revalidation_job(
+    revalidation: RevalidationRequest,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """使用模板的当前内容重新校验所有使用该模板的任务的已保存标注数据"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以按模板重新校验"
+        )
+    if not revalidation.template_path:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请指定模板路径"
+        )
+    
+    tasks = [
+        task for task in storage.get_all_tasks()
+        if task.template and task.template.file_path == revalidation.template_path
+    ]
+    if not tasks:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="没有使用该模板的任务"
+        )
+    return _submit_revalidation_job(tasks, revalidation.mark_rework, current_user)
+
+
+def _get_schema_fields(template_path: str) -> List[Dict[str, Any]]:
+    """获取模板主模型的字段结构，模板无效时抛出 ValueError"""
+    template_full_path = storage.data_dir / template_path
+    if not template_full_path.exists():
+        raise ValueError(f"模板文件不存在: {template_path}")
+    if settings.template_worker_enabled:
+        try:
+            return get_template_worker_pool().describe_schema(
+                str(template_full_path), timeout=settings.template_worker_timeout
+            )
+        except Exception as e:
+            raise ValueError(f"模板加载失败: {str(e)}")
+    
+    validator = SimpleDocumentValidator(str(template_full_path))
+    try:
+        if not validator.main_model:
+            raise ValueError(f"模板文件无效: {template_path}")
+        return validator.get_schema_fields()
+    finally:
+        validator.release()
+
+
+def _build_migration_plan(old_template_path: str, new_template_path: str,
+                          operations: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """生成迁移计划；指定了操作时使用调整后的操作，不再比较模板"""
+    if operations is not None:
+        operations = validate_operations(operations)
+        plan = {
+            "plan_id": compute_plan_id(operations),
+            "operations": operations,
+            "unresolved": [],
+            "warnings": [],
+            "created_at": datetime.now().isoformat()
+        }
+    else:
+        plan = diff_schemas(_get_schema_fields(old_template_path), _get_schema_fields(new_template_path))
+    plan["old_template_path"] = old_template_path
+    plan["new_template_path"] = new_template_path
+    return plan
+
+
+def _get_batch_migrator(operations: List[Dict[str, Any]], dry_run: bool,
+                        results_dir: Path) -> Callable[[List[str]], List[Dict[str, Any]]]:
+    """返回批量改写标注文件（及简洁标注结果）的函数，启用工作进程池时在子进程中并行执行"""
+    if settings.template_worker_enabled:
+        pool = get_template_worker_pool()
+        return lambda file_paths: pool.migrate_annotations(
+            operations, file_paths, dry_run, str(results_dir),
+            timeout=settings.template_worker_validate_timeout
+        )
+    return lambda file_paths: migrate_annotation_files(operations, file_paths, dry_run, str(results_dir))
+
+
+def _migrate_task(job: ValidationJob, task: Task, plan: Dict[str, Any], dry_run: bool) -> Dict[str, Any]:
+    """按迁移计划改写单个任务的标注数据
+
+    非试运行时每完成一批就记录已处理的文档，中断后以同一计划重新提交会跳过这些文档。
+    """
+    started = time.monotonic()
+    operations = plan["operations"]
+    state = None if dry_run else storage.get_migration_state(task.id)
+    resumable = bool(state and state.get("plan_id") == plan["plan_id"] and not state.get("completed"))
+    done_ids = set(state.get("done", [])) if resumable else set()
+    
+    files = storage.get_annotation_files(task.id)
+    pending_paths = [str(path) for path in files if path.stem not in done_ids]
+    skipped = [path for path in files if path.stem in done_ids]
+    if skipped:
+        job.finish_documents(len(skipped), bytes_done=sum(path.stat().st_size for path in skipped))
+    
+    state = {
+        "job_id": job.id,
+        "plan_id": plan["plan_id"],
+        "old_template_path": plan["old_template_path"],
+        "new_template_path": plan["new_template_path"],
+        "operations": operations,
+        "started_at": datetime.now().isoformat(),
+        "completed": False,
+        "done": sorted(done_ids)
+    }
+    if not dry_run:
+        storage.save_migration_state(task.id, state)
+    
+    applied = [0] * len(operations)
+    files_by_operation = [0] * len(operations)
+    changed = 0
+    failed = 0
+    records = 0
+    total_bytes = 0
+    failures = []
+    
+    migrate_batch = _get_batch_migrator(operations, dry_run, storage.data_dir / "annotations" / task.id)
+    batch_size = max(1, settings.revalidation_batch_size)
+    batches = (pending_paths[i:i + batch_size] for i in range(0, len(pending_paths), batch_size))
+    workers = max(1, settings.revalidation_workers)
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="migration") as executor:
+        # 同时在途的批次数有上限，文件列表再大也不会一次性提交
+        pending = {executor.submit(migrate_batch, batch) for batch in itertools.islice(batches, workers * 2)}
+        try:
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                job.check_cancelled()
+                for future in finished:
+                    results = future.result()
+                    migrated_ids = []
+                    for result in results:
+                        records += result["records"]
+                        total_bytes += result["bytes"]
+                        if result["error"]:
+                            failed += 1
+                            if len(failures) < MAX_FAILURES:
+                                failures.append({"document_id": result["document_id"], "error": result["error"]})
+                            continue
+                        if result["changed"]:
+                            changed += 1
+                            migrated_ids.append(result["document_id"])
+                        for index, count in enumerate(result["applied"]):
+                            applied[index] += count
+                            files_by_operation[index] += 1 if count else 0
+                        done_ids.add(result["document_id"])
+                    job.finish_documents(
+                        len(results),
+                        records=sum(result["records"] for result in results),
+                        invalid_records=sum(1 for result in results if result["error"]),
+                        error_count=sum(1 for result in results if result["error"]),
+                        bytes_done=sum(result["bytes"] for result in results)
+                    )
+                    if not dry_run and migrated_ids:
+                        get_change_log().record(ENTITY_ANNOTATION, ACTION_MIGRATED, task.id, migrated_ids)
+                    pending.update(executor.submit(migrate_batch, batch) for batch in itertools.islice(batches, 1))
+                if not dry_run:
+                    state["done"] = sorted(done_ids)
+                    storage.save_migration_state(task.id, state)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    
+    scanned = len(pending_paths)
+    elapsed = time.monotonic() - started
+    summary = {
+        "task_id": task.id,
+        "files_scanned": scanned,
+        "files_resumed": len(skipped),
+        "files_rewritten": changed,
+        "files_failed": failed,
+        "rewrite_rate": round(changed / scanned, 4) if scanned else 0.0,
+        "records": records,
+        "bytes": total_bytes,
+        "operations": [
+            {**operation, "applied": applied[index], "files": files_by_operation[index]}
+            for index, operation in enumerate(operations)
+        ],
+        "failures": failures,
+        "template_switched": False,
+        "elapsed_seconds": round(elapsed, 3)
+    }
+    
+    if not dry_run:
+        if not summary["files_failed"] and plan.get("switch_template"):
+            # 迁移期间任务模板被其他请求修改时不再切换
+            summary["template_switched"] = storage.update_task_template(
+                task.id, plan["new_template_path"], expected_path=plan["old_template_path"]
+            ) is not None
+        state.update(completed=not summary["files_failed"], finished_at=datetime.now().isoformat(),
+                     summary=summary, done=sorted(done_ids))
+        storage.save_migration_state(task.id, state)
+    return summary
+
+
+def _run_migration_job(job: ValidationJob, tasks: List[Task], plan: Dict[str, Any], dry_run: bool) -> Dict[str, Any]:
+    """后台任务：按迁移计划改写若干任务的已保存标注数据，返回改写率报告"""
+    started = time.monotonic()
+    task_summaries = []
+    for task in tasks:
+        job.check_cancelled()
+        task_summaries.append(_migrate_task(job, task, plan, dry_run))
+    
+    elapsed = time.monotonic() - started
+    scanned = sum(summary["files_scanned"] for summary in task_summaries)
+    rewritten = sum(summary["files_rewritten"] for summary in task_summaries)
+    total_bytes = sum(summary["bytes"] for summary in task_summaries)
+    return {
+        "plan_id": plan["plan_id"],
+        "dry_run": dry_run,
+        "tasks": task_summaries,
+        "files_scanned": scanned,
+        "files_rewritten": rewritten,
+        "files_failed": sum(summary["files_failed"] for summary in task_summaries),
+        "rewrite_rate": round(rewritten / scanned, 4) if scanned else 0.0,
+        "unresolved": plan["unresolved"],
+        "warnings": plan["warnings"],
+        "elapsed_seconds": round(elapsed, 3),
+        "files_per_second": round(scanned / elapsed, 1) if elapsed > 0 else None,
+        "mb_per_second": round(total_bytes / 1024 / 1024 / elapsed, 2) if elapsed > 0 else None
+    }
+
+
+def _check_admin(current_user: UserInDB, detail: str):
+    """只允许管理员操作"""
+    if current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=detail
+        )
+
+
+@router.post("/migration-plans", summary="生成模板迁移计划")
+async def create_migration_plan(
+    plan_request: MigrationPlanRequest,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """比较新旧模板的字段结构，返回迁移计划（改名、移动、填充默认值、删除）及需要人工处理的字段"""
+    _check_admin(current_user, "只有管理员可以生成模板迁移计划")
+    try:
+        return _build_migration_plan(plan_request.old_template_path, plan_request.new_template_path)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.post("/migration-jobs", response_model=ValidationJobInfo, status_code=status.HTTP_202_ACCEPTED,
+             summary="按模板迁移计划批量改写标注数据")
+async def create_migration_job(
+    migration: MigrationJobRequest,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """对使用旧模板的任务执行迁移，进度与改写率报告通过校验任务接口查询"""
+    _check_admin(current_user, "只有管理员可以迁移标注数据")
+    
+    tasks = [
+        task for task in storage.get_all_tasks()
+        if task.template and task.template.file_path == migration.old_template_path
+        and (migration.task_ids is None or task.id in migration.task_ids)
+    ]
+    if not tasks:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="没有使用该模板的任务"
+        )
+    
+    try:
+        plan = _build_migration_plan(migration.old_template_path, migration.new_template_path, migration.operations)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    plan["switch_template"] = migration.switch_template
+    
+    files = [path for task in tasks for path in storage.get_annotation_files(task.id)]
+    job = validation_jobs.submit(
+        current_user.id,
+        lambda job: _run_migration_job(job, tasks, plan, migration.dry_run),
+        documents_total=len(files),
+        bytes_total=sum(path.stat().st_size for path in files)
+    )
+    return job.snapshot()
+
+
+def _get_validation_report(report_id: str, current_user: UserInDB):
+    """获取校验报告汇总与文件路径，并检查访问权限"""
+    summary = load_report_summary(REPORTS_DIR, report_id)
+    if not summary:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="校验报告不存在"
+        )
+    
+    if summary.get("owner_id") != current_user.id and current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问此校验报告"
+        )
+    return summary, report_paths(REPORTS_DIR, report_id)[0]
+
+
+@router.get("/validation-reports/{report_id}", summary="获取校验报告汇总")
+async def get_validation_report(report_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """获取校验报告的聚合统计（按字段路径、错误类型计数及示例）"""
+    summary, _ = _get_validation_report(report_id, current_user)
+    return summary
+
+
+@router.get("/validation-reports/{report_id}/download", summary="下载完整校验报告")
+async def download_validation_report(report_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """下载逐条记录的完整错误列表（NDJSON，每行一条记录）"""
+    _, report_file = _get_validation_report(report_id, current_user)
+    return FileResponse(
+        path=str(report_file),
+        filename=report_file.name,
+        media_type="application/x-ndjson"
+    )
+
+
+def _export_table_paths(tasks: List[Task]) -> Dict[str, List[str]]:
+    """获取每个任务作为表格列的标注字段路径，模板无效时抛出 ValueError"""
+    template_paths: Dict[str, List[str]] = {}
+    task_paths = {}
+    for task in tasks:
+        if not task.template or not task.template.file_path:
+            raise ValueError(f"任务 {task.name} 没有关联模板，无法按标注字段导出")
+        template_path = task.template.file_path
+        if template_path not in template_paths:
+            template_paths[template_path] = table_field_paths(_get_schema_fields(template_path))
+        task_paths[task.id] = template_paths[template_path]
+    return task_paths
+
+
+def _export_chunks(tasks: List[Task], export_format: ExportFormat, compress: bool,
+                   task_paths: Dict[str, List[str]], progress: Optional[Callable] = None):
+    """按导出格式生成数据块迭代器"""
+    if export_format == ExportFormat.JSONL:
+        chunks = iter_task_jsonl(storage.data_dir, tasks, progress)
+    else:
+        delimiter = "\t" if export_format == ExportFormat.TSV else ","
+        chunks = iter_task_table(storage.data_dir, tasks, task_paths, delimiter, progress)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def _run_export_job(job: ValidationJob, export_id: str, tasks: List[Task], task_paths: Dict[str, List[str]],
+                    metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """后台任务：将任务数据流式写入导出文件"""
+    def progress(document, records: int):
+        job.start_document(document.file_size or 0)
+        job.finish_document(records=records)
+        job.check_cancelled()
+    
+    export_file = EXPORTS_DIR / metadata["filename"]
+    chunks = _export_chunks(tasks, ExportFormat(metadata["format"]), metadata["gzip"], task_paths, progress)
+    try:
+        size = write_export_file(chunks, export_file)
+    except ValueError as e:
+        save_export_metadata(EXPORTS_DIR, export_id, {**metadata, "status": "failed", "error": str(e)})
+        raise ValidationJobError(str(e))
+    except BaseException:
+        save_export_metadata(EXPORTS_DIR, export_id, {**metadata, "status": "failed"})
+        raise
+    
+    snapshot = job.snapshot()
+    metadata.update(
+        status="completed",
+        documents=snapshot.progress.documents_done,
+        records=snapshot.progress.records_done,
+        size=size,
+        finished_at=datetime.now().isoformat()
+    )
+    save_export_metadata(EXPORTS_DIR, export_id, metadata)
+    return {
+        "export_id": export_id,
+        "documents": metadata["documents"],
+        "records": metadata["records"],
+        "size": size,
+        "watermark": metadata["watermark"],
+        "download_url": f"/api/tasks/exports/{export_id}/download"
+    }
+
+
+def _start_export(tasks: List[Task], export_request: ExportRequest, current_user: UserInDB, name: str):
+    """开始导出：流式返回数据，或提交后台导出任务并返回导出ID
+
+    返回的水位（变更序号）之前的标注变更都已包含在本次导出中，下次以它作为 since 只导出之后的变更。
+    """
+    change_log = get_change_log()
+    if export_request.since is not None:
+        try:
+            since = parse_watermark(str(export_request.since))
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        changed, watermark = change_log.changed_documents(since)
+        tasks = [
+            task.model_copy(update={
+                "documents": [document for document in task.documents if document.id in changed.get(task.id, ())]
+            })
+            for task in tasks
+        ]
+    else:
+        # 先取水位再读取数据，导出过程中的变更会在下次增量导出中再次出现
+        watermark = change_log.last_sequence
+    
+    task_paths: Dict[str, List[str]] = {}
+    if export_request.format != ExportFormat.JSONL:
+        try:
+            task_paths = _export_table_paths(tasks)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+    
+    extension = export_request.format.value + (".gz" if export_request.gzip else "")
+    media_type = "application/gzip" if export_request.gzip else EXPORT_MEDIA_TYPES[export_request.format]
+    download_filename = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    if export_request.stream:
+        return StreamingResponse(
+            _export_chunks(tasks, export_request.format, export_request.gzip, task_paths),
+            media_type=media_type,
+            headers={
+                "Content-Disposition": f'attachment; filename="{download_filename}"',
+                "X-Export-Watermark": str(watermark)
+            }
+        )
+    
+    export_id = new_export_id()
+    metadata = {
+        "export_id": export_id,
+        "owner_id": current_user.id,
+        "task_ids": [task.id for task in tasks],
+        "format": export_request.format.value,
+        "gzip": export_request.gzip,
+        "since": export_request.since,
+        "watermark": watermark,
+        "filename": f"{export_id}.{extension}",
+        "download_filename": download_filename,
+        "media_type": media_type,
+        "status": "running",
+        "created_at": datetime.now().isoformat()
+    }
+    save_export_metadata(EXPORTS_DIR, export_id, metadata)
+    
+    job = validation_jobs.submit(
+        current_user.id,
+        lambda job: _run_export_job(job, export_id, tasks, task_paths, metadata),
+        documents_total=sum(len(task.documents) for task in tasks),
+        bytes_total=sum(document.file_size or 0 for task in tasks for document in task.documents)
+    )
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "export_id": export_id,
+            "job_id": job.id,
+            "status_url": f"/api/tasks/validation-jobs/{job.id}",
+            "download_url": f"/api/tasks/exports/{export_id}/download",
+            "watermark": watermark
+        }
+    )
+
+
+@router.post("/exports", summary="导出多个任务的数据")
+async def export_tasks(export_request: BatchExportRequest, current_user: UserInDB = Depends(get_current_user)):
+    """将多个任务的数据导出到同一个文件，格式与单个任务导出相同；CSV/TSV 的列取各任务模板标注字段的并集"""
+    tasks = []
+    for task_id in dict.fromkeys(export_request.task_ids):
+        task = storage.get_task_by_id(task_id)
+        if not task:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"任务不存在: {task_id}"
+            )
+        if current_user.role == UserRole.ANNOTATOR and task.assignee_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"无权导出任务: {task_id}"
+            )
+        tasks.append(task)
+    return _start_export(tasks, export_request, current_user, "tasks")
+
+
+def _get_export(export_id: str, current_user: UserInDB) -> Dict[str, Any]:
+    """获取导出信息并检查访问权限"""
+    metadata = load_export_metadata(EXPORTS_DIR, export_id)
+    if not metadata:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导出不存在或已过期"
+        )
+    
+    if metadata.get("owner_id") != current_user.id and current_user.role not in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问此导出"
+        )
+    return metadata
+
+
+@router.get("/exports/{export_id}", summary="获取导出状态")
+async def get_export(export_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """获取导出信息：状态、记录数、文件大小"""
+    return _get_export(export_id, current_user)
+
+
+@router.get("/exports/{export_id}/download", summary="下载导出文件")
+async def download_export(export_id: str, request: Request, current_user: UserInDB = Depends(get_current_user)):
+    """下载已完成的导出文件，支持断点续传"""
+    metadata = _get_export(export_id, current_user)
+    export_file = EXPORTS_DIR / metadata["filename"]
+    if metadata.get("status") != "completed" or not export_file.exists():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="导出尚未完成"
+        )
+    
+    return ranged_file_response(request, export_file, metadata["media_type"], metadata["download_filename"])
+
+
 @router.get("/{task_id}", response_model=Task, summary="获取任务详情")
 async def get_task(task_id: str, current_user: UserInDB = Depends(get_current_user)):
     """获取任务详情"""
@@ -252,6 +1179,34 @@ async def get_task(task_id: str, current_user: UserInDB = Depends(get_current_us
     return task
 
 
+@router.get("/{task_id}/events", summary="订阅单个任务的进度（SSE）")
+async def stream_single_task_events(
+    task_id: str,
+    last_event_id: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """以 Server-Sent Events 推送单个任务及其文档、标注数据的变化（任务详情页使用），事件格式同 /events"""
+    task = storage.get_task_by_id(task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    if current_user.role == UserRole.ANNOTATOR:
+        if task.assignee_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="无权访问此任务"
+            )
+    
+    return _sse_response(_progress_event_stream(
+        _parse_last_event_id(last_event_id),
+        lambda entry: entry["task_id"] == task_id,
+        lambda: [task]
+    ))
+
+
 @router.put("/{task_id}", response_model=Task, summary="更新任务")
 async def update_task(
     task_id: str,
@@ -416,9 +1371,104 @@ async def get_task_progress(task_id: str, current_user: UserInDB = Depends(get_c
     }
 
 
+@router.post("/{task_id}/revalidation-jobs", response_model=ValidationJobInfo,
+             status_code=status.HTTP_202_ACCEPTED, summary="批量重新校验任务标注数据")
+async def create_task_revalidation_job(
+    task_id: str,
+    revalidation: Optional[RevalidationRequest] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """使用任务模板的当前内容重新校验任务下全部已保存的标注数据，进度通过校验任务接口查询"""
+    task = storage.get_task_by_id(task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    if current_user.role == UserRole.ANNOTATOR:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="标注员无权重新校验任务"
+        )
+    
+    if not task.template or not task.template.file_path:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="任务没有关联模板"
+        )
+    
+    mark_rework = revalidation.mark_rework if revalidation else True
+    return _submit_revalidation_job([task], mark_rework, current_user)
+
+
+@router.get("/{task_id}/revalidation", summary="获取重新校验结果")
+async def get_task_revalidation(task_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """获取任务最近一次重新校验的逐文档通过/失败索引"""
+    task = storage.get_task_by_id(task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    if current_user.role == UserRole.ANNOTATOR and task.assignee_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问此任务"
+        )
+    
+    index = storage.get_revalidation_index(task_id)
+    if not index:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="该任务尚未进行重新校验"
+        )
+    return index
+
+
+@router.get("/{task_id}/migration", summary="获取模板迁移进度")
+async def get_task_migration(task_id: str, current_user: UserInDB = Depends(get_current_user)):
+    """获取任务最近一次模板迁移的计划、已处理文档和改写率报告"""
+    task = storage.get_task_by_id(task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="任务不存在"
+        )
+    
+    if current_user.role == UserRole.ANNOTATOR:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="标注员无权查看模板迁移"
+        )
+    
+    state = storage.get_migration_state(task_id)
+    if not state:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="该任务尚未进行模板迁移"
+        )
+    return state
+
+
 @router.post("/{task_id}/export", summary="导出任务数据")
-async def export_task(task_id: str, current_user: UserInDB = Depends(get_current_user)):
-    """导出任务数据"""
+async def export_task(
+    task_id: str,
+    export_request: Optional[ExportRequest] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """导出任务数据
+
+    - jsonl：每个文档的标注结果，未标注的文档导出原始内容，每条记录带来源信息
+    - csv/tsv：以模板标注字段为列的表格，列表字段展开为多行，只包含已标注的文档
+
+    stream=true 时直接以流式响应返回；否则在后台生成导出文件，返回导出ID和下载地址，
+    进度通过校验任务接口查询。gzip=true 时输出gzip压缩的数据。
+
+    响应带有水位（流式响应为 X-Export-Watermark 头），下次请求以 since=水位 只导出之后标注有变更的文档；
+    jsonl 中标注已删除的文档按原始文档导出。
+    """
     task = storage.get_task_by_id(task_id)
     if not task:
         raise HTTPException(
@@ -434,8 +1484,7 @@ async def export_task(task_id: str, current_user: UserInDB = Depends(get_current
                 detail="无权导出此任务"
             )
     
-    # TODO: 实现具体的导出逻辑
-    return {"message": "导出功能待实现", "task_id": task_id}
+    return _start_export([task], export_request or ExportRequest(), current_user, task_id)
 
 
 @router.get("/{task_id}/template/fields", summary="获取任务模板字段")
@@ -28,11 +28,49 @@ class Settings(BaseSettings):
     data_dir: str = "data"
     upload_dir: str = "data/uploads"
     max_file_size: int = 100 * 1024 * 1024  # 100MB
+    chunked_upload_chunk_size: int = 8 * 1024 * 1024  # 分片上传时单个分片的大小上限
+    chunked_upload_ttl_seconds: int = 24 * 3600  # 分片上传会话无更新后的保留时间
+    batch_upload_concurrency: int = 4  # 批量上传时同时接收、检查的文件数
     
     # 允许的文件类型
     allowed_document_extensions: list = [".json", ".jsonl"]
     allowed_template_extensions: list = [".py"]
     
+    # 后台校验任务配置
+    validation_job_max_concurrency: int = 2  # 同时执行的校验任务数上限
+    validation_job_retention_seconds: int = 3600  # 已结束任务的保留时间
+    validation_report_examples: int = 3  # 错误报告中每类错误保留的示例数
+    validation_report_max_groups: int = 10  # 接口响应中返回的错误分类数上限
+    validation_report_retention_seconds: int = 7 * 24 * 3600  # 校验报告的保留时间，0表示不清理
+    revalidation_workers: int = 4  # 批量重新校验标注数据时的并行批次数
+    revalidation_batch_size: int = 200  # 每批校验的标注文件数
+
+    # 模板工作进程配置（在子进程中加载模板、校验文档）
+    template_worker_enabled: bool = True
+    template_worker_processes: int = 2
+    template_worker_timeout: int = 30  # 加载模板的超时时间（秒）
+    template_worker_validate_timeout: int = 1800  # 校验单个文档文件的超时时间（秒）
+    template_worker_memory_limit_mb: int = 2048  # 单个工作进程的地址空间上限，0表示不限制
+    template_worker_max_jobs: int = 100  # 工作进程执行多少次调用后重启
+
+    # 已加载模板（验证器）缓存配置
+    template_cache_max_entries: int = 32
+    template_cache_max_memory_mb: int = 256  # 按估算内存淘汰
+    template_artifact_cache_enabled: bool = True  # 按内容哈希缓存模板字节码和元数据（data/template_cache）
+    template_prewarm_enabled: bool = True  # 启动后在后台预先加载最近任务使用的模板
+
+    # 文档记录索引配置（按记录预览、分页读取文档）
+    record_index_stride: int = 256  # 每隔多少条记录保存一个检查点
+
+    # 进度推送（SSE）配置
+    sse_heartbeat_seconds: int = 15  # 没有变更时发送心跳的间隔，防止代理断开空闲连接
+
+    # 日志配置
+    log_level: str = "INFO"
+    log_levels: dict = {}  # 按模块设置级别，如 {"app.core.annotation_validator": "DEBUG"}
+    log_format: str = "text"  # text 或 json
+    log_debug_sample_rate: float = 1.0  # DEBUG日志的采样比例
+
     # CORS配置
     cors_origins: list = [
         "http://localhost:3000",
@@ -59,6 +97,9 @@ def ensure_data_directories():
         f"{settings.data_dir}/public_files/templates",
         f"{settings.data_dir}/public_files/exports",
         f"{settings.data_dir}/tasks",
+        f"{settings.data_dir}/validation_reports",
+        f"{settings.data_dir}/template_cache",
+        f"{settings.data_dir}/changes",
         f"{settings.data_dir}/uploads"
     ]
     
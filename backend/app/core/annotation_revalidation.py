@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标注数据批量重新校验
+模板被替换后，用当前模板重新校验任务下已保存的标注文件（tasks/{task_id}/annotations/*.json），
+得到逐文档的通过/失败结果。工作进程池和API进程内共用这里的校验逻辑，
+以及标注数据格式的通用处理（取出待校验对象、生成简洁标注结果）。
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .simple_document_validator import SimpleDocumentValidator
+
+# 索引中每个文档保留的错误条数
+ERRORS_PER_DOCUMENT = 5
+
+# 逐文档结果状态
+STATUS_PASSED = "passed"
+STATUS_FAILED = "failed"
+STATUS_EMPTY = "empty"  # 尚未填写任何标注数据
+
+# 生成简洁标注结果时排除的标注过程元数据字段
+ANNOTATION_METADATA_FIELDS = {
+    'annotation_id', 'annotator_id', 'annotation_status',
+    'created_at', 'updated_at', 'validation_errors'
+}
+
+
+def annotation_objects(annotation_data: Any) -> List[Any]:
+    """按标注数据的格式取出待校验的对象：数组、{"items": [...]} 或单个对象"""
+    if isinstance(annotation_data, list):
+        return annotation_data
+    if isinstance(annotation_data, dict) and 'items' in annotation_data:
+        return annotation_data['items']
+    return [annotation_data]
+
+
+def _clean_annotation_metadata(data: Any) -> Any:
+    """清理标注数据中的元数据，保留原始文档结构"""
+    if isinstance(data, dict):
+        return {
+            key: _clean_annotation_metadata(value) if isinstance(value, (dict, list)) else value
+            for key, value in data.items() if key not in ANNOTATION_METADATA_FIELDS
+        }
+    if isinstance(data, list):
+        return [_clean_annotation_metadata(item) for item in data]
+    return data
+
+
+def simple_annotation_result(annotation_data: Any) -> Any:
+    """从标注数据中取出简洁结果（结构与原始文档一致）"""
+    if isinstance(annotation_data, dict):
+        if 'items' in annotation_data and isinstance(annotation_data['items'], list):
+            # 数组结构：取items中的内容
+            return annotation_data['items']
+        if 'content' in annotation_data:
+            # 单文档结构：取content中的内容
+            return annotation_data['content']
+        # 直接使用标注数据，但移除标注相关的元数据
+        return _clean_annotation_metadata(annotation_data)
+    # 数组或其他情况，直接使用
+    return annotation_data
+
+
+def validate_annotation_file(validator: SimpleDocumentValidator, file_path: str) -> Dict[str, Any]:
+    """校验单个标注文件，返回该文档的校验结果"""
+    path = Path(file_path)
+    result = {
+        "document_id": path.stem,
+        "status": STATUS_PASSED,
+        "records": 0,
+        "invalid_records": 0,
+        "error_count": 0,
+        "errors": [],
+        "bytes": 0
+    }
+
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        result["bytes"] = len(raw)
+        annotation_data = json.loads(raw).get("annotation_data")
+    except (OSError, ValueError, AttributeError) as e:
+        result.update(status=STATUS_FAILED, error_count=1, errors=[
+            {"field": "", "type": "read_error", "message": f"标注文件读取失败: {str(e)}"}
+        ])
+        return result
+
+    if not annotation_data:
+        result["status"] = STATUS_EMPTY
+        return result
+
+    objects = annotation_objects(annotation_data)
+    result["records"] = len(objects)
+    for index, item_result in enumerate(validator.validate_documents(objects)):
+        if item_result["valid"]:
+            continue
+        result["invalid_records"] += 1
+        details = item_result.get("error_details") or [
+            {"loc": [], "type": "validation_error", "msg": item_result.get("error", "未知错误")}
+        ]
+        result["error_count"] += len(details)
+        for detail in details:
+            if len(result["errors"]) >= ERRORS_PER_DOCUMENT:
+                break
+            loc = ".".join(str(item) for item in detail.get("loc", []))
+            result["errors"].append({
+                "index": index,
+                "field": SimpleDocumentValidator.normalize_field_path(loc) if loc else "",
+                "type": detail.get("type", ""),
+                "message": detail.get("msg", "")
+            })
+
+    if result["invalid_records"]:
+        result["status"] = STATUS_FAILED
+    return result
+
+
+def validate_annotation_files(validator: SimpleDocumentValidator, file_paths: List[str]) -> List[Dict[str, Any]]:
+    """校验一批标注文件"""
+    return [validate_annotation_file(validator, file_path) for file_path in file_paths]
@@ -4,61 +4,59 @@
 标注数据验证器 - 基于简化版文档校验模块重写
 """
 
-from typing import Dict, Any, List, Optional
+import gc
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
-from .simple_document_validator import SimpleDocumentValidator
+from pydantic import ValidationError
+from ..config import settings
+from .annotation_revalidation import annotation_objects
+from .logger import get_logger
+from .simple_document_validator import SimpleDocumentValidator, get_template_module_stats
+from .template_cache import get_template_artifact_cache, hash_template_file
+from .validation_report import truncate_input
+
+logger = get_logger(__name__)
 
 
 class AnnotationValidator:
     """标注数据验证器"""
     
-    def __init__(self):
+    def __init__(self, max_entries: Optional[int] = None, max_memory_mb: Optional[int] = None):
         """初始化标注验证器"""
-        self.loaded_validators = {}  # 缓存已加载的验证器
+        # 缓存已加载的验证器，按 (模板路径, 修改时间) 做LRU淘汰；请求线程与预热线程共用，读写时持有 _lock
+        self.loaded_validators: "OrderedDict[Tuple[str, float], SimpleDocumentValidator]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_entries = max_entries if max_entries is not None else settings.template_cache_max_entries
+        self.max_memory = (max_memory_mb if max_memory_mb is not None else settings.template_cache_max_memory_mb) * 1024 * 1024
     
     def validate_annotation_data(self, template_file_path: str, annotation_data: Dict[str, Any]) -> Dict[str, Any]:
         """验证标注数据是否符合模板定义"""
         try:
-            print(f"[DEBUG] 开始验证标注数据")
-            print(f"[DEBUG] 模板路径: {template_file_path}")
-            print(f"[DEBUG] 输入数据: {annotation_data}")
+            logger.debug("开始验证标注数据，模板路径: %s", template_file_path)
             
             # 获取或创建验证器
             validator = self._get_validator(template_file_path)
             if not validator:
                 error_msg = f"无法加载模板文件: {template_file_path}"
-                print(f"[ERROR] {error_msg}")
+                logger.error(error_msg)
                 return {"valid": False, "error": error_msg}
             
-            print(f"[DEBUG] 验证器加载成功，主模型: {validator.main_model.__name__ if validator.main_model else 'None'}")
-            
-            # 检测数据格式并相应处理
-            objects_to_validate = []
+            # 检测数据格式（数组、包含items的对象、单个对象）并取出待验证对象
+            objects_to_validate = annotation_objects(annotation_data)
+            logger.debug("待验证对象数: %d", len(objects_to_validate))
             
-            if isinstance(annotation_data, list):
-                # 直接是数组格式
-                objects_to_validate = annotation_data
-                print(f"[DEBUG] 检测到数组格式，包含 {len(objects_to_validate)} 个对象")
-            elif isinstance(annotation_data, dict) and 'items' in annotation_data:
-                # 包含items字段的对象格式
-                objects_to_validate = annotation_data['items']
-                print(f"[DEBUG] 检测到包含items的对象格式，包含 {len(objects_to_validate)} 个对象")
-            else:
-                # 单个对象格式
-                objects_to_validate = [annotation_data]
-                print(f"[DEBUG] 检测到单个对象格式")
-            
-            # 逐个验证每个对象
+            # 验证每个对象
             all_valid = True
             all_error_details = []
             validated_objects = []
             
-            for idx, obj_data in enumerate(objects_to_validate):
-                print(f"[DEBUG] 验证第 {idx + 1} 个对象: {obj_data}")
-                
-                result = validator.validate_document(obj_data)
-                print(f"[DEBUG] 第 {idx + 1} 个对象验证结果: {result}")
-                
+            # 整批校验，失败时再逐条定位错误
+            results = validator.validate_documents(objects_to_validate)
+            
+            for idx, (obj_data, result) in enumerate(zip(objects_to_validate, results)):
                 if result["valid"]:
                     validated_objects.append(result.get("validated_data", obj_data))
                 else:
@@ -86,7 +84,7 @@ class AnnotationValidator:
                         })
             
             if all_valid:
-                print(f"[DEBUG] 所有对象验证通过")
+                logger.debug("所有对象验证通过")
                 
                 # 构造验证后的数据，保持原有格式
                 if isinstance(annotation_data, list):
@@ -104,7 +102,7 @@ class AnnotationValidator:
             else:
                 # 格式化验证错误信息
                 error_details = self._format_validation_errors(all_error_details)
-                print(f"[DEBUG] 格式化后的错误: {error_details}")
+                logger.debug("标注数据验证失败，错误数: %d", len(error_details))
                 
                 return {
                     "valid": False,
@@ -115,15 +113,54 @@ class AnnotationValidator:
                 
         except Exception as e:
             error_msg = f"验证过程中发生异常: {str(e)}"
-            print(f"[ERROR] {error_msg}")
-            import traceback
-            print(f"[ERROR] 异常堆栈: {traceback.format_exc()}")
+            logger.exception(error_msg)
             return {
                 "valid": False, 
                 "error": error_msg,
                 "error_details": [{"field": "system", "message": error_msg, "type": "system_error"}]
             }
 
+    def validate_annotation_json(self, template_file_path: str, raw_data: bytes) -> Dict[str, Any]:
+        """直接从原始JSON字节验证标注数据
+        
+        支持与 validate_annotation_data 相同的三种格式（数组、包含items的对象、单个对象），
+        校验通过时不生成中间字典；未通过时解析数据并走 validate_annotation_data 生成详细错误。
+        成功结果中不含 validated_data，调用方按需自行解析原始数据。
+        """
+        try:
+            validator = self._get_validator(template_file_path)
+            if not validator:
+                return {"valid": False, "error": f"无法加载模板文件: {template_file_path}"}
+            
+            first_byte = raw_data.lstrip()[:1]
+            try:
+                if first_byte == b"[":
+                    validator._get_list_adapter().validate_json(raw_data)
+                elif first_byte == b"{" and b'"items"' in raw_data:
+                    try:
+                        validator._get_items_adapter().validate_json(raw_data)
+                    except ValidationError as e:
+                        errors = e.errors()
+                        # 没有items字段时按单个对象校验
+                        if not (len(errors) == 1 and errors[0]["type"] == "missing"
+                                and tuple(errors[0]["loc"]) == ("items",)):
+                            raise
+                        validator.main_model.model_validate_json(raw_data)
+                else:
+                    validator.main_model.model_validate_json(raw_data)
+                return {"valid": True, "message": "数据验证通过"}
+            except ValidationError:
+                pass
+            
+            try:
+                annotation_data = json.loads(raw_data)
+            except ValueError as e:
+                return {"valid": False, "error": f"JSON格式错误: {str(e)}"}
+            return self.validate_annotation_data(template_file_path, annotation_data)
+            
+        except Exception as e:
+            return {"valid": False, "error": f"验证过程中发生异常: {str(e)}"}
+
     def validate_partial_data(self, template_file_path: str, partial_data: Dict[str, Any]) -> Dict[str, Any]:
         """验证部分数据（用于实时验证）"""
         try:
@@ -145,8 +182,14 @@ class AnnotationValidator:
             return {"valid": False, "error": f"部分验证失败: {str(e)}"}
 
     def get_template_info(self, template_file_path: str) -> Optional[Dict[str, Any]]:
-        """获取模板信息"""
+        """获取模板信息，模板产物缓存中有该模板的元数据时不加载模板"""
         try:
+            cache = get_template_artifact_cache()
+            if cache is not None and Path(template_file_path).exists():
+                metadata = cache.get_metadata(hash_template_file(template_file_path))
+                if metadata is not None:
+                    return {**metadata["template_info"], "annotation_fields": metadata["annotation_fields"]}
+            
             validator = self._get_validator(template_file_path)
             if validator and validator.main_model:
                 return {
@@ -159,49 +202,130 @@ class AnnotationValidator:
         except Exception:
             return None
 
+    def get_template_schema(self, template_file_path: str) -> Optional[Dict[str, Any]]:
+        """获取模板当前内容对应的主模型JSON Schema与标注字段信息，模板无效时返回None
+
+        模板产物缓存中有该内容的元数据时直接返回，否则加载模板（同时写入产物缓存）。
+        """
+        try:
+            template_hash = hash_template_file(template_file_path)
+        except OSError:
+            return None
+        
+        cache = get_template_artifact_cache()
+        metadata = cache.get_metadata(template_hash) if cache is not None else None
+        if metadata is None:
+            validator = self._get_validator(template_file_path)
+            if not validator or not validator.main_model:
+                return None
+            metadata = {
+                "main_model": validator.main_model.__name__,
+                "template_hash": validator.template_hash,
+                "json_schema": validator.get_json_schema(),
+                "annotation_fields": validator.get_annotation_schema()
+            }
+        return {
+            "template_hash": metadata.get("template_hash") or template_hash,
+            "main_model": metadata.get("main_model"),
+            "json_schema": metadata.get("json_schema") or {},
+            "annotation_fields": metadata.get("annotation_fields") or []
+        }
+
+    def preload(self, template_file_path: str) -> bool:
+        """预先加载模板到缓存（启动预热时使用），返回是否加载成功"""
+        return self._get_validator(template_file_path) is not None
+
     def clear_cache(self):
-        """清理缓存"""
-        self.loaded_validators.clear()
+        """清理缓存（只移出缓存，不释放验证器，正在使用的请求不受影响）"""
+        with self._lock:
+            self.loaded_validators.clear()
+        gc.collect()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        cache = get_template_artifact_cache()
+        with self._lock:
+            loaded = list(self.loaded_validators.items())
+        return {
+            "entries": len(loaded),
+            "max_entries": self.max_entries,
+            "memory_estimate": sum(v.memory_estimate for _, v in loaded),
+            "max_memory": self.max_memory,
+            "templates": [
+                {"path": path, "module": v.module_name, "memory_estimate": v.memory_estimate}
+                for (path, _), v in loaded
+            ],
+            "modules": get_template_module_stats(),
+            "artifacts": cache.get_stats() if cache is not None else None
+        }
+
+    def _evict(self) -> bool:
+        """淘汰最久未使用的验证器，直到数量和估算内存都不超过上限（至少保留一个），调用方持有 _lock
+
+        被淘汰的验证器只移出缓存，不调用 release()：其他线程可能仍在使用，引用结束后由垃圾回收释放。
+        返回是否淘汰了验证器。
+        """
+        evicted = False
+        memory = sum(v.memory_estimate for v in self.loaded_validators.values())
+        while len(self.loaded_validators) > 1 and (
+            len(self.loaded_validators) > self.max_entries or memory > self.max_memory
+        ):
+            (path, _), validator = self.loaded_validators.popitem(last=False)
+            logger.debug("淘汰模板缓存: %s，估算内存: %d 字节", path, validator.memory_estimate)
+            memory -= validator.memory_estimate
+            evicted = True
+        return evicted
     
     def _get_validator(self, template_file_path: str) -> Optional[SimpleDocumentValidator]:
         """获取或创建验证器"""
         try:
-            print(f"[DEBUG] 获取验证器，模板路径: {template_file_path}")
-            
-            # 检查缓存
-            if template_file_path in self.loaded_validators:
-                print(f"[DEBUG] 从缓存中获取验证器")
-                return self.loaded_validators[template_file_path]
-            
             # 检查文件是否存在
             full_path = Path(template_file_path)
-            print(f"[DEBUG] 检查文件是否存在: {full_path.absolute()}")
-            
             if not full_path.exists():
-                print(f"[ERROR] 模板文件不存在: {full_path.absolute()}")
+                logger.error("模板文件不存在: %s", full_path.absolute())
                 return None
             
-            print(f"[DEBUG] 模板文件存在，开始创建验证器")
+            # 检查缓存，模板文件被替换后重新加载
+            cache_key = (str(full_path), full_path.stat().st_mtime)
+            with self._lock:
+                validator = self.loaded_validators.get(cache_key)
+                if validator is not None:
+                    self.loaded_validators.move_to_end(cache_key)
+                    return validator
+            
+            logger.debug("加载模板: %s", full_path)
             
             # 创建新的验证器
             validator = SimpleDocumentValidator()
             result = validator.load_template(str(full_path))
             
-            print(f"[DEBUG] 验证器加载结果: {result}")
-            
             if result["valid"]:
-                print(f"[DEBUG] 验证器加载成功，缓存验证器")
-                # 缓存验证器
-                self.loaded_validators[template_file_path] = validator
+                logger.debug("模板加载成功: %s，主模型: %s，估算内存: %d 字节",
+                             full_path, result.get("main_model"), validator.memory_estimate)
+                # 加载在锁外进行，其他线程已放入同一版本时使用缓存中的；同一模板的旧版本移出缓存
+                with self._lock:
+                    cached = self.loaded_validators.get(cache_key)
+                    if cached is not None:
+                        self.loaded_validators.move_to_end(cache_key)
+                    else:
+                        for key in [key for key in self.loaded_validators if key[0] == cache_key[0]]:
+                            del self.loaded_validators[key]
+                        self.loaded_validators[cache_key] = validator
+                        evicted = self._evict()
+                if cached is not None:
+                    validator.release()
+                    return cached
+                if evicted:
+                    # 模型类之间存在循环引用，需要完整回收一次才能释放
+                    gc.collect()
                 return validator
             else:
-                print(f"[ERROR] 验证器加载失败: {result.get('error', '未知错误')}")
+                logger.error("模板加载失败: %s，%s", full_path, result.get('error', '未知错误'))
+                validator.release()
                 return None
                 
         except Exception as e:
-            print(f"[ERROR] 获取验证器时发生异常: {str(e)}")
-            import traceback
-            print(f"[ERROR] 异常堆栈: {traceback.format_exc()}")
+            logger.exception("获取验证器时发生异常: %s", str(e))
             return None
     
     def _format_validation_errors(self, errors: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -218,13 +342,8 @@ class AnnotationValidator:
             error_type = error.get("type", "")
             input_value = error.get("input")
             
-            # 确保输入值是可序列化的
-            if input_value is not None:
-                try:
-                    # 尝试转换为字符串，确保可序列化
-                    input_value = str(input_value) if input_value is not None else None
-                except Exception:
-                    input_value = "无法显示"
+            # 转换为长度受限的字符串，确保可序列化且不会完整展开大对象
+            input_value = truncate_input(input_value)
             
             # 根据错误类型提供更友好的错误信息
             friendly_message = self._get_friendly_error_message(error_type, raw_message, input_value)
@@ -238,7 +357,7 @@ class AnnotationValidator:
             }
             formatted_errors.append(formatted_error)
             
-            print(f"[DEBUG] 格式化错误 - 字段: {field_path}, 消息: {friendly_message}, 类型: {error_type}")
+            logger.debug("格式化错误 - 字段: %s, 消息: %s, 类型: %s", field_path, friendly_message, error_type)
         
         return formatted_errors
     
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据变更日志
+任务、文档、标注数据的每次修改都追加一条变更记录，带有全局递增的序号和记录时间：
+{"seq": 序号, "time": 时间, "entity": task/document/annotation, "action": 变更类型,
+ "task_id": 任务ID, "document_id": 文档ID（任务变更为None）, "status": 变更后的状态,
+ "progress": 变更后的任务状态与进度（任务、文档变更时记录，见 StorageManager）}
+
+记录按序号和时间升序写入 data/changes/changes.jsonl，查询某个水位（序号或时间）之后的变更时
+在文件中二分定位起始行，只读取之后的记录，耗时与变更量成正比，与任务、标注文件的总数无关。
+日志文件不存在时，按已有标注文件的修改时间生成一次初始记录（增量导出用），之前的任务变更不补记。
+
+序号与时间在同一进程内由锁保证递增，多个API进程同时写入同一数据目录时不保证顺序。
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from pydantic_core import from_json, to_json
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+ENTITY_TASK = "task"
+ENTITY_DOCUMENT = "document"
+ENTITY_ANNOTATION = "annotation"
+
+ACTION_CREATED = "created"
+ACTION_UPDATED = "updated"
+ACTION_DELETED = "deleted"
+ACTION_SAVED = "saved"
+ACTION_MIGRATED = "migrated"
+ACTION_IMPORTED = "imported"  # 生成日志时已有的标注文件
+
+
+def parse_watermark(value: str) -> Union[int, datetime]:
+    """解析水位：整数为变更序号，否则按ISO格式时间解析，格式错误时抛出 ValueError"""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"水位格式错误，应为变更序号或ISO格式时间: {value}")
+    # 记录时间为本地时间，不带时区
+    return since.astimezone().replace(tzinfo=None) if since.tzinfo else since
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeLog:
+    """数据变更日志（追加写入的变更记录）"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = Path(data_dir)
+        self.log_path = self.data_dir / "changes" / "changes.jsonl"
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._last_time: Optional[datetime] = None
+        # 等待新变更的长轮询请求：(事件循环, future)
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+        # 早期版本只记录标注变更，文件名为 annotations.jsonl，记录中没有 entity 字段
+        legacy_path = self.log_path.with_name("annotations.jsonl")
+        if legacy_path.exists() and not self.log_path.exists():
+            os.replace(legacy_path, self.log_path)
+
+        if self.log_path.exists():
+            self._load_tail()
+        else:
+            self._bootstrap()
+
+    @property
+    def last_sequence(self) -> int:
+        """当前最新的变更序号"""
+        return self._last_seq
+
+    def _load_tail(self):
+        """读取最后一条记录，恢复序号和时间；末尾有写入中断留下的半行时截掉"""
+        with open(self.log_path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end:
+                f.seek(end - 1)
+                if f.read(1) != b"\n":
+                    position = end
+                    while position > 0:
+                        position = max(0, position - 4096)
+                        f.seek(position)
+                        newline = f.read(end - position).rfind(b"\n")
+                        if newline >= 0:
+                            position += newline + 1
+                            break
+                    logger.warning("变更日志末尾有不完整的记录，已截掉 %d 字节", end - position)
+                    f.truncate(position)
+        entry = self._last_entry()
+        if entry:
+            self._last_seq = entry["seq"]
+            self._last_time = datetime.fromisoformat(entry["time"])
+
+    def _last_entry(self) -> Optional[Dict[str, Any]]:
+        """从文件末尾向前读取最后一条完整的记录"""
+        with open(self.log_path, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                position = max(0, position - 4096)
+                f.seek(position)
+                lines = f.read(end - position).split(b"\n")
+                # 块开头可能是半行
+                for line in reversed(lines[1:] if position else lines):
+                    if line.strip():
+                        return from_json(line)
+        return None
+
+    def _bootstrap(self):
+        """按已有标注文件的修改时间生成初始记录"""
+        existing = []
+        tasks_dir = self.data_dir / "tasks"
+        if tasks_dir.exists():
+            for annotation_file in tasks_dir.glob("*/annotations/*.json"):
+                try:
+                    mtime = annotation_file.stat().st_mtime
+                except OSError:
+                    continue
+                existing.append((mtime, annotation_file.parent.parent.name, annotation_file.stem))
+        existing.sort()
+
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.log_path.with_name(f"{self.log_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            for mtime, task_id, document_id in existing:
+                f.write(self._make_entry(ENTITY_ANNOTATION, ACTION_IMPORTED, task_id, document_id, None,
+                                         now=datetime.fromtimestamp(mtime)))
+        os.replace(temp_path, self.log_path)
+        if existing:
+            logger.info("已根据 %d 个标注文件生成变更日志", len(existing))
+
+    def _make_entry(self, entity: str, action: str, task_id: str, document_id: Optional[str],
+                    status: Optional[str], progress: Optional[Dict[str, Any]] = None,
+                    now: Optional[datetime] = None) -> bytes:
+        """生成下一条记录（调用方持有锁或处于初始化阶段）"""
+        now = now or datetime.now()
+        # 时间与序号同样保持递增，按时间查询时也能二分定位
+        if self._last_time is not None and now < self._last_time:
+            now = self._last_time
+        self._last_seq += 1
+        self._last_time = now
+        entry = {
+            "seq": self._last_seq,
+            "time": now.isoformat(),
+            "entity": entity,
+            "action": action,
+            "task_id": task_id,
+            "document_id": document_id,
+            "status": status,
+            "progress": progress
+        }
+        return to_json(entry) + b"\n"
+
+    def record(self, entity: str, action: str, task_id: str, document_ids: Optional[Iterable[str]] = None,
+               status: Optional[str] = None, progress: Optional[Dict[str, Any]] = None) -> int:
+        """记录变更，document_ids 为None时记录一条任务级变更；返回最后一条记录的序号"""
+        with self._lock:
+            data = b"".join(
+                self._make_entry(entity, action, task_id, document_id, status, progress)
+                for document_id in (document_ids if document_ids is not None else [None])
+            )
+            if not data:
+                return self._last_seq
+            with open(self.log_path, 'ab') as f:
+                f.write(data)
+            waiters, self._waiters = self._waiters, []
+            last_seq = self._last_seq
+
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+        return last_seq
+
+    async def wait_for_changes(self, after: int, timeout: float) -> bool:
+        """等待序号大于 after 的变更，超时返回False"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._last_seq > after:
+                return True
+            self._waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+
+    @staticmethod
+    def _line_start(f, position: int) -> int:
+        """position 处或之后第一行的开头位置"""
+        if position == 0:
+            return 0
+        f.seek(position - 1)
+        f.readline()
+        return f.tell()
+
+    def _seek_after(self, f, is_after: Callable[[Dict[str, Any]], bool]) -> int:
+        """二分查找第一条满足 is_after 的记录所在的字节位置（记录按序号、时间升序）"""
+        def reached(position: int) -> bool:
+            f.seek(self._line_start(f, position))
+            line = f.readline()
+            try:
+                return not line or is_after(from_json(line))
+            except ValueError:
+                # 不完整的行（写入中途）只可能在末尾
+                return True
+
+        low, high = 0, f.seek(0, os.SEEK_END)
+        while low < high:
+            middle = (low + high) // 2
+            if reached(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return self._line_start(f, low)
+
+    def iter_changes(self, since: Union[int, datetime, None] = None,
+                     until: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """按顺序产出水位之后（不含）、序号不超过 until 的变更记录"""
+        if since is None:
+            is_after = lambda entry: True
+        elif isinstance(since, datetime):
+            is_after = lambda entry: datetime.fromisoformat(entry["time"]) > since
+        else:
+            is_after = lambda entry: entry["seq"] > since
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._seek_after(f, is_after))
+            for line in f:
+                try:
+                    entry = from_json(line)
+                except ValueError:
+                    break
+                if until is not None and entry["seq"] > until:
+                    break
+                if is_after(entry):
+                    entry.setdefault("entity", ENTITY_ANNOTATION)
+                    yield entry
+
+    def read(self, after: int, limit: int,
+             accept: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+        """分页读取序号 after 之后的变更
+
+        返回 {"changes": 变更记录, "next_cursor": 下一页的after, "has_more": 是否还有更多, "latest": 最新序号}；
+        accept 过滤掉的记录不返回，但游标同样越过它们。
+        """
+        latest = self._last_seq
+        changes = []
+        cursor = after
+        for entry in self.iter_changes(after, until=latest):
+            if len(changes) >= limit:
+                break
+            cursor = entry["seq"]
+            if accept is None or accept(entry):
+                changes.append(entry)
+        return {"changes": changes, "next_cursor": cursor, "has_more": cursor < latest, "latest": latest}
+
+    def changed_documents(self, since: Union[int, datetime]) -> Tuple[Dict[str, Set[str]], int]:
+        """返回水位之后标注有变更的文档（按任务分组）和新的水位（已读取的最大序号）"""
+        watermark = self._last_seq
+        changed: Dict[str, Set[str]] = {}
+        for entry in self.iter_changes(since, until=watermark):
+            if entry["entity"] == ENTITY_ANNOTATION:
+                changed.setdefault(entry["task_id"], set()).add(entry["document_id"])
+        return changed, watermark
+
+
+_change_log: Optional[ChangeLog] = None
+_change_log_lock = threading.Lock()
+
+
+def get_change_log() -> ChangeLog:
+    """获取全局数据变更日志（首次调用时加载或生成）"""
+    global _change_log
+    with _change_log_lock:
+        if _change_log is None:
+            from ..config import settings
+
+            _change_log = ChangeLog(settings.data_dir)
+        return _change_log
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片上传
+客户端先创建上传会话（文件名、类型、总大小），再按顺序PUT各分片（请求体为分片内容，offset为其在文件中的位置），
+全部到达后完成上传。每个分片可带 X-Chunk-SHA256 校验和，校验失败的分片不会写入。
+
+分片直接追加到 data/uploads/<会话ID>/data.part，接收时同步：
+- 按声明的总大小和单文件上限检查大小，超出时立即拒绝
+- 计算整个文件的SHA-256
+- 文档文件逐条检查记录的JSON语法、扫描记录边界生成索引检查点（见 record_index）
+因此完成上传时不必再读取文件。连接中断后用 GET 查询已接收的字节数，从该位置继续上传；
+重复发送已接收的部分会被跳过。服务重启后首次访问会话时重新读取已接收的内容恢复状态。
+
+普通上传（一次性提交整个文件）使用同样的 IncomingFile 边写入边检查。
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from pydantic_core import from_json, to_json
+
+from .logger import get_logger
+from .record_index import KIND_SINGLE, RecordScanner, get_record_index_store
+
+logger = get_logger(__name__)
+
+# 恢复会话时每次读取的块大小
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """上传请求无法处理"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class IncomingFile:
+    """正在接收的上传文件：边写入边统计大小、计算SHA-256，文档文件同时检查JSON语法并扫描记录边界"""
+
+    def __init__(self, path: Path, filename: str, check_records: bool, max_size: int):
+        self.path = path
+        self.filename = filename
+        self.max_size = max_size
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self.scanner: Optional[RecordScanner] = (
+            get_record_index_store().new_scanner(filename) if check_records else None
+        )
+        # 顶层不是数组的JSON文件没有记录边界，内容保留在内存中（不超过 max_size），完成时整体检查
+        self._single = bytearray()
+        # 空文件不会调用 write，先创建文件
+        path.touch()
+
+    @property
+    def sha256(self) -> str:
+        return self._hasher.hexdigest()
+
+    def _check_records(self, records):
+        first = self.scanner.count - len(records) + 1
+        for number, record in enumerate(records, first):
+            try:
+                from_json(record)
+            except ValueError as e:
+                raise UploadError(f"第{number}条记录JSON格式错误: {e}")
+
+    def _accept(self, data: bytes):
+        """统计、校验已写入或将写入的内容"""
+        if self.size + len(data) > self.max_size:
+            raise UploadError(f"文件大小超过限制 ({self.max_size // (1024 * 1024)}MB)", 413)
+        self.size += len(data)
+        self._hasher.update(data)
+        if self.scanner:
+            self._check_records(self.scanner.feed(data))
+            if self.scanner.error:
+                raise UploadError(self.scanner.error)
+            if self.scanner.kind in (None, KIND_SINGLE):
+                self._single += data
+            elif self._single:
+                self._single.clear()
+
+    def write(self, data: bytes):
+        """检查并追加内容，检查失败时不写入"""
+        self._accept(data)
+        with open(self.path, 'ab') as f:
+            f.write(data)
+
+    def replay(self):
+        """读取文件中已有的内容恢复状态（不重复写入）"""
+        with open(self.path, 'rb') as f:
+            while True:
+                data = f.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                self._accept(data)
+
+    def finish(self):
+        """内容接收完毕，检查最后一条记录；顶层不是数组的JSON文件在这里整体检查"""
+        if not self.scanner:
+            return
+        self._check_records(self.scanner.finish())
+        if self.scanner.error:
+            raise UploadError(self.scanner.error)
+        if self.scanner.kind == KIND_SINGLE:
+            try:
+                from_json(bytes(self._single))
+            except ValueError as e:
+                raise UploadError(f"JSON格式错误: {e}")
+
+
+class _Session:
+    """内存中的上传会话状态"""
+
+    def __init__(self, meta: Dict[str, Any], incoming: IncomingFile):
+        self.meta = meta
+        self.incoming = incoming
+        self.lock = asyncio.Lock()
+        self.error: Optional[str] = None  # 内容检查失败后会话不能继续
+
+
+class ChunkedUploadManager:
+    """分片上传会话管理"""
+
+    def __init__(self, upload_dir: str, max_file_size: int, chunk_size: int, ttl_seconds: int):
+        self.upload_dir = Path(upload_dir)
+        self.max_file_size = max_file_size
+        self.chunk_size = chunk_size
+        self.ttl_seconds = ttl_seconds
+        self._sessions: Dict[str, _Session] = {}
+        self._lock = threading.Lock()
+
+    def _session_dir(self, upload_id: str) -> Path:
+        return self.upload_dir / upload_id
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        meta_path = self._session_dir(meta["upload_id"]) / "session.json"
+        temp_path = meta_path.with_name("session.json.tmp")
+        temp_path.write_bytes(to_json(meta))
+        os.replace(temp_path, meta_path)
+
+    def status(self, session: _Session) -> Dict[str, Any]:
+        """会话状态（接口响应）"""
+        meta = session.meta
+        return {
+            "upload_id": meta["upload_id"],
+            "filename": meta["filename"],
+            "file_type": meta["file_type"],
+            "total_size": meta["total_size"],
+            "chunk_size": self.chunk_size,
+            "received": session.incoming.size,
+            "sha256": session.incoming.sha256 if session.incoming.size == meta["total_size"] else None,
+            "expires_at": meta["updated_at"] + self.ttl_seconds
+        }
+
+    def create(self, owner_id: str, filename: str, file_type: str, total_size: int,
+               check_records: bool, sha256: Optional[str] = None) -> _Session:
+        """创建上传会话"""
+        if total_size > self.max_file_size:
+            raise UploadError(f"文件大小超过限制 ({self.max_file_size // (1024 * 1024)}MB)", 413)
+        self.cleanup_expired()
+
+        upload_id = f"upload_{uuid.uuid4().hex[:12]}"
+        now = time.time()
+        meta = {
+            "upload_id": upload_id,
+            "owner_id": owner_id,
+            "filename": filename,
+            "file_type": file_type,
+            "total_size": total_size,
+            "sha256": sha256.lower() if sha256 else None,
+            "check_records": check_records,
+            "created_at": now,
+            "updated_at": now
+        }
+        session_dir = self._session_dir(upload_id)
+        session_dir.mkdir(parents=True)
+        self._write_meta(meta)
+        session = _Session(meta, IncomingFile(session_dir / "data.part", filename, check_records, total_size))
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id: str, owner_id: Optional[str] = None) -> _Session:
+        """获取上传会话，owner_id 不为None时只能获取自己创建的会话；会话不在内存中时从磁盘恢复"""
+        with self._lock:
+            session = self._sessions.get(upload_id)
+        if session is None:
+            session = self._restore(upload_id)
+        if owner_id is not None and session.meta["owner_id"] != owner_id:
+            raise UploadError("上传会话不存在", 404)
+        return session
+
+    def _restore(self, upload_id: str) -> _Session:
+        session_dir = self._session_dir(upload_id)
+        if not re.fullmatch(r"upload_[0-9a-f]{12}", upload_id) or not (session_dir / "session.json").exists():
+            raise UploadError("上传会话不存在", 404)
+        meta = from_json((session_dir / "session.json").read_bytes())
+        incoming = IncomingFile(session_dir / "data.part", meta["filename"], meta["check_records"],
+                                meta["total_size"])
+        session = _Session(meta, incoming)
+        try:
+            incoming.replay()
+        except UploadError as e:
+            session.error = e.message
+        with self._lock:
+            # 并发恢复同一会话时以先放入的为准
+            session = self._sessions.setdefault(upload_id, session)
+        return session
+
+    def append(self, session: _Session, offset: int, data: bytes, checksum: Optional[str] = None):
+        """写入从 offset 开始的分片（调用方持有 session.lock）"""
+        if session.error:
+            raise UploadError(session.error)
+        if checksum and hashlib.sha256(data).hexdigest() != checksum.strip().lower():
+            raise UploadError("分片校验和不一致")
+        received = session.incoming.size
+        if offset > received:
+            raise UploadError(f"分片位置不连续，已接收 {received} 字节", 409)
+        if offset + len(data) > session.meta["total_size"]:
+            raise UploadError("分片超出文件总大小", 413)
+        # 跳过已接收的部分（重发的分片）
+        data = data[received - offset:]
+        if not data:
+            return
+        try:
+            session.incoming.write(data)
+        except UploadError as e:
+            if e.status_code == 400:
+                session.error = e.message
+            raise
+        session.meta["updated_at"] = time.time()
+        self._write_meta(session.meta)
+
+    def complete(self, session: _Session) -> IncomingFile:
+        """检查文件是否完整，返回接收完毕的文件（调用方移走文件后调用 discard）"""
+        if session.error:
+            raise UploadError(session.error)
+        incoming = session.incoming
+        if incoming.size != session.meta["total_size"]:
+            raise UploadError(f"文件未上传完整，已接收 {incoming.size}/{session.meta['total_size']} 字节", 409)
+        if session.meta["sha256"] and incoming.sha256 != session.meta["sha256"]:
+            session.error = "文件SHA-256校验和不一致"
+            raise UploadError(session.error)
+        try:
+            incoming.finish()
+        except UploadError as e:
+            session.error = e.message
+            raise
+        return incoming
+
+    def discard(self, upload_id: str):
+        """删除会话及已接收的内容"""
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def cleanup_expired(self):
+        """删除超过保留时间没有更新的会话"""
+        if not self.upload_dir.exists():
+            return
+        deadline = time.time() - self.ttl_seconds
+        for session_dir in self.upload_dir.glob("upload_*"):
+            try:
+                updated_at = from_json((session_dir / "session.json").read_bytes())["updated_at"]
+            except (OSError, ValueError, KeyError):
+                updated_at = session_dir.stat().st_mtime
+            if updated_at < deadline:
+                logger.info("删除过期的上传会话: %s", session_dir.name)
+                self.discard(session_dir.name)
+
+
+_upload_manager: Optional[ChunkedUploadManager] = None
+_upload_manager_lock = threading.Lock()
+
+
+def get_upload_manager() -> ChunkedUploadManager:
+    """获取全局分片上传会话管理器"""
+    global _upload_manager
+    with _upload_manager_lock:
+        if _upload_manager is None:
+            from ..config import settings
+
+            _upload_manager = ChunkedUploadManager(
+                str(Path(settings.data_dir) / "uploads"),
+                settings.max_file_size,
+                settings.chunked_upload_chunk_size,
+                settings.chunked_upload_ttl_seconds
+            )
+        return _upload_manager
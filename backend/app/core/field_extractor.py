@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标注字段提取器代码生成
+将模板的标注字段路径（包括 entities[].label 这类列表路径）一次性编译为专用的取值函数，
+提取时直接按属性或键访问，不再通过反射遍历模型字段。
+
+生成的函数返回 {字段路径: 值}：
+- 普通路径直接取值
+- [] 路径返回列表，每个列表元素对应一项；空列表的路径不出现在结果中
+"""
+
+import itertools
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+_MISSING = object()
+
+
+class PathSegment(NamedTuple):
+    """字段路径中的一段"""
+    name: str  # 模型字段名（按属性访问实例时使用）
+    key: str  # 原始JSON中的键（有别名时为别名）
+    is_list: bool  # 是否为 List[BaseModel]，即路径中的 name[]
+
+
+class _Node:
+    """路径前缀树节点，公共前缀只遍历一次"""
+
+    def __init__(self):
+        self.children: Dict[PathSegment, "_Node"] = {}
+        self.path = None  # 叶子节点对应的完整字段路径
+
+    def leaf_paths(self) -> List[str]:
+        paths = [self.path] if self.path is not None else []
+        for child in self.children.values():
+            paths.extend(child.leaf_paths())
+        return paths
+
+
+class _Writer:
+    """生成代码的缓冲区"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self._counter = itertools.count()
+
+    def line(self, indent: int, text: str):
+        self.lines.append("    " * indent + text)
+
+    def var(self, prefix: str) -> str:
+        return f"{prefix}{next(self._counter)}"
+
+
+class _TopTarget:
+    """顶层：值直接写入结果字典"""
+
+    def __init__(self, writer: _Writer, from_dict: bool):
+        self.writer = writer
+        self.from_dict = from_dict
+
+    def leaf(self, indent: int, path: str, obj: str, segment: PathSegment):
+        if self.from_dict:
+            value = self.writer.var("t")
+            self.writer.line(indent, f"{value} = {obj}.get({segment.key!r}, _MISSING)")
+            self.writer.line(indent, f"if {value} is not _MISSING:")
+            self.writer.line(indent + 1, f"out[{path!r}] = {value}")
+        else:
+            self.writer.line(indent, f"out[{path!r}] = {obj}.{segment.name}")
+
+    def value(self, indent: int, path: str, value: str):
+        self.writer.line(indent, f"out[{path!r}] = {value}")
+
+
+class _ListTarget:
+    """列表循环内：值追加到对应路径的收集列表"""
+
+    def __init__(self, writer: _Writer, from_dict: bool, collectors: Dict[str, str]):
+        self.writer = writer
+        self.from_dict = from_dict
+        self.collectors = collectors
+
+    def leaf(self, indent: int, path: str, obj: str, segment: PathSegment):
+        if self.from_dict:
+            self.writer.line(indent, f"{self.collectors[path]}.append({obj}.get({segment.key!r}))")
+        else:
+            self.writer.line(indent, f"{self.collectors[path]}.append({obj}.{segment.name})")
+
+    def value(self, indent: int, path: str, value: str):
+        self.writer.line(indent, f"{self.collectors[path]}.append({value})")
+
+
+def _emit_node(writer: _Writer, segment: PathSegment, node: _Node, obj: str,
+               indent: int, target, from_dict: bool):
+    """生成单个路径节点的取值代码"""
+    if not node.children:
+        target.leaf(indent, node.path, obj, segment)
+        return
+
+    value = writer.var("v")
+    access = f"{obj}.get({segment.key!r})" if from_dict else f"{obj}.{segment.name}"
+    writer.line(indent, f"{value} = {access}")
+
+    if not segment.is_list:
+        # 嵌套模型，为None（或不是对象）时跳过其下所有路径
+        writer.line(indent, f"if isinstance({value}, dict):" if from_dict else f"if {value} is not None:")
+        for child_segment, child in node.children.items():
+            _emit_node(writer, child_segment, child, value, indent + 1, target, from_dict)
+        return
+
+    writer.line(indent, f"if isinstance({value}, list):" if from_dict else f"if {value}:")
+    collectors = {path: writer.var("r") for path in node.leaf_paths()}
+    for collector in collectors.values():
+        writer.line(indent + 1, f"{collector} = []")
+
+    item = writer.var("i")
+    writer.line(indent + 1, f"for {item} in {value}:")
+    writer.line(indent + 2, f"if not isinstance({item}, dict):" if from_dict else f"if {item} is None:")
+    writer.line(indent + 3, "continue")
+    list_target = _ListTarget(writer, from_dict, collectors)
+    for child_segment, child in node.children.items():
+        _emit_node(writer, child_segment, child, item, indent + 2, list_target, from_dict)
+
+    for path, collector in collectors.items():
+        writer.line(indent + 1, f"if {collector}:")
+        target.value(indent + 2, path, collector)
+
+
+def generate_extractor_source(paths: Sequence[Tuple[str, Sequence[PathSegment]]],
+                              from_dict: bool = False) -> str:
+    """生成提取函数 extract(root) 的源代码"""
+    root = _Node()
+    for path, segments in paths:
+        node = root
+        for segment in segments:
+            node = node.children.setdefault(segment, _Node())
+        node.path = path
+
+    writer = _Writer()
+    writer.line(0, "def extract(root):")
+    writer.line(1, "out = {}")
+    target = _TopTarget(writer, from_dict)
+    for segment, node in root.children.items():
+        _emit_node(writer, segment, node, "root", 1, target, from_dict)
+    writer.line(1, "return out")
+    return "\n".join(writer.lines) + "\n"
+
+
+def compile_extractor(paths: Sequence[Tuple[str, Sequence[PathSegment]]], from_dict: bool = False,
+                      name: str = "annotation_extractor") -> Callable[[Any], Dict[str, Any]]:
+    """将字段路径编译为提取函数
+
+    from_dict=False 时输入为模型实例，按属性访问；
+    from_dict=True 时输入为解析后的JSON对象，按键访问，缺失的键跳过。
+    """
+    source = generate_extractor_source(paths, from_dict)
+    namespace = {"_MISSING": _MISSING}
+    exec(compile(source, f"<{name}>", "exec"), namespace)
+    extractor = namespace["extract"]
+    extractor.source = source
+    return extractor
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件下载的HTTP条件请求与范围请求
+- ETag（由文件大小和修改时间生成）与 Last-Modified，支持 If-None-Match / If-Modified-Since 返回304
+- Range：单个范围返回206和对应字节；多个范围返回 multipart/byteranges；无法满足时返回416
+- If-Range：验证器与当前文件不一致时忽略 Range，返回完整文件，避免把新旧内容拼在一起
+"""
+
+import os
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+# 每次读取文件的块大小
+CHUNK_SIZE = 64 * 1024
+# 一次请求最多接受的范围数，超过时按完整文件返回
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """请求的范围都不在文件内"""
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """由文件大小和修改时间生成的强ETag"""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 是否匹配（弱比较）"""
+    if header.strip() == "*":
+        return True
+    strip = lambda tag: tag.strip().removeprefix("W/")
+    return strip(etag) in {strip(tag) for tag in header.split(",")}
+
+
+def _not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析 Range 头，返回按起始位置排序、合并重叠后的 [起始, 结束] 字节范围（含结束位置）
+
+    格式不支持或范围过多时返回None（按完整文件处理），所有范围都超出文件时抛出 RangeNotSatisfiable。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, dash, last = part.partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else max(start, size - 1)
+                if start > end or start < 0:
+                    return None
+            else:
+                # 后缀范围：最后N个字节
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """按块读取文件中 [start, end] 的字节"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def content_disposition(filename: str, disposition_type: str = "attachment") -> str:
+    """Content-Disposition 头，非ASCII文件名按 RFC 5987 编码（与 FileResponse 一致）"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition_type}; filename*=utf-8''{quoted}"
+    return f'{disposition_type}; filename="{filename}"'
+
+
+def _iter_multipart(path: Path, parts: List[Tuple[bytes, int, int]], closing: bytes) -> Iterator[bytes]:
+    for head, start, end in parts:
+        yield head
+        yield from iter_file_range(path, start, end)
+        yield b"\r\n"
+    yield closing
+
+
+def ranged_file_response(request: Request, path: Path, media_type: str, filename: Optional[str] = None,
+                         content_disposition_type: str = "attachment") -> Response:
+    """返回支持条件请求与范围请求的文件响应"""
+    stat_result = path.stat()
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {"ETag": etag, "Last-Modified": last_modified, "Accept-Ranges": "bytes"}
+
+    # If-None-Match 优先于 If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match is not None and _etag_matches(if_none_match, etag)) or (
+            if_none_match is None and if_modified_since and _not_modified_since(if_modified_since, stat_result.st_mtime)):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() not in (etag, last_modified):
+        # 客户端手中的是旧版本，返回完整文件
+        range_header = None
+
+    ranges = None
+    if range_header:
+        try:
+            ranges = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if not ranges:
+        return FileResponse(path, media_type=media_type, filename=filename, headers=headers,
+                            stat_result=stat_result, content_disposition_type=content_disposition_type)
+
+    if filename:
+        headers["Content-Disposition"] = content_disposition(filename, content_disposition_type)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+        return StreamingResponse(iter_file_range(path, start, end), status_code=206,
+                                 media_type=media_type, headers=headers)
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        (f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n".encode(),
+         start, end)
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    headers["Content-Length"] = str(
+        sum(len(head) + (end - start + 1) + 2 for head, start, end in parts) + len(closing)
+    )
+    return StreamingResponse(_iter_multipart(path, parts, closing), status_code=206,
+                             media_type=f"multipart/byteranges; boundary={boundary}", headers=headers)
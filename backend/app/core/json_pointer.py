@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON Pointer（RFC 6901）字段投影
+按指针列表从JSON值中取出部分字段，返回 {指针: 值}，不存在的字段不出现在结果中。
+"/text" 取对象的 text 字段，"/entities/0/label" 取列表第一项的 label，"" 表示整个值；
+键中的 "/" 和 "~" 分别写作 "~1" 和 "~0"。
+"""
+
+from typing import Any, Dict, List, Sequence, Tuple
+
+_MISSING = object()
+
+
+def parse_pointer(pointer: str) -> Tuple[str, ...]:
+    """解析JSON Pointer为键序列，格式错误时抛出 ValueError"""
+    if pointer == "":
+        return ()
+    if not pointer.startswith("/"):
+        raise ValueError(f"JSON Pointer 必须以 / 开头: {pointer}")
+    tokens = pointer[1:].split("/")
+    for token in tokens:
+        # "~" 之后只能是 0 或 1
+        if "~" in token.replace("~0", "").replace("~1", ""):
+            raise ValueError(f"JSON Pointer 转义错误: {pointer}")
+    return tuple(token.replace("~1", "/").replace("~0", "~") for token in tokens)
+
+
+def resolve_pointer(value: Any, tokens: Sequence[str]) -> Any:
+    """按键序列取值，不存在时返回 _MISSING"""
+    for token in tokens:
+        if isinstance(value, dict):
+            value = value.get(token, _MISSING)
+        elif isinstance(value, list) and token.isdigit() and (token == "0" or not token.startswith("0")):
+            index = int(token)
+            value = value[index] if index < len(value) else _MISSING
+        else:
+            return _MISSING
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def project(value: Any, pointers: List[Tuple[str, Tuple[str, ...]]]) -> Dict[str, Any]:
+    """按 (指针, 键序列) 列表投影，返回 {指针: 值}"""
+    projected = {}
+    for pointer, tokens in pointers:
+        field = resolve_pointer(value, tokens)
+        if field is not _MISSING:
+            projected[pointer] = field
+    return projected
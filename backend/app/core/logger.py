@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志工具
+core、api 模块统一使用分级日志：按模块配置级别、可选JSON格式输出、高频DEBUG日志按比例采样。
+调用方使用 %s 占位符延迟格式化，级别未开启时不产生格式化开销。
+"""
+
+import json
+import logging
+import random
+import sys
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# 应用日志的根名称，各模块使用 get_logger(__name__) 得到其子logger
+ROOT_LOGGER_NAME = "app"
+
+# LogRecord 自带的属性，JSON输出时只额外输出 extra 传入的字段
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """单行JSON格式，extra 中的字段作为顶层键输出"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """按比例采样DEBUG级别的日志，INFO及以上始终输出"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取模块logger，name 通常传入 __name__"""
+    return logging.getLogger(name)
+
+
+def setup_logging(level: Optional[str] = None, module_levels: Optional[Dict[str, str]] = None,
+                  log_format: Optional[str] = None, debug_sample_rate: Optional[float] = None):
+    """根据配置初始化应用日志，重复调用时以最后一次为准"""
+    from ..config import settings
+
+    level = level or settings.log_level
+    module_levels = settings.log_levels if module_levels is None else module_levels
+    log_format = log_format or settings.log_format
+    debug_sample_rate = settings.log_debug_sample_rate if debug_sample_rate is None else debug_sample_rate
+
+    handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    handler.addFilter(SamplingFilter(debug_sample_rate))
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    root.propagate = False
+
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level.upper())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON/JSONL文档的记录偏移索引
+按记录（JSONL的非空行、JSON顶层数组的元素）读取文档中的一段，不读取、不解析整个文件：
+- 索引每隔 stride 条记录保存一个检查点（该记录的起始字节位置），读取第N条记录时从最近的检查点开始扫描
+- 没有索引或索引已过期（文件大小、修改时间变化）时从文件开头逐行/逐元素扫描到目标位置
+- JSON文件只扫描结构字符（括号、逗号、引号）定位顶层数组元素的边界，不构建对象
+顶层不是数组的JSON文件整体作为一条记录。
+
+索引保存在 data/indexes/records/<文件路径哈希>.json，上传文档时生成；分页读取没有索引的文件（如标注结果）时按需生成。
+"""
+
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic_core import from_json, to_json
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# 每次读取文件的块大小
+CHUNK_SIZE = 64 * 1024
+# 内存中缓存的索引数
+MAX_CACHED_INDEXES = 256
+
+KIND_JSONL = "jsonl"
+KIND_ARRAY = "array"  # 顶层为数组的JSON文件
+KIND_SINGLE = "single"  # 顶层不是数组的JSON文件
+
+# 完整的字符串（块末尾未结束时匹配到块末尾）或结构字符；数字、字面量不需要逐个匹配
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*(?P<closed>"?)|[\[\]{},]', re.DOTALL)
+
+
+def record_kind(path: Path) -> str:
+    """判断文件的记录类型（只读取开头的空白和第一个字符）"""
+    if path.suffix.lower() == '.jsonl':
+        return KIND_JSONL
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return KIND_SINGLE
+            stripped = chunk.lstrip()
+            if stripped:
+                return KIND_ARRAY if stripped[:1] == b"[" else KIND_SINGLE
+
+
+class RecordScanner:
+    """增量扫描记录边界：依次传入文件内容块，返回其中已完整的记录（去掉首尾空白的原始字节）
+
+    position 为None时从文件开头扫描，JSON文件由第一个非空白字符判断是否为数组；否则从该记录边界开始
+    （JSONL为行首，JSON数组为 '[' 或 ',' 之后）。顶层不是数组的JSON文件不产出记录。
+    stride 不为None时每隔 stride 条记录记下该记录边界的位置（检查点），用于生成索引。
+    扫描只定位记录边界，不解析记录内容；数组有空元素、没有结束或结束后还有其他内容时记录在 error 中。
+    """
+
+    def __init__(self, jsonl: bool, position: Optional[int] = None, stride: Optional[int] = None):
+        self.kind = KIND_JSONL if jsonl else (None if position is None else KIND_ARRAY)
+        self.stride = stride
+        self.count = 0
+        self.checkpoints: List[int] = []
+        self.error: Optional[str] = None
+        self._buffer = bytearray()
+        self._base = position or 0  # 缓冲区第一个字节在文件中的位置
+        self._start = 0  # 当前记录在缓冲区中的起始位置
+        self._scan = 0  # 缓冲区中下次开始匹配的位置
+        self._depth = 0
+        self._closed = False  # 顶层数组已结束
+        self._after_comma = False  # 上一个顶层分隔符是逗号（之后必须有元素）
+
+    def _emit(self, records: List[bytes], start: int, end: int, required: bool = False):
+        """产出 [start, end) 之间的记录；required 为True时该位置必须有元素（数组中逗号前后）"""
+        record = bytes(self._buffer[start:end]).strip()
+        if not record:
+            if required and not self.error:
+                self.error = "JSON数组中有空元素"
+            return
+        if self.stride and self.count % self.stride == 0:
+            self.checkpoints.append(self._base + start)
+        self.count += 1
+        records.append(record)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """传入下一块内容，返回本块中结束的记录"""
+        records: List[bytes] = []
+        if self.kind == KIND_SINGLE or not data:
+            return records
+        self._buffer += data
+        if self.kind is None:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return records
+            if stripped[:1] != b"[":
+                self.kind = KIND_SINGLE
+                self._buffer.clear()
+                return records
+            self.kind = KIND_ARRAY
+            skip = len(self._buffer) - len(stripped) + 1
+            del self._buffer[:skip]
+            self._base += skip
+
+        if self.kind == KIND_JSONL:
+            self._feed_lines(records)
+        else:
+            self._feed_array(records)
+
+        # 丢弃已产出记录的内容
+        if self._start:
+            del self._buffer[:self._start]
+            self._base += self._start
+            self._scan -= self._start
+            self._start = 0
+        return records
+
+    def _feed_lines(self, records: List[bytes]):
+        while True:
+            newline = self._buffer.find(b"\n", self._scan)
+            if newline < 0:
+                self._scan = len(self._buffer)
+                return
+            self._emit(records, self._start, newline + 1)
+            self._start = self._scan = newline + 1
+
+    def _feed_array(self, records: List[bytes]):
+        if self._closed:
+            if self._buffer.strip():
+                self.error = "JSON数组结束后还有其他内容"
+            self._start = self._scan = len(self._buffer)
+            return
+        for match in _TOKEN.finditer(self._buffer, self._scan):
+            token = match.group()
+            if token[:1] == b'"':
+                if not match.group("closed"):
+                    # 字符串在块末尾没有结束，下一块到达后从字符串开头重新匹配
+                    self._scan = match.start()
+                    return
+            elif self._depth == 0 and token == b",":
+                self._emit(records, self._start, match.start(), required=True)
+                self._start = match.end()
+                self._after_comma = True
+            elif self._depth == 0 and token == b"]":
+                # 顶层数组结束，空数组没有记录，逗号之后不能直接结束
+                self._emit(records, self._start, match.start(), required=self._after_comma)
+                self._closed = True
+                if self._buffer[match.end():].strip():
+                    self.error = "JSON数组结束后还有其他内容"
+                self._start = self._scan = len(self._buffer)
+                return
+            elif token in (b"[", b"{"):
+                self._depth += 1
+            elif token in (b"]", b"}"):
+                self._depth -= 1
+        self._scan = len(self._buffer)
+
+    def finish(self) -> List[bytes]:
+        """内容传入完毕，返回最后一条记录（JSONL末尾没有换行、JSON数组没有结束时）"""
+        records: List[bytes] = []
+        if self.kind is None:
+            self.kind = KIND_SINGLE
+        elif self.kind == KIND_JSONL:
+            self._emit(records, self._start, len(self._buffer))
+        elif self.kind == KIND_ARRAY and not self._closed:
+            self.error = "JSON数组没有结束"
+            self._emit(records, self._start, len(self._buffer))
+        self._buffer.clear()
+        self._start = self._scan = 0
+        return records
+
+
+def _scan_file(f, scanner: RecordScanner, position: Optional[int] = None) -> Iterator[bytes]:
+    """从 position 开始读取文件，产出扫描到的记录"""
+    f.seek(position or 0)
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield from scanner.feed(chunk)
+    yield from scanner.finish()
+
+
+class RecordIndexStore:
+    """文档记录偏移索引的生成、保存与按记录读取"""
+
+    def __init__(self, data_dir: str, stride: int = 256):
+        self.data_dir = Path(data_dir)
+        self.index_dir = self.data_dir / "indexes" / "records"
+        self.stride = stride
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _index_path(self, file_path: str) -> Path:
+        digest = hashlib.sha256(file_path.encode('utf-8')).hexdigest()[:32]
+        return self.index_dir / f"{digest}.json"
+
+    @staticmethod
+    def _is_fresh(index: Dict[str, Any], stat_result: os.stat_result) -> bool:
+        return index["size"] == stat_result.st_size and index["mtime_ns"] == stat_result.st_mtime_ns
+
+    def build(self, file_path: str) -> Dict[str, Any]:
+        """扫描文件生成索引并保存，file_path 为相对数据目录的路径"""
+        path = self.data_dir / file_path
+        scanner = self.new_scanner(path.name)
+        with open(path, 'rb') as f:
+            for _ in _scan_file(f, scanner):
+                pass
+        return self.save(file_path, scanner)
+
+    def new_scanner(self, filename: str) -> RecordScanner:
+        """从文件开头扫描、记录检查点的扫描器（文件内容逐块传入，扫描结束后用 save 保存索引）"""
+        return RecordScanner(Path(filename).suffix.lower() == '.jsonl', stride=self.stride)
+
+    def save(self, file_path: str, scanner: RecordScanner) -> Dict[str, Any]:
+        """按扫描完整个文件的扫描器保存索引"""
+        stat_result = (self.data_dir / file_path).stat()
+        single = scanner.kind == KIND_SINGLE
+        index = {
+            "file_path": file_path,
+            "size": stat_result.st_size,
+            "mtime_ns": stat_result.st_mtime_ns,
+            "kind": scanner.kind,
+            "stride": self.stride,
+            "count": 1 if single else scanner.count,
+            "checkpoints": [0] if single else scanner.checkpoints
+        }
+        index_path = self._index_path(file_path)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+        temp_path.write_bytes(to_json(index))
+        os.replace(temp_path, index_path)
+        self._remember(file_path, index)
+        logger.debug("已生成记录索引: %s，%d 条记录", file_path, index["count"])
+        return index
+
+    def _remember(self, file_path: str, index: Dict[str, Any]):
+        with self._lock:
+            self._cache.pop(file_path, None)
+            self._cache[file_path] = index
+            while len(self._cache) > MAX_CACHED_INDEXES:
+                self._cache.pop(next(iter(self._cache)))
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """返回与文件当前内容一致的索引，没有或已过期时返回None"""
+        try:
+            stat_result = (self.data_dir / file_path).stat()
+        except OSError:
+            return None
+        with self._lock:
+            index = self._cache.get(file_path)
+        if index is None:
+            try:
+                index = from_json(self._index_path(file_path).read_bytes())
+            except (OSError, ValueError):
+                return None
+            self._remember(file_path, index)
+        return index if self._is_fresh(index, stat_result) else None
+
+    def get_or_build(self, file_path: str) -> Dict[str, Any]:
+        """返回文件的索引，没有或已过期时重新生成"""
+        return self.get(file_path) or self.build(file_path)
+
+    def remove(self, file_path: str):
+        """删除文件的索引"""
+        with self._lock:
+            self._cache.pop(file_path, None)
+        try:
+            self._index_path(file_path).unlink()
+        except FileNotFoundError:
+            pass
+
+    def read_records(self, file_path: str, offset: int, limit: int) -> Tuple[List[bytes], Optional[int], bool]:
+        """读取第 offset 条起最多 limit 条记录（去掉首尾空白的原始字节）
+
+        返回 (记录列表, 记录总数, 之后是否还有记录)；没有可用的索引时记录总数为None，从文件开头扫描。
+        """
+        path = self.data_dir / file_path
+        index = self.get(file_path)
+        kind = index["kind"] if index else record_kind(path)
+        if kind == KIND_SINGLE:
+            content = path.read_bytes().strip()
+            return [content] if content and offset == 0 else [], 1 if content else 0, False
+
+        records: List[bytes] = []
+        has_more = False
+        position, skip = None, offset
+        if index:
+            if offset >= index["count"]:
+                return [], index["count"], False
+            checkpoint = offset // index["stride"]
+            position, skip = index["checkpoints"][checkpoint], offset - checkpoint * index["stride"]
+        with open(path, 'rb') as f:
+            for record_index, record in enumerate(_scan_file(f, RecordScanner(kind == KIND_JSONL, position), position)):
+                if record_index < skip:
+                    continue
+                if len(records) >= limit:
+                    has_more = True
+                    break
+                records.append(record)
+        return records, index["count"] if index else None, has_more
+
+
+_record_index_store: Optional[RecordIndexStore] = None
+_record_index_store_lock = threading.Lock()
+
+
+def get_record_index_store() -> RecordIndexStore:
+    """获取全局记录索引存储"""
+    global _record_index_store
+    with _record_index_store_lock:
+        if _record_index_store is None:
+            from ..config import settings
+
+            _record_index_store = RecordIndexStore(settings.data_dir, settings.record_index_stride)
+        return _record_index_store
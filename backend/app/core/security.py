@@ -9,8 +9,11 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from ..config import settings
 from ..models.auth import TokenData
 from ..models.user import UserInDB, UserRole
+from .logger import get_logger
 from .storage import StorageManager
 
+logger = get_logger(__name__)
+
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -183,7 +186,7 @@ def create_initial_admin():
         # 检查是否已存在管理员账户
         existing_admin = storage.get_user_by_username("admin")
         if existing_admin:
-            print("管理员账户已存在")
+            logger.info("管理员账户已存在")
             return existing_admin
         
         # 创建初始管理员账户
@@ -197,14 +200,11 @@ def create_initial_admin():
         password_hash = get_password_hash("admin123")
         new_admin = storage.create_user(admin_user, password_hash)
         
-        print(f"初始管理员账户创建成功:")
-        print(f"用户名: admin")
-        print(f"密码: admin123")
-        print(f"角色: {new_admin.role}")
-        print(f"请在生产环境中立即修改默认密码!")
+        logger.info("初始管理员账户创建成功: 用户名 admin，密码 admin123，角色 %s", new_admin.role)
+        logger.warning("请在生产环境中立即修改默认密码!")
         
         return new_admin
         
     except Exception as e:
-        print(f"创建初始管理员账户失败: {e}")
+        logger.error("创建初始管理员账户失败: %s", e)
         return None 
\ No newline at end of file
@@ -6,30 +6,73 @@
 """
 
 import json
+import re
+import sys
+import gc
 import importlib.util
-import ast
-from pydantic import BaseModel, ValidationError, Field
-from typing import Dict, List, Type, Any, Optional, get_origin, get_args, Union
+import itertools
+import weakref
+from types import CodeType, ModuleType
+from pydantic import BaseModel, ValidationError, Field, TypeAdapter, ConfigDict, create_model
+from typing import Dict, List, Type, Any, Optional, Callable, Annotated, get_origin, get_args, Union
 import inspect
 from pathlib import Path
+from pydantic_core import from_json, to_jsonable_python
+from .field_extractor import PathSegment, compile_extractor
+from .record_index import RecordScanner
+from .template_cache import get_template_artifact_cache, hash_template_source
 
 class AnnotationField:
     """标注字段信息"""
     def __init__(self, path: str, field_type: Type, required: bool, 
-                 description: str = "", constraints: Dict[str, Any] = None):
+                 description: str = "", constraints: Dict[str, Any] = None,
+                 field_info: Any = None):
         self.path = path
         self.field_type = field_type
         self.required = required
         self.description = description
         self.constraints = constraints or {}
+        self.field_info = field_info  # 原始的pydantic FieldInfo，用于单字段校验
+
+
+# 已加载的模板模块（弱引用），模块被回收后自动移除
+_template_modules: "weakref.WeakValueDictionary[str, ModuleType]" = weakref.WeakValueDictionary()
+_template_module_counter = itertools.count(1)
+_template_module_stats = {"loaded": 0}
+# 估算模板内存时最多遍历的对象数
+MEMORY_ESTIMATE_MAX_OBJECTS = 200000
+# 类型描述中的模块前缀，如 typing.、annotator_template_xxx_1.
+_MODULE_PREFIX_PATTERN = re.compile(r"\b(?:[A-Za-z_]\w*\.)+(?=[A-Za-z_])")
+
+
+def get_template_module_stats() -> Dict[str, int]:
+    """模板模块统计：累计加载数量与当前仍存活的数量"""
+    return {"loaded": _template_module_stats["loaded"], "alive": len(_template_modules)}
+
 
 class SimpleDocumentValidator:
     """简化版文档验证器"""
     
+    # 文件校验时进度回调的记录间隔
+    PROGRESS_INTERVAL = 100
+    # JSON数组文件分片校验时每片的记录数
+    BATCH_SIZE = 1000
+    
     def __init__(self, template_path: str = None):
         self.template_path = template_path
         self.main_model = None
         self.annotation_fields = []
+        self.template_hash = None  # 模板文件内容的SHA-256
+        self._list_adapter = None  # List[主模型] 的TypeAdapter缓存
+        self._list_adapter_model = None
+        self._items_adapter = None  # {"items": List[主模型]} 包装格式的TypeAdapter缓存
+        self._items_adapter_model = None
+        self._field_validators = None  # 标注字段路径 -> TypeAdapter
+        self._extractors = {}  # 编译后的标注字段提取函数
+        self._module = None  # 模板模块，release()时释放
+        self._code: Optional[CodeType] = None  # 模板编译后的字节码
+        self.module_name = None
+        self.memory_estimate = 0  # 模板模块占用内存的估算值（字节）
         
         if template_path:
             self.load_template(template_path)
@@ -53,8 +96,10 @@ class SimpleDocumentValidator:
             
             # 4. 提取标注字段
             self.annotation_fields = self._extract_annotation_fields()
+            self._field_validators = None
+            self._extractors = {}
             
-            return {
+            result = {
                 "valid": True, 
                 "main_model": self.main_model.__name__,
                 "annotation_fields_count": len(self.annotation_fields),
@@ -63,20 +108,54 @@ class SimpleDocumentValidator:
                     "version": "1.0",
                     "description": getattr(self.main_model, '__doc__', '') or ''
                 },
-                "annotation_fields": self.get_annotation_schema()
+                "annotation_fields": self.get_annotation_schema(),
+                "json_schema": self.get_json_schema(),
+                "template_hash": self.template_hash,
+                "memory_estimate": self.memory_estimate
             }
             
+            # 缓存模板元数据，只需要模板结构时不必再执行模板
+            cache = get_template_artifact_cache()
+            if cache is not None:
+                cache.put_metadata(self.template_hash, {key: value for key, value in result.items()
+                                                        if key != "memory_estimate"})
+            return result
+            
         except Exception as e:
             return {"valid": False, "error": f"模板加载失败: {str(e)}"}
     
+    def release(self):
+        """释放模板模块及由其创建的模型类、校验器，调用后验证器不可再使用"""
+        self._module = None
+        self._code = None
+        self.main_model = None
+        self.annotation_fields = []
+        self._list_adapter = None
+        self._list_adapter_model = None
+        self._items_adapter = None
+        self._items_adapter_model = None
+        self._field_validators = None
+        self._extractors = {}
+    
     def _check_syntax(self, template_path: str) -> Dict[str, Any]:
-        """检查Python文件语法"""
+        """检查Python文件语法并编译
+
+        编译结果按内容哈希缓存，同一模板再次加载时直接使用缓存的字节码（已缓存说明语法正确）。
+        """
         try:
-            with open(template_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            with open(template_path, 'rb') as f:
+                raw = f.read()
+            self.template_hash = hash_template_source(raw)
+            content = raw.decode('utf-8')
             
-            # 使用ast解析检查语法
-            ast.parse(content)
+            cache = get_template_artifact_cache()
+            code = cache.get_code(self.template_hash) if cache is not None else None
+            if code is None:
+                # 编译同时完成语法检查，不再单独用ast解析一遍
+                code = compile(content, template_path, "exec", dont_inherit=True)
+                if cache is not None:
+                    cache.put_code(self.template_hash, code)
+            self._code = code
             return {"valid": True}
             
         except SyntaxError as e:
@@ -90,10 +169,16 @@ class SimpleDocumentValidator:
     def _load_module(self, template_path: str) -> Dict[str, Any]:
         """动态加载模块并找到主模型"""
         try:
-            # 动态导入模块
-            spec = importlib.util.spec_from_file_location("template", template_path)
+            # 动态导入模块，每次加载使用唯一的模块名，避免不同模板的类互相覆盖
+            module_name = f"annotator_template_{(self.template_hash or '')[:12]}_{next(_template_module_counter)}"
+            spec = importlib.util.spec_from_file_location(module_name, template_path)
             module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
+            exec(self._code, module.__dict__)
+            self._code = None
+            self._module = module
+            self.module_name = module_name
+            _template_modules[module_name] = module
+            _template_module_stats["loaded"] += 1
             
             # 查找BaseModel类
             models = []
@@ -129,11 +214,37 @@ class SimpleDocumentValidator:
             else:
                 return {"valid": False, "error": "未找到有效的BaseModel类"}
             
+            self.memory_estimate = self._estimate_module_size(module)
             return {"valid": True}
             
         except Exception as e:
             return {"valid": False, "error": f"模块加载失败: {str(e)}"}
     
+    @staticmethod
+    def _estimate_module_size(module: ModuleType) -> int:
+        """粗略估算模板模块占用的内存（字节）
+
+        从模块命名空间出发遍历对象，只统计模板自身定义的类、函数及其引用的数据（包括pydantic核心schema），
+        遇到其他模块的对象即停止。pydantic-core 内部由Rust分配的内存不在统计范围内。
+        """
+        module_dicts = {id(m.__dict__) for m in list(sys.modules.values()) if isinstance(m, ModuleType)}
+        seen = {id(module.__dict__)}
+        stack = [value for key, value in module.__dict__.items() if key != "__builtins__"]
+        total = sys.getsizeof(module.__dict__)
+
+        while stack and len(seen) < MEMORY_ESTIMATE_MAX_OBJECTS:
+            obj = stack.pop()
+            if id(obj) in seen or id(obj) in module_dicts or isinstance(obj, ModuleType):
+                continue
+            if isinstance(obj, type) or callable(obj):
+                if getattr(obj, "__module__", None) != module.__name__:
+                    continue
+            seen.add(id(obj))
+            total += sys.getsizeof(obj)
+            stack.extend(gc.get_referents(obj))
+
+        return total
+
     def _extract_annotation_fields(self, model: Type[BaseModel] = None, 
                                  prefix: str = "", visited: set = None) -> List[AnnotationField]:
         """递归提取标注字段"""
@@ -241,7 +352,8 @@ class SimpleDocumentValidator:
             field_type=field_type,
             required=is_required,
             description=description,
-            constraints=constraints
+            constraints=constraints,
+            field_info=field_info
         )
     
     def _is_basemodel_type(self, type_hint: Type) -> bool:
@@ -287,149 +399,360 @@ class SimpleDocumentValidator:
         except Exception as e:
             return {"valid": False, "error": str(e)}
     
-    def validate_partial_data(self, data: dict) -> Dict[str, Any]:
-        """验证部分数据（用于实时验证）"""
+    def validate_document_json(self, raw: bytes) -> Dict[str, Any]:
+        """直接从JSON字节验证单个文档，不经过json.loads生成中间字典"""
         if not self.main_model:
             return {"valid": False, "error": "未加载模板"}
         
         try:
-            # 对于部分数据，我们创建一个包含默认值的完整对象
-            # 然后只验证提供的字段
-            instance = self.main_model(**data)
-            return {"valid": True, "field_results": {"all_fields": "valid"}}
+            instance = self.main_model.model_validate_json(raw)
+            return {"valid": True, "instance": instance}
         except ValidationError as e:
-            # 返回字段级别的验证结果
-            field_results = {}
-            for error in e.errors():
-                field_path = ".".join(str(loc) for loc in error["loc"])
-                field_results[field_path] = {
-                    "valid": False,
-                    "error": error["msg"]
-                }
-            return {"valid": False, "field_results": field_results}
+            errors = e.errors()
+            # JSON语法错误单独返回，与json.loads失败时的格式一致
+            if errors and errors[0].get("type") == "json_invalid":
+                return {"valid": False, "error": f"JSON格式错误: {errors[0].get('msg', '')}"}
+            return {"valid": False, "errors": errors, "error_details": errors}
         except Exception as e:
             return {"valid": False, "error": str(e)}
     
-    def validate_file(self, file_path: str) -> Dict[str, Any]:
-        """验证JSON/JSONL文件"""
+    def validate_json_array(self, raw: bytes) -> List[Dict[str, Any]]:
+        """直接从JSON数组字节批量验证全部记录
+        
+        全部通过时只经过一次pydantic-core解析；校验失败时才解析为Python对象，
+        再通过 validate_documents 定位每条记录的错误。结果中带有 index。
+        """
+        try:
+            instances = self._get_list_adapter().validate_json(raw)
+            return [
+                {"valid": True, "instance": instance, "index": idx}
+                for idx, instance in enumerate(instances)
+            ]
+        except ValidationError:
+            pass
+        
+        items = json.loads(raw)
+        if not isinstance(items, list):
+            raise ValueError("JSON内容不是数组")
+        
+        results = self.validate_documents(items)
+        for idx, result in enumerate(results):
+            result['index'] = idx
+        return results
+    
+    def _get_list_adapter(self) -> TypeAdapter:
+        """获取（并缓存）List[主模型]的TypeAdapter"""
+        if self._list_adapter is None or self._list_adapter_model is not self.main_model:
+            self._list_adapter = TypeAdapter(List[self.main_model])
+            self._list_adapter_model = self.main_model
+        return self._list_adapter
+    
+    def _get_items_adapter(self) -> TypeAdapter:
+        """获取（并缓存）{"items": List[主模型], ...} 包装格式的TypeAdapter"""
+        if self._items_adapter is None or self._items_adapter_model is not self.main_model:
+            envelope = create_model(
+                f"{self.main_model.__name__}Items",
+                __config__=ConfigDict(extra="allow"),
+                items=(List[self.main_model], ...)
+            )
+            self._items_adapter = TypeAdapter(envelope)
+            self._items_adapter_model = self.main_model
+        return self._items_adapter
+    
+    def validate_documents(self, items: List[Any]) -> List[Dict[str, Any]]:
+        """批量验证多个文档
+        
+        先用 List[主模型] 一次性校验全部记录，失败时按错误位置映射回各条记录；
+        错误无法定位到记录时退回逐条验证。返回结果与 validate_document 一一对应。
+        """
+        if not self.main_model:
+            return [{"valid": False, "error": "未加载模板"} for _ in items]
+        
+        try:
+            instances = self._get_list_adapter().validate_python(items)
+            return [
+                {"valid": True, "instance": instance, "validated_data": item}
+                for instance, item in zip(instances, items)
+            ]
+        except ValidationError as e:
+            errors_by_index = self._group_errors_by_index(e.errors(), len(items))
+        except Exception:
+            errors_by_index = None
+        
+        if errors_by_index is None:
+            return [self.validate_document(item) for item in items]
+        
+        results = []
+        for idx, item in enumerate(items):
+            errors = errors_by_index.get(idx)
+            if errors:
+                results.append({"valid": False, "errors": errors, "error_details": errors})
+            else:
+                results.append({"valid": True, "validated_data": item})
+        return results
+    
+    def _group_errors_by_index(self, errors: List[Dict[str, Any]], 
+                               count: int) -> Optional[Dict[int, List[Dict[str, Any]]]]:
+        """将列表校验错误按记录索引分组，并去掉loc中的索引前缀"""
+        grouped = {}
+        for error in errors:
+            loc = error.get("loc", ())
+            if not loc or not isinstance(loc[0], int) or not 0 <= loc[0] < count:
+                return None
+            error["loc"] = loc[1:]
+            grouped.setdefault(loc[0], []).append(error)
+        return grouped
+    
+    def validate_partial_data(self, data: dict) -> Dict[str, Any]:
+        """验证部分数据（用于实时验证）
+        
+        只校验提交的标注字段，未提交的字段不会报缺失。data 可以是字段路径到值的映射
+        （如 {"entities[0].label": "PER", "category": "A"}），也可以是与文档结构一致的嵌套数据。
+        """
         if not self.main_model:
             return {"valid": False, "error": "未加载模板"}
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
+            field_values = self._collect_field_values(data)
+            if not field_values:
+                return {"valid": False, "error": "未提交任何标注字段", "field_results": {}}
+            
+            field_results = self.validate_fields(field_values)
+            all_valid = all(result["valid"] for result in field_results.values())
+            return {"valid": all_valid, "field_results": field_results}
+        except Exception as e:
+            return {"valid": False, "error": str(e)}
+    
+    def validate_fields(self, field_values: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """按字段路径批量校验标注字段值，只使用各字段自身的类型和约束"""
+        validators = self._get_field_validators()
+        results = {}
+        
+        for path, value in field_values.items():
+            adapter = validators.get(self.normalize_field_path(path))
+            if adapter is None:
+                results[path] = {"valid": False, "error": "未知的标注字段"}
+                continue
+            
+            try:
+                adapter.validate_python(value)
+                results[path] = {"valid": True}
+            except ValidationError as e:
+                error = e.errors()[0]
+                results[path] = {
+                    "valid": False,
+                    "error": error["msg"],
+                    "type": error["type"]
+                }
+        return results
+    
+    @staticmethod
+    def normalize_field_path(path: str) -> str:
+        """将具体路径转换为模板字段路径：entities[0].label / entities.0.label -> entities[].label"""
+        path = re.sub(r"\[\d+\]", "[]", path)
+        return re.sub(r"\.(\d+)(?=\.|$)", "[]", path)
+    
+    def _get_field_validators(self) -> Dict[str, TypeAdapter]:
+        """为每个标注字段编译（并缓存）只包含类型和约束的TypeAdapter"""
+        if self._field_validators is None:
+            validators = {}
+            for field in self.annotation_fields:
+                field_info = field.field_info
+                if field_info is None:
+                    continue
+                if field_info.metadata:
+                    field_type = Annotated[(field_info.annotation, *field_info.metadata)]
+                else:
+                    field_type = field_info.annotation
+                validators[field.path] = TypeAdapter(field_type)
+            self._field_validators = validators
+        return self._field_validators
+    
+    def _collect_field_values(self, data: Any, prefix: str = "") -> Dict[str, Any]:
+        """从提交的数据中找出标注字段的值，键为具体路径（保留列表下标）"""
+        validators = self._get_field_validators()
+        values = {}
+        
+        if isinstance(data, dict):
+            for key, value in data.items():
+                path = f"{prefix}.{key}" if prefix else str(key)
+                if self.normalize_field_path(path) in validators:
+                    values[path] = value
+                elif isinstance(value, (dict, list)):
+                    values.update(self._collect_field_values(value, path))
+        elif isinstance(data, list):
+            for idx, item in enumerate(data):
+                if isinstance(item, (dict, list)):
+                    values.update(self._collect_field_values(item, f"{prefix}[{idx}]"))
+        return values
+    
+    def validate_file(self, file_path: str,
+                      progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+                      should_stop: Optional[Callable[[], bool]] = None,
+                      error_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """验证JSON/JSONL文件
+
+        progress_callback(已处理记录数, 记录总数) 在处理过程中周期性调用；
+        should_stop() 返回True时提前结束，结果中带有 cancelled 标记；
+        error_callback 不为None时未通过的记录在校验过程中逐条交给它处理，不再保存在结果中（results 为空列表）。
+        """
+        if not self.main_model:
+            return {"valid": False, "error": "未加载模板"}
+
+        cancelled = False
+        results = []
+        counts = {"total": 0, "valid": 0}
+
+        def collect(result: Dict[str, Any]):
+            counts["total"] += 1
+            if result.get("valid"):
+                counts["valid"] += 1
+            if error_callback is None:
+                results.append(result)
+            elif not result.get("valid"):
+                error_callback(result)
+
+        try:
+            # 以字节方式读取，由pydantic-core直接解析并校验JSON
+            with open(file_path, 'rb') as f:
                 if file_path.endswith('.jsonl'):
                     # JSONL文件处理
-                    results = []
+                    records_total = self._count_lines(file_path) if progress_callback else None
                     for line_num, line in enumerate(f, 1):
-                        try:
-                            data = json.loads(line.strip())
-                            result = self.validate_document(data)
-                            result['line_number'] = line_num
-                            results.append(result)
-                        except json.JSONDecodeError as e:
-                            results.append({
-                                "valid": False,
-                                "error": f"JSON格式错误: {e}",
-                                "line_number": line_num
-                            })
+                        if should_stop and should_stop():
+                            cancelled = True
+                            break
+                        result = self.validate_document_json(line)
+                        result['line_number'] = line_num
+                        collect(result)
+                        if progress_callback and line_num % self.PROGRESS_INTERVAL == 0:
+                            progress_callback(line_num, records_total)
                 else:
                     # JSON文件处理
-                    data = json.load(f)
-                    if isinstance(data, list):
-                        results = []
-                        for idx, item in enumerate(data):
-                            result = self.validate_document(item)
-                            result['index'] = idx
-                            results.append(result)
+                    raw = f.read()
+                    if raw.lstrip()[:1] == b"[":
+                        cancelled = self._validate_array_slices(raw, collect, progress_callback, should_stop)
                     else:
-                        results = [self.validate_document(data)]
-            
-            valid_count = sum(1 for r in results if r.get("valid"))
-            return {
-                "total": len(results),
-                "valid_count": valid_count,
-                "invalid_count": len(results) - valid_count,
+                        result = self.validate_document_json(raw)
+                        if "error" in result:
+                            # 与原先json.load失败时的返回格式保持一致
+                            return {"valid": False, "error": f"文件处理失败: {result['error']}"}
+                        collect(result)
+
+            if progress_callback and not cancelled:
+                progress_callback(counts["total"], counts["total"])
+
+            file_result = {
+                "total": counts["total"],
+                "valid_count": counts["valid"],
+                "invalid_count": counts["total"] - counts["valid"],
                 "results": results
             }
-            
+            if cancelled:
+                file_result["cancelled"] = True
+            return file_result
+
         except Exception as e:
             return {"valid": False, "error": f"文件处理失败: {str(e)}"}
+
+    def _validate_array_slices(self, raw: bytes, collect: Callable[[Dict[str, Any]], None],
+                               progress_callback: Optional[Callable[[int, Optional[int]], None]],
+                               should_stop: Optional[Callable[[], bool]]) -> bool:
+        """按记录边界把JSON数组切成每片 BATCH_SIZE 条，逐片用 validate_json_array 校验，结果依次交给 collect
+
+        片与片之间检查 should_stop、报告进度。返回是否提前结束，结果中的 index 为在整个数组中的位置。
+        """
+        scanner = RecordScanner(jsonl=False)
+        records = scanner.feed(raw) + scanner.finish()
+        if scanner.error:
+            raise ValueError(scanner.error)
+        
+        for start in range(0, len(records), self.BATCH_SIZE):
+            if should_stop and should_stop():
+                return True
+            batch = records[start:start + self.BATCH_SIZE]
+            for result in self.validate_json_array(b"[" + b",".join(batch) + b"]"):
+                result['index'] += start
+                collect(result)
+            if progress_callback:
+                progress_callback(start + len(batch), len(records))
+        return False
+    
+    def _count_lines(self, file_path: str) -> int:
+        """以二进制方式快速统计文件行数"""
+        count = 0
+        last_byte = b"\n"
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                count += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+        # 最后一行没有换行符时也算一行
+        if last_byte != b"\n":
+            count += 1
+        return count
     
     def extract_annotations(self, data: dict) -> Dict[str, Any]:
-        """提取标注字段值"""
+        """校验数据并提取标注字段值"""
         if not self.main_model:
             return {}
         
         try:
             instance = self.main_model(**data)
-            return self._extract_values_from_instance(instance)
+            return self.get_field_extractor()(instance)
         except Exception:
             return {}
     
-    def _extract_values_from_instance(self, instance: BaseModel, 
-                                    prefix: str = "", visited: set = None) -> Dict[str, Any]:
-        """从实例中提取标注字段值"""
-        if visited is None:
-            visited = set()
-        
-        if id(instance) in visited:
+    def extract_annotations_from_dict(self, data: Any) -> Dict[str, Any]:
+        """从已解析的JSON对象中直接提取标注字段值（不做校验，缺失的字段跳过）"""
+        if not self.main_model or not isinstance(data, dict):
             return {}
-        visited.add(id(instance))
-        
-        values = {}
-        model_fields = getattr(instance.__class__, 'model_fields', {})
-        
-        for field_name, field_info in model_fields.items():
-            try:
-                value = getattr(instance, field_name)
-            except AttributeError:
-                continue
-            
-            current_path = f"{prefix}.{field_name}" if prefix else field_name
-            json_schema_extra = getattr(field_info, 'json_schema_extra', {}) or {}
-            is_annotation = json_schema_extra.get("is_annotation", False)
+        return self.get_field_extractor(from_dict=True)(data)
+    
+    def extract_annotations_json(self, raw) -> Any:
+        """从原始JSON中提取标注字段值，JSON数组返回每个元素的提取结果列表"""
+        data = from_json(raw)
+        if isinstance(data, list):
+            extractor = self.get_field_extractor(from_dict=True)
+            return [extractor(item) if isinstance(item, dict) else {} for item in data]
+        return self.extract_annotations_from_dict(data)
+    
+    def get_field_extractor(self, from_dict: bool = False) -> Callable[[Any], Dict[str, Any]]:
+        """获取（并缓存）由标注字段路径编译出的提取函数
+
+        from_dict=False 时输入为主模型实例，from_dict=True 时输入为JSON对象（字典）。
+        """
+        extractor = self._extractors.get(from_dict)
+        if extractor is None:
+            paths = [(field.path, self._path_segments(field.path)) for field in self.annotation_fields]
+            extractor = compile_extractor(
+                paths, from_dict=from_dict,
+                name=f"{self.main_model.__name__}_{'dict' if from_dict else 'instance'}_extractor"
+            )
+            self._extractors[from_dict] = extractor
+        return extractor
+    
+    def _path_segments(self, path: str) -> List[PathSegment]:
+        """将标注字段路径解析为路径段，同时解析每段在JSON中的键（别名）"""
+        segments = []
+        model = self.main_model
+        for part in path.split("."):
+            is_list = part.endswith("[]")
+            name = part[:-2] if is_list else part
+            field_info = model.model_fields.get(name) if model else None
+            key = (field_info.alias or name) if field_info else name
+            segments.append(PathSegment(name, key, is_list))
             
-            if isinstance(value, BaseModel):
-                # 嵌套BaseModel
-                nested_values = self._extract_values_from_instance(
-                    value, current_path, visited.copy()
-                )
-                values.update(nested_values)
-                
-            elif isinstance(value, list):
-                # 列表处理
-                if is_annotation and all(not isinstance(item, BaseModel) for item in value):
-                    # 基础类型列表
-                    values[current_path] = value
-                else:
-                    # 包含BaseModel的列表
-                    list_values = []
-                    nested_dict_values = {}
-                    
-                    for idx, item in enumerate(value):
-                        if isinstance(item, BaseModel):
-                            item_values = self._extract_values_from_instance(
-                                item, f"{current_path}[{idx}]", visited.copy()
-                            )
-                            for key, val in item_values.items():
-                                clean_key = key.replace(f"{current_path}[{idx}]", f"{current_path}[]")
-                                if clean_key not in nested_dict_values:
-                                    nested_dict_values[clean_key] = []
-                                nested_dict_values[clean_key].append(val)
-                        else:
-                            list_values.append(item)
-                    
-                    if is_annotation and list_values:
-                        values[current_path] = list_values
-                    
-                    values.update(nested_dict_values)
-                    
-            elif is_annotation:
-                # 基础类型标注字段
-                values[current_path] = value
-        
-        visited.remove(id(instance))
-        return values
+            # 下一段所属的模型
+            field_type = getattr(field_info, 'annotation', None)
+            if self._is_optional_type(field_type):
+                field_type = self._get_optional_inner_type(field_type)
+            if self._is_list_of_basemodel(field_type):
+                field_type = get_args(field_type)[0]
+            model = field_type if self._is_basemodel_type(field_type) else None
+        return segments
     
     def get_annotation_schema(self) -> List[Dict[str, Any]]:
         """获取标注字段模式信息"""
@@ -441,6 +764,81 @@ class SimpleDocumentValidator:
             "constraints": field.constraints
         } for field in self.annotation_fields]
     
+    def get_schema_fields(self, model: Type[BaseModel] = None, prefix: str = "",
+                          visited: set = None) -> List[Dict[str, Any]]:
+        """获取主模型全部字段（含嵌套模型本身）的结构描述，路径使用JSON中的键（别名）
+
+        kind 为 model（嵌套模型）、list（List[BaseModel]，路径以[]结尾）或 value（其他类型）。
+        结果只包含可序列化的值，可在进程间传递。
+        """
+        if model is None:
+            model = self.main_model
+            if model is None:
+                return []
+        if visited is None:
+            visited = set()
+        if id(model) in visited:
+            return []
+        visited.add(id(model))
+
+        fields = []
+        for field_name, field_info in getattr(model, 'model_fields', {}).items():
+            field_type = getattr(field_info, 'annotation', None)
+            if field_type is None:
+                continue
+            key = field_info.alias or field_name
+            path = f"{prefix}.{key}" if prefix else key
+            json_schema_extra = getattr(field_info, 'json_schema_extra', None)
+            json_schema_extra = json_schema_extra if isinstance(json_schema_extra, dict) else {}
+            renamed_from = json_schema_extra.get("renamed_from") or []
+
+            inner_type = self._get_optional_inner_type(field_type) if self._is_optional_type(field_type) else field_type
+            if self._is_basemodel_type(inner_type):
+                kind, nested_model, nested_prefix = "model", inner_type, path
+            elif self._is_list_of_basemodel(inner_type):
+                kind, nested_model, nested_prefix = "list", get_args(inner_type)[0], f"{path}[]"
+                path = nested_prefix
+            else:
+                kind, nested_model, nested_prefix = "value", None, None
+
+            field = {
+                "path": path,
+                "key": key,
+                "kind": kind,
+                "type": self._describe_type(field_type),
+                "required": field_info.is_required(),
+                "renamed_from": [renamed_from] if isinstance(renamed_from, str) else list(renamed_from),
+                "is_annotation": bool(json_schema_extra.get("is_annotation", False))
+            }
+            if not field["required"]:
+                try:
+                    field["default"] = to_jsonable_python(field_info.get_default(call_default_factory=True))
+                except Exception:
+                    pass
+            fields.append(field)
+
+            if nested_model is not None:
+                fields.extend(self.get_schema_fields(nested_model, nested_prefix, visited.copy()))
+
+        visited.remove(id(model))
+        return fields
+
+    def get_json_schema(self) -> Dict[str, Any]:
+        """获取主模型的JSON Schema，无法生成时返回空字典"""
+        if not self.main_model:
+            return {}
+        try:
+            return self.main_model.model_json_schema()
+        except Exception:
+            return {}
+    
+    @staticmethod
+    def _describe_type(type_hint: Type) -> str:
+        """类型的完整描述，去掉模块前缀（模板模块名每次加载都不同）"""
+        if inspect.isclass(type_hint) and get_origin(type_hint) is None:
+            return type_hint.__name__
+        return _MODULE_PREFIX_PATTERN.sub("", str(type_hint))
+    
     def _get_type_name(self, type_hint: Type) -> str:
         """获取类型名称"""
         if hasattr(type_hint, '__name__'):
@@ -1,5 +1,6 @@
 import json
 import os
+import threading
 import uuid
 import math
 from datetime import datetime
@@ -14,7 +15,31 @@ from ..models.task import (
 )
 from ..models.annotation import Annotation, AnnotationStatus
 from ..models.file import FileInfo, FileType
+from .logger import get_logger
 from .template_validator import TemplateValidator
+from .annotation_revalidation import simple_annotation_result
+from .change_log import (
+    ACTION_CREATED, ACTION_DELETED, ACTION_SAVED, ACTION_UPDATED, ENTITY_ANNOTATION, ENTITY_DOCUMENT, ENTITY_TASK,
+    get_change_log
+)
+from .record_index import get_record_index_store
+
+logger = get_logger(__name__)
+
+# 元数据文件（tasks.json、files_metadata.json 等）的读-改-写锁，按文件路径区分。
+# 各API模块和后台任务线程各自创建 StorageManager，锁必须是进程级的。
+_json_file_locks: Dict[str, threading.RLock] = {}
+_json_file_locks_guard = threading.Lock()
+
+
+def _json_file_lock(file_path: Path) -> threading.RLock:
+    """返回文件的读-改-写锁"""
+    key = str(file_path)
+    with _json_file_locks_guard:
+        lock = _json_file_locks.get(key)
+        if lock is None:
+            lock = _json_file_locks[key] = threading.RLock()
+        return lock
 
 
 class StorageManager:
@@ -36,6 +61,7 @@ class StorageManager:
             self.data_dir / "public_files" / "templates", 
             self.data_dir / "public_files" / "exports",
             self.data_dir / "tasks",
+            self.data_dir / "validation_reports",
             self.data_dir / "uploads"
         ]
         
@@ -70,10 +96,12 @@ class StorageManager:
             return {}
     
     def _write_json(self, file_path: Path, data: Dict[str, Any]):
-        """写入JSON文件"""
+        """写入JSON文件（先写临时文件再替换，读取方不会读到写了一半的内容）"""
         file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
+        temp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(temp_path, file_path)
     
     def _calculate_task_progress(self, task: Task) -> TaskProgress:
         """计算任务进度"""
@@ -101,6 +129,11 @@ class StorageManager:
             completion_percentage=round(completion_percentage, 2)
         )
     
+    @staticmethod
+    def _progress_snapshot(task: Task) -> Dict[str, Any]:
+        """变更日志中记录的任务状态与进度，推送进度时不必重新读取任务"""
+        return {"task_status": task.status.value, **task.progress.model_dump()}
+    
     def _update_task_status(self, task: Task) -> TaskStatus:
         """根据文档状态自动更新任务状态"""
         if not task.documents:
@@ -123,10 +156,25 @@ class StorageManager:
             validation_result = self.validate_python_template(template_path)
             
             if validation_result["valid"]:
+                annotation_fields = validation_result.get("annotation_fields", [])
+                template_info = validation_result.get("template_info", {})
+                # 任务创建时一次性提取模板结构，之后表单配置等接口直接使用
                 return {
                     "valid": True,
-                    "template_info": validation_result.get("template_info", {}),
-                    "annotation_fields": validation_result.get("annotation_fields", [])
+                    "template_info": template_info,
+                    "annotation_fields": annotation_fields,
+                    "fields": {
+                        "main_model": template_info.get("schema_name"),
+                        "annotation_fields": annotation_fields,
+                        "field_paths": [field["path"] for field in annotation_fields],
+                        "json_schema": validation_result.get("json_schema", {})
+                    },
+                    "validation_result": {
+                        "valid": True,
+                        "template_info": template_info,
+                        "template_hash": validation_result.get("template_hash"),
+                        "extracted_at": datetime.now().isoformat()
+                    }
                 }
             else:
                 return {
@@ -294,7 +342,6 @@ class StorageManager:
     def create_task(self, task_create: TaskCreate, creator_id: str) -> Task:
         """创建任务"""
         tasks_file = self.data_dir / "tasks" / "tasks.json"
-        data = self._read_json(tasks_file)
         
         task_id = f"task_{uuid.uuid4().hex[:8]}"
         
@@ -350,8 +397,13 @@ class StorageManager:
             # 兼容Pydantic v1
             task_dict = new_task.dict()
         
-        data["tasks"].append(task_dict)
-        self._write_json(tasks_file, data)
+        # 解析模板等耗时操作完成后再读取任务列表，读-改-写期间持有锁
+        with _json_file_lock(tasks_file):
+            data = self._read_json(tasks_file)
+            data.setdefault("tasks", []).append(task_dict)
+            self._write_json(tasks_file, data)
+            get_change_log().record(ENTITY_TASK, ACTION_CREATED, task_id, status=new_task.status.value,
+                                    progress=self._progress_snapshot(new_task))
         
         # 创建任务目录
         task_dir = self.data_dir / "tasks" / task_id
@@ -363,82 +415,186 @@ class StorageManager:
     def update_task(self, task_id: str, update_data: Dict[str, Any]) -> Optional[Task]:
         """更新任务"""
         tasks_file = self.data_dir / "tasks" / "tasks.json"
-        data = self._read_json(tasks_file)
-        
-        for i, task_data in enumerate(data.get("tasks", [])):
-            if task_data["id"] == task_id:
-                # 添加更新时间
-                update_data["updated_at"] = datetime.now().isoformat()
-                task_data.update(update_data)
+        with _json_file_lock(tasks_file):
+            data = self._read_json(tasks_file)
+        
+            for i, task_data in enumerate(data.get("tasks", [])):
+                if task_data["id"] == task_id:
+                    # 添加更新时间
+                    update_data["updated_at"] = datetime.now().isoformat()
+                    task_data.update(update_data)
                 
-                # 重新构建任务对象以计算进度
-                updated_task = Task(**task_data)
-                updated_task.progress = self._calculate_task_progress(updated_task)
+                    # 重新构建任务对象以计算进度
+                    updated_task = Task(**task_data)
+                    updated_task.progress = self._calculate_task_progress(updated_task)
                 
-                # 自动更新任务状态
-                auto_status = self._update_task_status(updated_task)
-                if updated_task.status != auto_status:
-                    updated_task.status = auto_status
-                    task_data["status"] = auto_status.value
+                    # 自动更新任务状态
+                    auto_status = self._update_task_status(updated_task)
+                    if updated_task.status != auto_status:
+                        updated_task.status = auto_status
+                        task_data["status"] = auto_status.value
                 
-                # 使用model_dump()替代dict()以兼容Pydantic v2
-                try:
-                    task_dict = updated_task.model_dump()
-                except AttributeError:
-                    # 兼容Pydantic v1
-                    task_dict = updated_task.dict()
+                    # 使用model_dump()替代dict()以兼容Pydantic v2
+                    try:
+                        task_dict = updated_task.model_dump()
+                    except AttributeError:
+                        # 兼容Pydantic v1
+                        task_dict = updated_task.dict()
                 
-                data["tasks"][i] = task_dict
-                self._write_json(tasks_file, data)
-                return updated_task
-        return None
+                    data["tasks"][i] = task_dict
+                    self._write_json(tasks_file, data)
+                    get_change_log().record(ENTITY_TASK, ACTION_UPDATED, task_id, status=updated_task.status.value,
+                                            progress=self._progress_snapshot(updated_task))
+                    return updated_task
+            return None
     
-    def update_document_status(self, task_id: str, document_id: str, status: DocumentStatus) -> Optional[Task]:
-        """更新文档状态并重新计算任务进度"""
+    def update_document_status(self, task_id: str, document_id: str, status: DocumentStatus,
+                               needs_rework: Optional[bool] = None) -> Optional[Task]:
+        """更新文档状态并重新计算任务进度，needs_rework 不为None时同时更新返工标记"""
         tasks_file = self.data_dir / "tasks" / "tasks.json"
-        data = self._read_json(tasks_file)
-        
-        for i, task_data in enumerate(data.get("tasks", [])):
-            if task_data["id"] == task_id:
-                # 更新文档状态
-                for doc in task_data.get("documents", []):
-                    if doc["id"] == document_id:
-                        doc["status"] = status.value
-                        break
+        with _json_file_lock(tasks_file):
+            data = self._read_json(tasks_file)
+        
+            for i, task_data in enumerate(data.get("tasks", [])):
+                if task_data["id"] == task_id:
+                    # 更新文档状态
+                    for doc in task_data.get("documents", []):
+                        if doc["id"] == document_id:
+                            doc["status"] = status.value
+                            if needs_rework is not None:
+                                doc["needs_rework"] = needs_rework
+                            break
                 
-                # 重新构建任务对象
-                updated_task = Task(**task_data)
-                updated_task.progress = self._calculate_task_progress(updated_task)
+                    # 重新构建任务对象
+                    updated_task = Task(**task_data)
+                    updated_task.progress = self._calculate_task_progress(updated_task)
                 
-                # 自动更新任务状态
-                auto_status = self._update_task_status(updated_task)
-                updated_task.status = auto_status
-                task_data["status"] = auto_status.value
-                task_data["updated_at"] = datetime.now().isoformat()
+                    # 自动更新任务状态
+                    auto_status = self._update_task_status(updated_task)
+                    updated_task.status = auto_status
+                    task_data["status"] = auto_status.value
+                    task_data["updated_at"] = datetime.now().isoformat()
                 
-                data["tasks"][i] = updated_task.dict()
-                self._write_json(tasks_file, data)
-                return updated_task
-        return None
+                    data["tasks"][i] = updated_task.dict()
+                    self._write_json(tasks_file, data)
+                    get_change_log().record(ENTITY_DOCUMENT, ACTION_UPDATED, task_id, [document_id], status.value,
+                                            self._progress_snapshot(updated_task))
+                    return updated_task
+            return None
+    
+    def mark_documents_for_rework(self, task_id: str, failed_ids: List[str],
+                                  passed_ids: List[str]) -> Optional[Task]:
+        """根据重新校验结果批量更新返工标记（一次写入）
+
+        未通过的文档标记为需要返工，已完成的退回进行中；通过的文档清除返工标记。
+        """
+        tasks_file = self.data_dir / "tasks" / "tasks.json"
+        with _json_file_lock(tasks_file):
+            data = self._read_json(tasks_file)
+            failed, passed = set(failed_ids), set(passed_ids)
+        
+            for i, task_data in enumerate(data.get("tasks", [])):
+                if task_data["id"] == task_id:
+                    changed_ids = []
+                    for doc in task_data.get("documents", []):
+                        before = (doc.get("status"), doc.get("needs_rework"))
+                        if doc["id"] in failed:
+                            doc["needs_rework"] = True
+                            if doc.get("status") == DocumentStatus.COMPLETED.value:
+                                doc["status"] = DocumentStatus.IN_PROGRESS.value
+                        elif doc["id"] in passed:
+                            doc["needs_rework"] = False
+                        if (doc.get("status"), doc.get("needs_rework")) != before:
+                            changed_ids.append(doc["id"])
+                
+                    updated_task = Task(**task_data)
+                    updated_task.progress = self._calculate_task_progress(updated_task)
+                    auto_status = self._update_task_status(updated_task)
+                    updated_task.status = auto_status
+                    updated_task.updated_at = datetime.now()
+                
+                    data["tasks"][i] = updated_task.model_dump()
+                    self._write_json(tasks_file, data)
+                    get_change_log().record(ENTITY_DOCUMENT, ACTION_UPDATED, task_id, changed_ids,
+                                            progress=self._progress_snapshot(updated_task))
+                    return updated_task
+            return None
+    
+    def get_annotation_files(self, task_id: str) -> List[Path]:
+        """获取任务下已保存的全部标注文件"""
+        annotation_dir = self.data_dir / "tasks" / task_id / "annotations"
+        if not annotation_dir.exists():
+            return []
+        return sorted(annotation_dir.glob("*.json"))
+    
+    def save_revalidation_index(self, task_id: str, index: Dict[str, Any]):
+        """保存任务标注数据的重新校验结果（逐文档通过/失败索引）"""
+        task_dir = self.data_dir / "tasks" / task_id
+        task_dir.mkdir(parents=True, exist_ok=True)
+        self._write_json(task_dir / "revalidation.json", index)
+    
+    def get_revalidation_index(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务最近一次重新校验的结果"""
+        index_file = self.data_dir / "tasks" / task_id / "revalidation.json"
+        if not index_file.exists():
+            return None
+        return self._read_json(index_file)
+    
+    def save_migration_state(self, task_id: str, state: Dict[str, Any]):
+        """保存任务标注数据的模板迁移进度（断点续跑用）"""
+        task_dir = self.data_dir / "tasks" / task_id
+        task_dir.mkdir(parents=True, exist_ok=True)
+        self._write_json(task_dir / "migration.json", state)
+    
+    def get_migration_state(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务最近一次模板迁移的进度和结果"""
+        state_file = self.data_dir / "tasks" / task_id / "migration.json"
+        if not state_file.exists():
+            return None
+        return self._read_json(state_file)
+    
+    def update_task_template(self, task_id: str, template_path: str,
+                             expected_path: Optional[str] = None) -> Optional[Task]:
+        """将任务关联的模板切换为另一个模板文件
+
+        expected_path 不为None时只在任务当前模板仍为该文件时切换（检查与写入在同一把锁内），否则返回None。
+        """
+        template_info = self._parse_template_file(template_path)
+        template = TaskTemplate(
+            filename=os.path.basename(template_path),
+            file_path=template_path,
+            fields=template_info.get("fields"),
+            validation_result=template_info.get("validation_result")
+        )
+        tasks_file = self.data_dir / "tasks" / "tasks.json"
+        with _json_file_lock(tasks_file):
+            if expected_path is not None:
+                task = self.get_task_by_id(task_id)
+                current = task.template.file_path if task and task.template else None
+                if current != expected_path:
+                    return None
+            return self.update_task(task_id, {"template": template.model_dump()})
     
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
         tasks_file = self.data_dir / "tasks" / "tasks.json"
-        data = self._read_json(tasks_file)
-        
-        for i, task_data in enumerate(data.get("tasks", [])):
-            if task_data["id"] == task_id:
-                del data["tasks"][i]
-                self._write_json(tasks_file, data)
+        with _json_file_lock(tasks_file):
+            data = self._read_json(tasks_file)
+        
+            for i, task_data in enumerate(data.get("tasks", [])):
+                if task_data["id"] == task_id:
+                    del data["tasks"][i]
+                    self._write_json(tasks_file, data)
+                    get_change_log().record(ENTITY_TASK, ACTION_DELETED, task_id)
                 
-                # 删除任务目录
-                task_dir = self.data_dir / "tasks" / task_id
-                if task_dir.exists():
-                    import shutil
-                    shutil.rmtree(task_dir)
+                    # 删除任务目录
+                    task_dir = self.data_dir / "tasks" / task_id
+                    if task_dir.exists():
+                        import shutil
+                        shutil.rmtree(task_dir)
                 
-                return True
-        return False
+                    return True
+            return False
 
     # 标注管理
     def get_annotation(self, task_id: str, document_id: str) -> Optional[Annotation]:
@@ -456,6 +612,8 @@ class StorageManager:
         
         annotation_file = annotation_dir / f"{annotation.document_id}.json"
         annotation.updated_at = datetime.now()
+        # 变更日志首次加载时会扫描已有标注文件，须在写入前加载，避免本次保存被记录两次
+        change_log = get_change_log()
         
         # 使用model_dump()替代dict()以兼容Pydantic v2
         try:
@@ -465,16 +623,20 @@ class StorageManager:
             annotation_dict = annotation.dict()
         
         self._write_json(annotation_file, annotation_dict)
+        change_log.record(ENTITY_ANNOTATION, ACTION_SAVED, annotation.task_id, [annotation.document_id],
+                          annotation.status.value)
         
         # 生成简洁版本的标注结果文件（与原始文档结构一致）
         if annotation.annotation_data:
             self._save_simple_annotation_result(annotation)
         
-        # 更新文档状态
+        # 更新文档状态，重新保存（已通过校验）后清除返工标记
         if annotation.status == AnnotationStatus.COMPLETED:
-            self.update_document_status(annotation.task_id, annotation.document_id, DocumentStatus.COMPLETED)
+            self.update_document_status(annotation.task_id, annotation.document_id, DocumentStatus.COMPLETED,
+                                        needs_rework=False)
         elif annotation.status == AnnotationStatus.IN_PROGRESS:
-            self.update_document_status(annotation.task_id, annotation.document_id, DocumentStatus.IN_PROGRESS)
+            self.update_document_status(annotation.task_id, annotation.document_id, DocumentStatus.IN_PROGRESS,
+                                        needs_rework=False)
         
         return annotation
     
@@ -486,26 +648,7 @@ class StorageManager:
             results_dir.mkdir(parents=True, exist_ok=True)
             
             # 从标注数据中提取简洁结果
-            annotation_data = annotation.annotation_data
-            simple_result = None
-            
-            # 处理不同的数据结构
-            if isinstance(annotation_data, dict):
-                if 'items' in annotation_data and isinstance(annotation_data['items'], list):
-                    # 数组结构：取items中的内容
-                    simple_result = annotation_data['items']
-                elif 'content' in annotation_data:
-                    # 单文档结构：取content中的内容
-                    simple_result = annotation_data['content']
-                else:
-                    # 直接使用标注数据，但移除标注相关的元数据
-                    simple_result = self._clean_annotation_metadata(annotation_data)
-            elif isinstance(annotation_data, list):
-                # 直接是数组
-                simple_result = annotation_data
-            else:
-                # 其他情况，直接使用
-                simple_result = annotation_data
+            simple_result = simple_annotation_result(annotation.annotation_data)
             
             # 保存简洁结果文件
             result_file = results_dir / f"{annotation.document_id}.json"
@@ -514,50 +657,32 @@ class StorageManager:
                 
         except Exception as e:
             # 如果生成简洁版本失败，记录错误但不影响主要流程
-            print(f"生成简洁标注结果失败: {str(e)}")
-    
-    def _clean_annotation_metadata(self, data):
-        """清理标注数据中的元数据，保留原始文档结构"""
-        if isinstance(data, dict):
-            # 创建清理后的副本
-            cleaned = {}
-            # 排除一些标注过程中的元数据字段
-            exclude_fields = {
-                'annotation_id', 'annotator_id', 'annotation_status', 
-                'created_at', 'updated_at', 'validation_errors'
-            }
-            
-            for key, value in data.items():
-                if key not in exclude_fields:
-                    if isinstance(value, (dict, list)):
-                        cleaned[key] = self._clean_annotation_metadata(value)
-                    else:
-                        cleaned[key] = value
-            return cleaned
-        elif isinstance(data, list):
-            return [self._clean_annotation_metadata(item) for item in data]
-        else:
-            return data
-
+            logger.warning("生成简洁标注结果失败: %s", str(e))
+    
     # 文件管理
     def save_file_info(self, file_info: FileInfo):
         """保存文件信息到元数据"""
+        self.save_file_infos([file_info])
+
+    def save_file_infos(self, file_infos: List[FileInfo]):
+        """一次写入多个文件信息（已存在的更新，否则添加），元数据文件只读写一次"""
         files_file = self.data_dir / "public_files" / "files_metadata.json"
-        data = self._read_json(files_file)
-        
-        if "files" not in data:
-            data["files"] = []
-        
-        # 检查是否已存在，如果存在则更新
-        for i, existing_file in enumerate(data["files"]):
-            if existing_file["id"] == file_info.id:
-                data["files"][i] = file_info.dict()
-                self._write_json(files_file, data)
-                return
-        
-        # 如果不存在则添加
-        data["files"].append(file_info.dict())
-        self._write_json(files_file, data)
+        with _json_file_lock(files_file):
+            data = self._read_json(files_file)
+            
+            if "files" not in data:
+                data["files"] = []
+            
+            positions = {existing_file["id"]: i for i, existing_file in enumerate(data["files"])}
+            for file_info in file_infos:
+                if file_info.id in positions:
+                    # 检查是否已存在，如果存在则更新
+                    data["files"][positions[file_info.id]] = file_info.dict()
+                else:
+                    # 如果不存在则添加
+                    positions[file_info.id] = len(data["files"])
+                    data["files"].append(file_info.dict())
+            self._write_json(files_file, data)
 
     def get_file_content(self, file_path: str) -> Optional[str]:
         """获取文件内容"""
@@ -605,13 +730,14 @@ class StorageManager:
     def delete_file_info(self, file_id: str) -> bool:
         """删除文件元数据"""
         files_file = self.data_dir / "public_files" / "files_metadata.json"
-        data = self._read_json(files_file)
-        
-        for i, file_data in enumerate(data.get("files", [])):
-            if file_data["id"] == file_id:
-                del data["files"][i]
-                self._write_json(files_file, data)
-                return True
+        with _json_file_lock(files_file):
+            data = self._read_json(files_file)
+            
+            for i, file_data in enumerate(data.get("files", [])):
+                if file_data["id"] == file_id:
+                    del data["files"][i]
+                    self._write_json(files_file, data)
+                    return True
         return False
     
     def delete_physical_file(self, file_path: str) -> bool:
@@ -620,6 +746,7 @@ class StorageManager:
             full_path = self.data_dir / file_path
             if full_path.exists():
                 full_path.unlink()
+                get_record_index_store().remove(file_path)
                 return True
             return False
         except Exception:
@@ -635,7 +762,9 @@ class StorageManager:
                 return {
                     "valid": True,
                     "template_info": validation_result.get("template_info", {}),
-                    "annotation_fields": validation_result.get("annotation_fields", [])
+                    "annotation_fields": validation_result.get("annotation_fields", []),
+                    "json_schema": validation_result.get("json_schema", {}),
+                    "template_hash": validation_result.get("template_hash")
                 }
             else:
                 return {
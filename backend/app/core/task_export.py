@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+任务数据导出
+逐文档、逐条记录流式导出任务数据，内存占用与任务规模无关：
+- JSONL：有标注结果的文档导出标注结果，没有的导出原始文档；每条记录带有来源信息（任务、文档、
+  记录序号、标注员、状态）。JSON文档按单个文档读入，JSONL文档逐行读取并直接拼接原始字节。
+- CSV/TSV：只导出标注结果，以模板的标注字段路径为列；entities[].label 这类列表路径展开为多行，
+  同一记录的不同列表按下标对齐（item_index），更深层的列表以JSON字符串写入单元格。
+数据按约 CHUNK_SIZE 字节分批产出，可选gzip压缩。
+
+导出文件保存在 public_files/exports 下：{export_id}.{扩展名} 为数据，{export_id}.json 为导出信息。
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pydantic_core import from_json, to_json
+
+from ..models.task import Task, TaskDocument
+from .annotation_revalidation import simple_annotation_result
+from .field_extractor import PathSegment, compile_extractor
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+SOURCE_ANNOTATION = "annotation"  # 标注结果
+SOURCE_DOCUMENT = "document"  # 尚未标注，原始文档
+
+# 流式输出时每次产出的数据块大小
+CHUNK_SIZE = 64 * 1024
+
+# CSV/TSV 中每行开头的来源信息列
+TABLE_COLUMNS = ["task_id", "document_id", "filename", "record_index", "item_index",
+                 "status", "annotator_id", "reviewer_id", "updated_at"]
+
+_EXPORT_ID_PATTERN = re.compile(r"^export_[0-9a-f]{12}$")
+
+
+def new_export_id() -> str:
+    return f"export_{uuid.uuid4().hex[:12]}"
+
+
+def _read_annotation(data_dir: Path, task_id: str, document_id: str) -> Optional[Dict[str, Any]]:
+    """读取文档的标注文件，不存在或无法解析时返回None"""
+    path = data_dir / "tasks" / task_id / "annotations" / f"{document_id}.json"
+    try:
+        with open(path, 'rb') as f:
+            annotation = from_json(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("标注文件读取失败，导出原始文档: %s，%s", path, str(e))
+        return None
+    return annotation if isinstance(annotation, dict) else None
+
+
+def _iter_document_file(path: Path) -> Iterator[bytes]:
+    """逐条产出原始文档中的记录（紧凑JSON字节）"""
+    with open(path, 'rb') as f:
+        if path.suffix == '.jsonl':
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+            return
+        data = from_json(f.read())
+    for item in data if isinstance(data, list) else [data]:
+        yield to_json(item)
+
+
+def _annotation_provenance(annotation: Dict[str, Any], document: TaskDocument) -> Dict[str, Any]:
+    return {
+        "source": SOURCE_ANNOTATION,
+        "status": annotation.get("status"),
+        "annotator_id": annotation.get("annotator_id"),
+        "reviewer_id": annotation.get("reviewer_id"),
+        "updated_at": annotation.get("updated_at"),
+        "needs_rework": document.needs_rework
+    }
+
+
+def annotation_items(data_dir: Path, task_id: str,
+                     document: TaskDocument) -> Optional[Tuple[Dict[str, Any], List[Any]]]:
+    """返回文档标注结果的来源信息和记录列表，文档尚未标注时返回None"""
+    annotation = _read_annotation(data_dir, task_id, document.id)
+    if not annotation or not annotation.get("annotation_data"):
+        return None
+    result = simple_annotation_result(annotation["annotation_data"])
+    return _annotation_provenance(annotation, document), result if isinstance(result, list) else [result]
+
+
+def document_records(data_dir: Path, task_id: str,
+                     document: TaskDocument) -> Tuple[Dict[str, Any], Iterator[bytes]]:
+    """返回文档的来源信息和记录迭代器（每条记录为紧凑JSON字节）"""
+    annotated = annotation_items(data_dir, task_id, document)
+    if annotated:
+        provenance, items = annotated
+        return provenance, (to_json(item) for item in items)
+
+    provenance = {
+        "source": SOURCE_DOCUMENT,
+        "status": document.status.value,
+        "annotator_id": None,
+        "reviewer_id": None,
+        "updated_at": None,
+        "needs_rework": document.needs_rework
+    }
+    return provenance, _iter_document_file(data_dir / document.file_path)
+
+
+def iter_task_jsonl(data_dir: Path, tasks: List[Task],
+                    progress: Optional[Callable[[TaskDocument, int], None]] = None) -> Iterator[bytes]:
+    """按JSONL格式流式产出任务数据，每个数据块约 CHUNK_SIZE 字节
+
+    每行格式：{"task_id", "document_id", "filename", "source", "status", "annotator_id", "reviewer_id",
+    "updated_at", "needs_rework", "record_index", "data"}。progress(文档, 记录数) 在每个文档导出后调用。
+    """
+    buffer = bytearray()
+    for task in tasks:
+        for document in task.documents:
+            try:
+                provenance, records = document_records(data_dir, task.id, document)
+                # 同一文档的记录共用同一段来源信息，只序列化一次
+                head = to_json({
+                    "task_id": task.id,
+                    "document_id": document.id,
+                    "filename": document.filename,
+                    **provenance
+                })
+                prefix = head[:-1] + b',"record_index":'
+                count = 0
+                for count, data in enumerate(records, 1):
+                    buffer += prefix
+                    buffer += str(count - 1).encode()
+                    buffer += b',"data":'
+                    buffer += data
+                    buffer += b'}\n'
+                    if len(buffer) >= CHUNK_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+            except (OSError, ValueError) as e:
+                raise ValueError(f"文档 {document.filename} 导出失败: {str(e)}")
+            if progress:
+                progress(document, count)
+    if buffer:
+        yield bytes(buffer)
+
+
+def table_field_paths(schema_fields: List[Dict[str, Any]]) -> List[str]:
+    """从模板字段结构（SimpleDocumentValidator.get_schema_fields）中取出作为列的标注字段路径
+
+    路径使用JSON中的键（别名）；标注字段下还有标注子字段时只保留子字段，避免同一数据出现在两列中。
+    """
+    paths = [field["path"] for field in schema_fields if field.get("is_annotation")]
+    return [
+        path for path in paths
+        if not any(other.startswith(f"{path}.") or other.startswith(f"{path}[].") for other in paths)
+    ]
+
+
+def _compile_table_extractor(paths: List[str]) -> Callable[[Any], Dict[str, Any]]:
+    """由字段路径编译按键取值的提取函数"""
+    return compile_extractor(
+        [(path, [PathSegment(part[:-2] if part.endswith("[]") else part,
+                             part[:-2] if part.endswith("[]") else part,
+                             part.endswith("[]"))
+                 for part in path.split(".")])
+         for path in paths],
+        from_dict=True,
+        name="table_export_extractor"
+    )
+
+
+def _cell(value: Any) -> Any:
+    """单元格的值：None为空，布尔值与对象按JSON格式输出"""
+    if value is None:
+        return ""
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return value
+    return to_json(value).decode('utf-8')
+
+
+def _table_rows(values: Dict[str, Any], paths: List[str], list_paths: List[str]) -> Iterator[Tuple[int, List[Any]]]:
+    """将一条记录的提取结果按列表路径展开为多行，返回 (列表下标, 各列的值)"""
+    rows = max((len(values[path]) for path in list_paths if path in values), default=0)
+    if rows == 0:
+        yield 0, [_cell(values.get(path)) if path not in list_paths else "" for path in paths]
+        return
+    for index in range(rows):
+        row = []
+        for path in paths:
+            value = values.get(path)
+            if path in list_paths:
+                value = value[index] if value is not None and index < len(value) else None
+            row.append(_cell(value))
+        yield index, row
+
+
+def iter_task_table(data_dir: Path, tasks: List[Task], task_paths: Dict[str, List[str]],
+                    delimiter: str = ",",
+                    progress: Optional[Callable[[TaskDocument, int], None]] = None) -> Iterator[bytes]:
+    """按CSV/TSV格式流式产出任务的标注数据，每个数据块约 CHUNK_SIZE 字节
+
+    task_paths 为每个任务作为列的标注字段路径；多个任务的列取并集，任务没有的列留空。
+    没有标注结果的文档跳过。progress(文档, 输出行数) 在每个文档导出后调用。
+    """
+    columns: List[str] = []
+    for task in tasks:
+        for path in task_paths.get(task.id, []):
+            if path not in columns:
+                columns.append(path)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(TABLE_COLUMNS + columns)
+    extractors: Dict[Tuple[str, ...], Callable[[Any], Dict[str, Any]]] = {}
+
+    for task in tasks:
+        paths = task_paths.get(task.id, [])
+        key = tuple(paths)
+        if key not in extractors:
+            extractors[key] = _compile_table_extractor(paths)
+        extractor = extractors[key]
+        list_paths = [path for path in paths if "[]" in path]
+        # 本任务的列在输出列中的位置
+        positions = [columns.index(path) for path in paths]
+
+        for document in task.documents:
+            count = 0
+            try:
+                annotated = annotation_items(data_dir, task.id, document)
+            except (OSError, ValueError) as e:
+                raise ValueError(f"文档 {document.filename} 导出失败: {str(e)}")
+            if annotated:
+                provenance, items = annotated
+                head = [task.id, document.id, document.filename]
+                tail = [_cell(provenance["status"]), _cell(provenance["annotator_id"]),
+                        _cell(provenance["reviewer_id"]), _cell(provenance["updated_at"])]
+                for record_index, item in enumerate(items):
+                    values = extractor(item) if isinstance(item, dict) else {}
+                    for item_index, row in _table_rows(values, paths, list_paths):
+                        cells = [""] * len(columns)
+                        for position, value in zip(positions, row):
+                            cells[position] = value
+                        writer.writerow(head + [record_index, item_index] + tail + cells)
+                        count += 1
+                        if buffer.tell() >= CHUNK_SIZE:
+                            yield buffer.getvalue().encode('utf-8')
+                            buffer.seek(0)
+                            buffer.truncate()
+            if progress:
+                progress(document, count)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """对数据块做流式gzip压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def write_export_file(chunks: Iterator[bytes], path: Path) -> int:
+    """将数据块写入导出文件，先写临时文件，完成后再改名；返回写入的字节数"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.name}.part")
+    written = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return written
+
+
+def export_metadata_path(exports_dir: Path, export_id: str) -> Optional[Path]:
+    """导出信息文件路径，ID不合法时返回None"""
+    if not _EXPORT_ID_PATTERN.match(export_id):
+        return None
+    return Path(exports_dir) / f"{export_id}.json"
+
+
+def save_export_metadata(exports_dir: Path, export_id: str, metadata: Dict[str, Any]):
+    """保存导出信息"""
+    path = export_metadata_path(exports_dir, export_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2, default=str)
+
+
+def load_export_metadata(exports_dir: Path, export_id: str) -> Optional[Dict[str, Any]]:
+    """读取导出信息，不存在时返回None"""
+    path = export_metadata_path(exports_dir, export_id)
+    if not path or not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
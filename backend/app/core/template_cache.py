@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板产物缓存
+以模板文件内容的SHA-256为键，缓存编译后的字节码和加载模板时提取的元数据：
+- 字节码（marshal格式，按解释器版本区分）：再次加载同一模板时跳过语法解析和编译，直接执行
+- 元数据（模板信息、标注字段、JSON Schema）：只需要模板结构的场景不必执行模板
+
+缓存目录下每个模板对应 {hash}.{cache_tag}.bin 与 {hash}.json 两个文件，写入时先写临时文件再替换，
+API进程与模板工作进程可以共用同一目录。启动时不读取任何缓存，首次用到某个模板时才从磁盘加载。
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import sys
+import threading
+from pathlib import Path
+from types import CodeType
+from typing import Any, Dict, Optional
+
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+# 字节码与解释器版本相关，文件名中带上版本标记，升级Python后自动失效
+_CACHE_TAG = sys.implementation.cache_tag or "python"
+
+
+def hash_template_source(raw: bytes) -> str:
+    """模板文件内容的哈希（与 SimpleDocumentValidator.template_hash 一致）"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+def hash_template_file(template_path: str) -> str:
+    """读取模板文件并计算内容哈希"""
+    with open(template_path, 'rb') as f:
+        return hash_template_source(f.read())
+
+
+class TemplateArtifactCache:
+    """模板字节码与元数据缓存"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self._codes: Dict[str, CodeType] = {}
+        self._metadata: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"code_hits": 0, "code_misses": 0, "metadata_hits": 0, "metadata_misses": 0}
+
+    def _code_path(self, template_hash: str) -> Path:
+        return self.cache_dir / f"{template_hash}.{_CACHE_TAG}.bin"
+
+    def _metadata_path(self, template_hash: str) -> Path:
+        return self.cache_dir / f"{template_hash}.json"
+
+    def _write(self, path: Path, data: bytes):
+        """原子写入，多个进程同时写同一个文件时以最后一次为准"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def get_code(self, template_hash: str) -> Optional[CodeType]:
+        """获取缓存的字节码，没有缓存或缓存损坏时返回None"""
+        code = self._codes.get(template_hash)
+        if code is None:
+            try:
+                with open(self._code_path(template_hash), 'rb') as f:
+                    code = marshal.loads(f.read())
+            except FileNotFoundError:
+                pass
+            except (OSError, EOFError, ValueError, TypeError) as e:
+                logger.warning("模板字节码缓存损坏，将重新编译: %s，%s", template_hash, str(e))
+            if not isinstance(code, CodeType):
+                code = None
+        with self._lock:
+            if code is None:
+                self._stats["code_misses"] += 1
+            else:
+                self._stats["code_hits"] += 1
+                self._codes[template_hash] = code
+        return code
+
+    def put_code(self, template_hash: str, code: CodeType):
+        """保存编译后的字节码"""
+        with self._lock:
+            self._codes[template_hash] = code
+        try:
+            self._write(self._code_path(template_hash), marshal.dumps(code))
+        except OSError as e:
+            logger.warning("保存模板字节码缓存失败: %s，%s", template_hash, str(e))
+
+    def get_metadata(self, template_hash: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的模板元数据（load_template 成功时的返回内容）"""
+        metadata = self._metadata.get(template_hash)
+        if metadata is None:
+            try:
+                with open(self._metadata_path(template_hash), 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.warning("模板元数据缓存损坏: %s，%s", template_hash, str(e))
+        with self._lock:
+            if metadata is None:
+                self._stats["metadata_misses"] += 1
+            else:
+                self._stats["metadata_hits"] += 1
+                self._metadata[template_hash] = metadata
+        return metadata
+
+    def put_metadata(self, template_hash: str, metadata: Dict[str, Any]):
+        """保存模板元数据，已有缓存时不重复写入"""
+        with self._lock:
+            if template_hash in self._metadata:
+                return
+            self._metadata[template_hash] = metadata
+        if self._metadata_path(template_hash).exists():
+            return
+        try:
+            self._write(self._metadata_path(template_hash),
+                        json.dumps(metadata, ensure_ascii=False, default=str).encode('utf-8'))
+        except OSError as e:
+            logger.warning("保存模板元数据缓存失败: %s，%s", template_hash, str(e))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            return {**self._stats, "codes_loaded": len(self._codes), "metadata_loaded": len(self._metadata)}
+
+
+_cache: Optional[TemplateArtifactCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_template_artifact_cache() -> Optional[TemplateArtifactCache]:
+    """获取全局模板产物缓存，配置中关闭时返回None"""
+    global _cache
+    from ..config import settings
+
+    if not settings.template_artifact_cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TemplateArtifactCache(f"{settings.data_dir}/template_cache")
+        return _cache
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板结构迁移
+模板演进（字段改名、移动、嵌套模型拆分、新增带默认值的字段、删除字段）后，
+比较新旧模板的字段结构（SimpleDocumentValidator.get_schema_fields）生成迁移计划，
+再按计划改写任务下已保存的标注文件。
+
+迁移计划是可序列化的字典，可以在工作进程中执行，也可以由管理员调整操作后再提交。
+操作中的路径使用JSON中的键，列表元素用 name[] 表示，按顺序执行：
+    {"op": "rename", "from": "entities[].label", "to": "entities[].tag"}  同一对象内改键名（保持键的顺序）
+    {"op": "move", "from": "city", "to": "address.city"}                 在同一列表元素范围内移动
+    {"op": "drop", "path": "legacy"}                                    删除字段
+    {"op": "fill_default", "path": "priority", "value": 0}              字段缺失时填入默认值
+所有操作都是幂等的，中断后重新执行不会再次改动已迁移的数据。
+写回前确认标注文件仍是读取时的版本，迁移期间被保存过的文档记为失败、不覆盖，重新执行迁移时再处理。
+"""
+
+import copy
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+from .annotation_revalidation import annotation_objects, simple_annotation_result
+
+OP_RENAME = "rename"
+OP_MOVE = "move"
+OP_DROP = "drop"
+OP_FILL_DEFAULT = "fill_default"
+
+# 结果中保留的失败文件数
+MAX_FAILURES = 20
+
+Segments = List[Tuple[str, bool]]
+
+
+def _split_path(path: str) -> Segments:
+    """将字段路径拆分为 (键, 是否列表) 段"""
+    segments = []
+    for part in path.split("."):
+        is_list = part.endswith("[]")
+        segments.append((part[:-2] if is_list else part, is_list))
+    return segments
+
+
+def _parent_path(path: str) -> str:
+    return path.rsplit(".", 1)[0] if "." in path else ""
+
+
+def _last_key(path: str) -> str:
+    key = path.rsplit(".", 1)[-1]
+    return key[:-2] if key.endswith("[]") else key
+
+
+def _scope_length(segments: Segments) -> int:
+    """字段所在的列表元素范围：最后一个列表段（不含字段自身）之后的位置"""
+    for index in range(len(segments) - 2, -1, -1):
+        if segments[index][1]:
+            return index + 1
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# 模板差异 -> 迁移计划
+# ---------------------------------------------------------------------------
+
+def compute_plan_id(operations: List[Dict[str, Any]]) -> str:
+    """迁移操作的指纹，用于断点续跑时确认是同一个迁移计划"""
+    raw = json.dumps(operations, ensure_ascii=False, sort_keys=True, default=str)
+    return f"plan_{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:12]}"
+
+
+class _PlanBuilder:
+    """按新模板字段自上而下匹配旧模板字段，生成迁移操作"""
+
+    def __init__(self, old_fields: List[Dict[str, Any]], new_fields: List[Dict[str, Any]]):
+        self.old = {field["path"]: field for field in old_fields}
+        self.new = {field["path"]: field for field in new_fields}
+        self.matches: Dict[str, str] = {}  # 新路径 -> 旧路径
+        self.matched_old: set = set()
+        self.moved: Dict[str, str] = {}  # 已生成移动操作的 旧路径 -> 新路径
+        self.operations: List[Dict[str, Any]] = []
+        self.unresolved: List[Dict[str, Any]] = []
+        self.warnings: List[Dict[str, Any]] = []
+        # 新字段按深度排序，父字段总是先于子字段处理
+        self.new_order = sorted(self.new, key=lambda path: path.count("."))
+
+    def current_path(self, old_path: str) -> str:
+        """已生成的操作执行后，旧路径上的数据当前所在的路径"""
+        prefix = old_path
+        while prefix:
+            if prefix in self.moved:
+                return self.moved[prefix] + old_path[len(prefix):]
+            prefix = _parent_path(prefix)
+        return old_path
+
+    def _match(self, new_path: str, old_path: str):
+        self.matches[new_path] = old_path
+        self.matched_old.add(old_path)
+        current = self.current_path(old_path)
+        if current == new_path:
+            return
+        parent_same = _parent_path(current) == _parent_path(new_path)
+        from_segments, to_segments = _split_path(current), _split_path(new_path)
+        scope = _scope_length(from_segments)
+        if scope != _scope_length(to_segments) or from_segments[:scope] != to_segments[:scope]:
+            self.unresolved.append({
+                "path": new_path, "from": old_path,
+                "reason": "字段跨列表元素移动，无法自动迁移"
+            })
+            return
+        self.operations.append({"op": OP_RENAME if parent_same else OP_MOVE, "from": current, "to": new_path})
+        self.moved[old_path] = new_path
+
+    def _implied(self, new_path: str) -> Optional[str]:
+        """父字段迁移后，自然落到该新路径上的旧字段"""
+        for old_path in self.old:
+            if old_path not in self.matched_old and self.current_path(old_path) == new_path:
+                return old_path
+        return None
+
+    def _hinted(self, new_path: str, field: Dict[str, Any]) -> Optional[str]:
+        """模板字段 json_schema_extra 中 renamed_from 指定的旧字段"""
+        for hint in field.get("renamed_from") or []:
+            if "." not in hint:
+                # 只写了旧键名，按同一父对象解析（父对象可能也已改名）
+                parent = _parent_path(new_path)
+                old_parent = self.matches.get(parent, parent) if parent else ""
+                hint = f"{old_parent}.{hint}" if old_parent else hint
+            if field["kind"] == "list" and not hint.endswith("[]"):
+                hint += "[]"
+            if hint in self.old and hint not in self.matched_old:
+                return hint
+            self.warnings.append({"path": new_path, "reason": f"renamed_from 指定的旧字段 {hint} 不存在或已被匹配"})
+        return None
+
+    def _child_keys(self, fields: Dict[str, Dict[str, Any]], path: str) -> frozenset:
+        prefix = path + "."
+        return frozenset(
+            other[len(prefix):] for other in fields
+            if other.startswith(prefix) and "." not in other[len(prefix):]
+        )
+
+    def _guessed(self, new_path: str, field: Dict[str, Any]) -> Optional[str]:
+        """没有提示时按结构推断：嵌套模型比较子字段，普通字段比较键名和类型"""
+        candidates = [
+            old_path for old_path, old_field in self.old.items()
+            if old_path not in self.matched_old and old_field["kind"] == field["kind"]
+        ]
+        if field["kind"] != "value":
+            child_keys = self._child_keys(self.new, new_path)
+            same = [old_path for old_path in candidates if self._child_keys(self.old, old_path) == child_keys]
+            return same[0] if len(same) == 1 else None
+
+        typed = [old_path for old_path in candidates if self.old[old_path]["type"] == field["type"]]
+        # 键名相同：在其他位置找到同名字段（移动、嵌套模型拆分）
+        same_key = [old_path for old_path in typed if _last_key(old_path) == _last_key(new_path)]
+        if len(same_key) == 1:
+            return same_key[0]
+        # 同一父对象下唯一一对类型相同的删除/新增字段：改名
+        parent = _parent_path(new_path)
+        siblings = [old_path for old_path in typed if _parent_path(self.current_path(old_path)) == parent]
+        added = [
+            path for path in self.new
+            if path not in self.matches and path not in self.old and _parent_path(path) == parent
+            and self.new[path]["kind"] == "value" and self.new[path]["type"] == field["type"]
+        ]
+        if len(siblings) == 1 and len(added) == 1:
+            return siblings[0]
+        return None
+
+    def build(self) -> Dict[str, Any]:
+        # 第一轮：原路径保留的字段和显式提示
+        for new_path in self.new_order:
+            field = self.new[new_path]
+            old_path = self._implied(new_path)
+            if old_path is None or self.old[old_path]["kind"] != field["kind"]:
+                old_path = self._hinted(new_path, field)
+            if old_path is not None:
+                self._match(new_path, old_path)
+
+        # 第二轮：按结构推断剩余字段
+        for new_path in self.new_order:
+            if new_path in self.matches:
+                continue
+            field = self.new[new_path]
+            old_path = self._implied(new_path)
+            if old_path is None or self.old[old_path]["kind"] != field["kind"]:
+                old_path = self._guessed(new_path, field)
+            if old_path is not None:
+                self._match(new_path, old_path)
+
+        # 旧模板中未匹配的字段删除，父字段已删除时不再单独删除子字段
+        dropped = set()
+        for old_path in sorted(self.old, key=lambda path: path.count(".")):
+            if old_path in self.matched_old:
+                continue
+            if any(ancestor in dropped for ancestor in self._ancestors(old_path)):
+                continue
+            dropped.add(old_path)
+            self.operations.append({"op": OP_DROP, "path": self.current_path(old_path)})
+
+        # 新模板中未匹配的字段：有默认值时填充，必填且无默认值时需要人工处理
+        added = set()
+        for new_path in self.new_order:
+            if new_path in self.matches:
+                self._compare(new_path)
+                continue
+            field = self.new[new_path]
+            parent_added = any(ancestor in added for ancestor in self._ancestors(new_path))
+            added.add(new_path)
+            if "default" in field:
+                self.operations.append({"op": OP_FILL_DEFAULT, "path": new_path, "value": field["default"]})
+            elif field["required"] and not parent_added and not self._has_matched_children(new_path):
+                self.unresolved.append({"path": new_path, "reason": "新增必填字段没有默认值"})
+
+        return {
+            "plan_id": compute_plan_id(self.operations),
+            "operations": self.operations,
+            "unresolved": self.unresolved,
+            "warnings": self.warnings,
+            "matched": len(self.matches),
+            "created_at": datetime.now().isoformat()
+        }
+
+    def _compare(self, new_path: str):
+        """已匹配字段的类型、必填变化只提示，由重新校验找出不符合的数据"""
+        old_field, new_field = self.old[self.matches[new_path]], self.new[new_path]
+        if new_field["kind"] == "value" and old_field["type"] != new_field["type"]:
+            self.warnings.append({
+                "path": new_path,
+                "reason": f"类型从 {old_field['type']} 变为 {new_field['type']}"
+            })
+        if new_field["required"] and not old_field["required"]:
+            self.warnings.append({"path": new_path, "reason": "字段变为必填"})
+
+    def _has_matched_children(self, new_path: str) -> bool:
+        """新增的嵌套模型由移入的子字段创建时，不需要默认值"""
+        prefix = new_path + "."
+        return any(path.startswith(prefix) for path in self.matches)
+
+    @staticmethod
+    def _ancestors(path: str) -> List[str]:
+        ancestors = []
+        parent = _parent_path(path)
+        while parent:
+            ancestors.append(parent)
+            parent = _parent_path(parent)
+        return ancestors
+
+
+def diff_schemas(old_fields: List[Dict[str, Any]], new_fields: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """比较新旧模板的字段结构，生成迁移计划
+
+    字段对应关系依次通过：路径不变（含父字段迁移后的路径）、新字段的 renamed_from 提示、
+    结构推断（嵌套模型的子字段集合相同；普通字段键名相同或同一对象内唯一一对同类型字段）确定。
+    返回 {"plan_id", "operations", "unresolved", "warnings", ...}，unresolved 中的字段需要人工处理。
+    """
+    return _PlanBuilder(old_fields, new_fields).build()
+
+
+def validate_operations(operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """检查迁移操作的格式，返回规范化后的操作列表，不合法时抛出 ValueError"""
+    normalized = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise ValueError(f"第{index + 1}个操作格式错误")
+        op = operation.get("op")
+        if op in (OP_RENAME, OP_MOVE):
+            source, target = operation.get("from"), operation.get("to")
+            if not source or not target or not isinstance(source, str) or not isinstance(target, str):
+                raise ValueError(f"第{index + 1}个操作缺少 from/to 路径")
+            from_segments, to_segments = _split_path(source), _split_path(target)
+            scope = _scope_length(from_segments)
+            if scope != _scope_length(to_segments) or from_segments[:scope] != to_segments[:scope]:
+                raise ValueError(f"第{index + 1}个操作不支持跨列表元素移动: {source} -> {target}")
+            normalized.append({"op": op, "from": source, "to": target})
+        elif op in (OP_DROP, OP_FILL_DEFAULT):
+            path = operation.get("path")
+            if not path or not isinstance(path, str):
+                raise ValueError(f"第{index + 1}个操作缺少 path")
+            if op == OP_DROP:
+                normalized.append({"op": op, "path": path})
+            else:
+                normalized.append({"op": op, "path": path, "value": operation.get("value")})
+        else:
+            raise ValueError(f"第{index + 1}个操作类型不支持: {op}")
+    return normalized
+
+
+# ---------------------------------------------------------------------------
+# 执行迁移操作
+# ---------------------------------------------------------------------------
+
+def _iter_objects(obj: Any, segments: Segments):
+    """沿路径段向下，产出到达的对象（字典）；列表段展开为其中的每个元素"""
+    if not segments:
+        if isinstance(obj, dict):
+            yield obj
+        return
+    if not isinstance(obj, dict):
+        return
+    (key, is_list), rest = segments[0], segments[1:]
+    value = obj.get(key)
+    if is_list:
+        if isinstance(value, list):
+            for item in value:
+                yield from _iter_objects(item, rest)
+    else:
+        yield from _iter_objects(value, rest)
+
+
+def _walk(obj: Dict[str, Any], keys: List[str], create: bool) -> Optional[Dict[str, Any]]:
+    """按键逐层取嵌套对象，create=True 时补齐缺失的中间对象"""
+    for key in keys:
+        value = obj.get(key)
+        if value is None and create:
+            value = obj[key] = {}
+        if not isinstance(value, dict):
+            return None
+        obj = value
+    return obj
+
+
+def _compile_move(operation: Dict[str, Any]) -> Callable[[Any], int]:
+    from_segments, to_segments = _split_path(operation["from"]), _split_path(operation["to"])
+    scope = _scope_length(from_segments)
+    scope_segments = from_segments[:scope]
+    from_keys = [key for key, _ in from_segments[scope:]]
+    to_keys = [key for key, _ in to_segments[scope:]]
+    same_parent = from_keys[:-1] == to_keys[:-1]
+    old_key, new_key = from_keys[-1], to_keys[-1]
+
+    def apply(root: Any) -> int:
+        count = 0
+        for element in _iter_objects(root, scope_segments):
+            source = _walk(element, from_keys[:-1], create=False)
+            if source is None or old_key not in source:
+                continue
+            if same_parent:
+                if new_key in source:
+                    continue
+                # 原位改键名，保持键的顺序
+                items = list(source.items())
+                source.clear()
+                source.update((new_key if key == old_key else key, value) for key, value in items)
+            else:
+                target = _walk(element, to_keys[:-1], create=True)
+                if target is None or new_key in target:
+                    continue
+                target[new_key] = source.pop(old_key)
+            count += 1
+        return count
+
+    return apply
+
+
+def _compile_drop(operation: Dict[str, Any]) -> Callable[[Any], int]:
+    segments = _split_path(operation["path"])
+    parent_segments, key = segments[:-1], segments[-1][0]
+
+    def apply(root: Any) -> int:
+        count = 0
+        for parent in _iter_objects(root, parent_segments):
+            if key in parent:
+                del parent[key]
+                count += 1
+        return count
+
+    return apply
+
+
+def _compile_fill_default(operation: Dict[str, Any]) -> Callable[[Any], int]:
+    segments = _split_path(operation["path"])
+    parent_segments, key = segments[:-1], segments[-1][0]
+    value = operation.get("value")
+
+    def apply(root: Any) -> int:
+        count = 0
+        for parent in _iter_objects(root, parent_segments):
+            if key not in parent:
+                parent[key] = copy.deepcopy(value)
+                count += 1
+        return count
+
+    return apply
+
+
+_COMPILERS: Dict[str, Callable[[Dict[str, Any]], Callable[[Any], int]]] = {
+    OP_RENAME: _compile_move,
+    OP_MOVE: _compile_move,
+    OP_DROP: _compile_drop,
+    OP_FILL_DEFAULT: _compile_fill_default,
+}
+
+
+def compile_operations(operations: List[Dict[str, Any]]) -> List[Callable[[Any], int]]:
+    """将迁移操作编译为函数，每个函数原地修改对象并返回改动次数"""
+    return [_COMPILERS[operation["op"]](operation) for operation in operations]
+
+
+class AnnotationChangedError(Exception):
+    """标注文件在读取之后被其他请求修改"""
+
+
+def _file_signature(stat_result: os.stat_result) -> Tuple[int, int, int]:
+    """文件的 (inode, 修改时间, 大小)；保存标注时整体替换文件，inode 也会变化"""
+    return stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size
+
+
+def _write_json_atomic(path: Path, data: Any, expected: Optional[Tuple[int, int, int]] = None):
+    """先写临时文件再替换，中断时不会留下写了一半的文件
+
+    格式与 StorageManager._write_json 相同（缩进2、不转义中文），
+    使用 pydantic_core 序列化，避免标准库在缩进输出时退回纯Python编码器。
+    指定 expected 时替换前确认文件仍是读取时的版本，否则放弃写入并抛出 AnnotationChangedError。
+    """
+    temp_path = path.with_name(f".{path.name}.migrating")
+    with open(temp_path, 'wb') as f:
+        f.write(to_json(data, indent=2, fallback=str))
+    if expected is not None:
+        try:
+            current = _file_signature(path.stat())
+        except FileNotFoundError:
+            current = None
+        if current != expected:
+            temp_path.unlink(missing_ok=True)
+            raise AnnotationChangedError()
+    os.replace(temp_path, path)
+
+
+def migrate_annotation_file(compiled: List[Callable[[Any], int]], file_path: str, dry_run: bool = False,
+                            results_dir: Optional[str] = None) -> Dict[str, Any]:
+    """对单个标注文件执行迁移，有改动且非试运行时原子地写回
+
+    指定 results_dir 时同时重新生成该文档的简洁标注结果文件。
+    """
+    path = Path(file_path)
+    result = {
+        "document_id": path.stem,
+        "changed": False,
+        "records": 0,
+        "applied": [0] * len(compiled),
+        "bytes": 0,
+        "error": None
+    }
+
+    try:
+        with open(path, 'rb') as f:
+            # 记录读取时的文件版本，写回前确认期间没有被保存标注的请求修改
+            signature = _file_signature(os.fstat(f.fileno()))
+            raw = f.read()
+        result["bytes"] = len(raw)
+        data = json.loads(raw)
+        annotation_data = data.get("annotation_data")
+    except (OSError, ValueError, AttributeError) as e:
+        result["error"] = f"标注文件读取失败: {str(e)}"
+        return result
+
+    if not annotation_data:
+        return result
+
+    objects = annotation_objects(annotation_data)
+    result["records"] = len(objects)
+    for obj in objects:
+        for index, apply in enumerate(compiled):
+            result["applied"][index] += apply(obj)
+    result["changed"] = any(result["applied"])
+
+    if result["changed"] and not dry_run:
+        data["updated_at"] = datetime.now().isoformat()
+        try:
+            _write_json_atomic(path, data, expected=signature)
+            if results_dir:
+                Path(results_dir).mkdir(parents=True, exist_ok=True)
+                _write_json_atomic(Path(results_dir) / path.name, simple_annotation_result(annotation_data))
+        except AnnotationChangedError:
+            # 不计入已完成的文档，以同一计划重新提交迁移时会再次处理
+            result["error"] = "标注文件在迁移期间被修改，未写入，请重新执行迁移"
+            result["changed"] = False
+        except OSError as e:
+            result["error"] = f"标注文件写入失败: {str(e)}"
+            result["changed"] = False
+    return result
+
+
+def migrate_annotation_files(operations: List[Dict[str, Any]], file_paths: List[str], dry_run: bool = False,
+                             results_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """对一批标注文件执行迁移操作"""
+    compiled = compile_operations(operations)
+    return [migrate_annotation_file(compiled, file_path, dry_run, results_dir) for file_path in file_paths]
@@ -6,7 +6,10 @@
 
 from typing import Dict, Any
 from pathlib import Path
+from ..config import settings
 from .simple_document_validator import SimpleDocumentValidator
+from .template_worker import TemplateWorkerError, get_template_worker_pool
+from .template_cache import get_template_artifact_cache, hash_template_file
 
 
 class TemplateValidator:
@@ -24,16 +27,29 @@ class TemplateValidator:
             if not full_path.exists():
                 return {"valid": False, "error": "文件不存在"}
             
-            # 使用简化版文档验证器进行验证
-            validator = SimpleDocumentValidator()
-            result = validator.load_template(str(full_path))
+            # 同一内容的模板已成功加载过时，直接使用缓存的元数据
+            cache = get_template_artifact_cache()
+            result = cache.get_metadata(hash_template_file(str(full_path))) if cache is not None else None
             
+            # 使用简化版文档验证器进行验证，启用工作进程池时在子进程中加载模板
+            if result is None and settings.template_worker_enabled:
+                try:
+                    result = get_template_worker_pool().load_template(str(full_path))
+                except TemplateWorkerError as e:
+                    return {"valid": False, "error": f"模板加载失败: {str(e)}"}
+            elif result is None:
+                validator = SimpleDocumentValidator()
+                result = validator.load_template(str(full_path))
+                validator.release()
+
             if result["valid"]:
                 # 返回兼容原版API的格式
                 return {
                     "valid": True,
                     "template_info": result.get("template_info", {}),
-                    "annotation_fields": result.get("annotation_fields", [])
+                    "annotation_fields": result.get("annotation_fields", []),
+                    "json_schema": result.get("json_schema", {}),
+                    "template_hash": result.get("template_hash")
                 }
             else:
                 return {
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板工作进程池
+在预先启动的子进程中加载用户上传的模板并执行文档校验，
+模板导入时的死循环、内存泄漏等问题不会影响API进程。
+
+进程间使用Pipe传递紧凑的元组消息：
+    API -> 工作进程: ("call", op, args) / ("cancel",) / None(退出)
+    工作进程 -> API: ("progress", done, total) / ("errors", [未通过的记录...]) / ("result", ok, payload)
+"""
+
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 等待结果时的轮询间隔（秒），期间检查是否需要取消
+POLL_INTERVAL = 0.2
+# 每个工作进程缓存的模板数量上限
+WORKER_VALIDATOR_CACHE_SIZE = 8
+# 流式传回校验错误时每条消息包含的记录数
+ERROR_MESSAGE_BATCH = 100
+
+
+class TemplateWorkerError(Exception):
+    """工作进程执行失败"""
+
+
+class TemplateWorkerTimeout(TemplateWorkerError):
+    """工作进程执行超时"""
+
+
+# ---------------------------------------------------------------------------
+# 工作进程端
+# ---------------------------------------------------------------------------
+
+def _apply_memory_limit(memory_limit_mb: int):
+    """限制工作进程的地址空间大小，不支持resource模块的平台上忽略"""
+    if not memory_limit_mb or memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _sanitize_result(value: Any) -> Any:
+    """去掉模板类实例等无法在API进程中反序列化的对象"""
+    if isinstance(value, dict):
+        sanitized = {}
+        for key, item in value.items():
+            if key == "instance":
+                continue
+            if key == "ctx" and isinstance(item, dict):
+                # 错误上下文中可能包含模板中定义的异常对象
+                sanitized[key] = {k: v if isinstance(v, (str, int, float, bool, type(None))) else str(v)
+                                  for k, v in item.items()}
+                continue
+            sanitized[key] = _sanitize_result(item)
+        return sanitized
+    if isinstance(value, list):
+        return [_sanitize_result(item) for item in value]
+    return value
+
+
+def _get_worker_validator(validators: Dict[Tuple[str, float], Any], template_path: str):
+    """获取（并缓存）已加载模板的校验器，模板文件变化后重新加载"""
+    from .simple_document_validator import SimpleDocumentValidator
+
+    key = (template_path, os.path.getmtime(template_path))
+    validator = validators.pop(key, None)
+    if validator is None:
+        validator = SimpleDocumentValidator()
+        result = validator.load_template(template_path)
+        if not result["valid"]:
+            validator.release()
+            raise RuntimeError(f"模板加载失败: {result.get('error', '未知错误')}")
+        while len(validators) >= WORKER_VALIDATOR_CACHE_SIZE:
+            validators.pop(next(iter(validators))).release()
+    # 重新插入，保持最近使用的在末尾
+    validators[key] = validator
+    return validator
+
+
+def _op_load_template(conn, validators, template_path: str) -> Dict[str, Any]:
+    """加载并验证模板"""
+    from .simple_document_validator import SimpleDocumentValidator
+
+    validator = SimpleDocumentValidator()
+    try:
+        return validator.load_template(template_path)
+    finally:
+        validator.release()
+
+
+def _op_validate_file(conn, validators, template_path: str, file_path: str,
+                      report_progress: bool = False, stream_errors: bool = False) -> Dict[str, Any]:
+    """使用模板校验文档文件，只返回未通过的记录以减少进程间传输的数据量
+
+    stream_errors 为True时未通过的记录在校验过程中每 ERROR_MESSAGE_BATCH 条发送一次，不再放在返回结果中。
+    """
+    validator = _get_worker_validator(validators, template_path)
+    cancelled = [False]
+    pending_errors: List[Dict[str, Any]] = []
+
+    def should_stop() -> bool:
+        # 执行期间API端只会发送取消消息
+        if not cancelled[0] and conn.poll():
+            message = conn.recv()
+            if message is None or message[0] == "cancel":
+                cancelled[0] = True
+        return cancelled[0]
+
+    def progress_callback(done: int, total: Optional[int]):
+        conn.send(("progress", done, total))
+
+    def flush_errors():
+        if pending_errors:
+            conn.send(("errors", _sanitize_result(pending_errors)))
+            pending_errors.clear()
+
+    def error_callback(item: Dict[str, Any]):
+        pending_errors.append(item)
+        if len(pending_errors) >= ERROR_MESSAGE_BATCH:
+            flush_errors()
+
+    result = validator.validate_file(
+        file_path,
+        progress_callback=progress_callback if report_progress else None,
+        should_stop=should_stop,
+        error_callback=error_callback if stream_errors else None
+    )
+    flush_errors()
+    if "results" in result:
+        result["results"] = [item for item in result["results"] if not item.get("valid")]
+    return _sanitize_result(result)
+
+
+def _op_validate_annotations(conn, validators, template_path: str, file_paths: List[str]) -> List[Dict[str, Any]]:
+    """使用模板重新校验一批已保存的标注文件"""
+    from .annotation_revalidation import validate_annotation_files
+
+    validator = _get_worker_validator(validators, template_path)
+    return validate_annotation_files(validator, file_paths)
+
+
+def _op_describe_schema(conn, validators, template_path: str) -> List[Dict[str, Any]]:
+    """获取模板主模型的字段结构"""
+    return _get_worker_validator(validators, template_path).get_schema_fields()
+
+
+def _op_migrate_annotations(conn, validators, operations: List[Dict[str, Any]], file_paths: List[str],
+                            dry_run: bool, results_dir: Optional[str]) -> List[Dict[str, Any]]:
+    """按迁移操作改写一批已保存的标注文件"""
+    from .template_migration import migrate_annotation_files
+
+    return migrate_annotation_files(operations, file_paths, dry_run, results_dir)
+
+
+_OPERATIONS: Dict[str, Callable[..., Any]] = {
+    "load_template": _op_load_template,
+    "validate_file": _op_validate_file,
+    "validate_annotations": _op_validate_annotations,
+    "describe_schema": _op_describe_schema,
+    "migrate_annotations": _op_migrate_annotations,
+}
+
+
+def _worker_main(conn, memory_limit_mb: int):
+    """工作进程主循环"""
+    _apply_memory_limit(memory_limit_mb)
+    validators: Dict[Tuple[str, float], Any] = {}
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        # 结果返回后才到达的取消消息直接忽略
+        if message[0] != "call":
+            continue
+
+        _, op, args = message
+        try:
+            payload = _OPERATIONS[op](conn, validators, *args)
+            conn.send(("result", True, payload))
+        except MemoryError:
+            validators.clear()
+            conn.send(("result", False, "模板执行超出内存限制"))
+        except Exception as e:
+            conn.send(("result", False, f"{type(e).__name__}: {str(e)}"))
+
+
+# ---------------------------------------------------------------------------
+# API进程端
+# ---------------------------------------------------------------------------
+
+class _Worker:
+    """单个工作进程及其通信管道"""
+
+    def __init__(self, context, memory_limit_mb: int):
+        self.conn, child_conn = context.Pipe(duplex=True)
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_mb),
+            name="template-worker",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def stop(self, timeout: float = 1.0):
+        """通知进程退出，超时后强制结束"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self):
+        """强制结束进程"""
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class TemplateWorkerPool:
+    """模板工作进程池：每次调用占用一个空闲进程，超时或崩溃的进程会被替换"""
+
+    def __init__(self, processes: int = 2, timeout: float = 30,
+                 memory_limit_mb: int = 0, max_jobs: int = 100):
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_jobs = max_jobs
+        # 使用spawn启动，子进程不继承API进程中已加载的模块和线程
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+
+    def start(self):
+        """预先启动全部工作进程"""
+        with self._lock:
+            if self._started or self._closed:
+                return
+            for _ in range(self.processes):
+                self._idle.put(self._spawn())
+            self._started = True
+
+    def close(self):
+        """关闭全部工作进程"""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.stop()
+
+    def call(self, op: str, *args: Any, timeout: Optional[float] = None,
+             progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+             should_stop: Optional[Callable[[], bool]] = None,
+             error_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Any:
+        """在工作进程中执行操作并返回结果
+
+        超时（包括等待空闲进程的时间）抛出 TemplateWorkerTimeout，
+        操作本身失败或进程崩溃抛出 TemplateWorkerError。
+        """
+        self.start()
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TemplateWorkerTimeout(f"等待模板工作进程超时（{timeout}秒）")
+
+        healthy = False
+        try:
+            worker.conn.send(("call", op, args))
+            cancel_sent = False
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TemplateWorkerTimeout(f"模板执行超时（{timeout}秒）")
+
+                if should_stop and not cancel_sent and should_stop():
+                    worker.conn.send(("cancel",))
+                    cancel_sent = True
+
+                if not worker.conn.poll(min(remaining, POLL_INTERVAL)):
+                    continue
+
+                message = worker.conn.recv()
+                if message[0] == "progress":
+                    if progress_callback:
+                        progress_callback(message[1], message[2])
+                    continue
+                if message[0] == "errors":
+                    if error_callback:
+                        for item in message[1]:
+                            error_callback(item)
+                    continue
+
+                _, ok, payload = message
+                healthy = True
+                worker.jobs += 1
+                if not ok:
+                    raise TemplateWorkerError(payload)
+                return payload
+        except (EOFError, OSError, BrokenPipeError):
+            raise TemplateWorkerError("模板工作进程异常退出")
+        finally:
+            self._release(worker, healthy)
+
+    def load_template(self, template_path: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """在工作进程中加载并验证模板"""
+        return self.call("load_template", template_path, timeout=timeout)
+
+    def validate_file(self, template_path: str, file_path: str, timeout: Optional[float] = None,
+                      progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+                      should_stop: Optional[Callable[[], bool]] = None,
+                      error_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """在工作进程中使用模板校验文档文件
+
+        返回格式与 SimpleDocumentValidator.validate_file 相同，但 results 中只包含未通过的记录，且不包含模型实例；
+        指定 error_callback 时未通过的记录在校验过程中分批传回并逐条交给它处理。
+        """
+        return self.call(
+            "validate_file", template_path, file_path, progress_callback is not None, error_callback is not None,
+            timeout=timeout,
+            progress_callback=progress_callback,
+            should_stop=should_stop,
+            error_callback=error_callback
+        )
+
+    def validate_annotations(self, template_path: str, file_paths: List[str],
+                             timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """在工作进程中重新校验一批已保存的标注文件"""
+        return self.call("validate_annotations", template_path, file_paths, timeout=timeout)
+
+    def describe_schema(self, template_path: str, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """在工作进程中获取模板主模型的字段结构"""
+        return self.call("describe_schema", template_path, timeout=timeout)
+
+    def migrate_annotations(self, operations: List[Dict[str, Any]], file_paths: List[str], dry_run: bool = False,
+                            results_dir: Optional[str] = None,
+                            timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """在工作进程中按迁移操作改写一批已保存的标注文件"""
+        return self.call("migrate_annotations", operations, file_paths, dry_run, results_dir, timeout=timeout)
+
+    def _spawn(self) -> _Worker:
+        """启动新的工作进程（调用方持有锁）"""
+        worker = _Worker(self._context, self.memory_limit_mb)
+        self._workers.add(worker)
+        return worker
+
+    def _release(self, worker: _Worker, healthy: bool):
+        """归还工作进程；异常或达到任务上限的进程被替换"""
+        recycle = not healthy or (self.max_jobs > 0 and worker.jobs >= self.max_jobs)
+        if recycle:
+            if healthy:
+                worker.stop()
+            else:
+                worker.kill()
+
+        with self._lock:
+            if self._closed:
+                if not recycle:
+                    worker.stop()
+                return
+            if recycle:
+                self._workers.discard(worker)
+                worker = self._spawn()
+        self._idle.put(worker)
+
+
+_pool: Optional[TemplateWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_template_worker_pool() -> TemplateWorkerPool:
+    """获取全局模板工作进程池（各模块共享同一个进程池）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from ..config import settings
+
+            _pool = TemplateWorkerPool(
+                processes=settings.template_worker_processes,
+                timeout=settings.template_worker_timeout,
+                memory_limit_mb=settings.template_worker_memory_limit_mb,
+                max_jobs=settings.template_worker_max_jobs
+            )
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台校验任务管理器
+将大批量文档校验放到后台线程中执行，提供进度查询与取消功能
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from ..models.task import ValidationJobInfo, ValidationJobProgress, ValidationJobStatus
+
+
+class ValidationJobCancelled(Exception):
+    """校验任务已被取消"""
+
+
+class ValidationJobError(Exception):
+    """校验任务失败（数据未通过校验等业务错误）"""
+
+    def __init__(self, message: str, errors: Optional[List[Dict[str, Any]]] = None,
+                 result: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.message = message
+        self.errors = errors or []
+        self.result = result or {}
+
+
+class ValidationJob:
+    """单个后台校验任务的状态"""
+
+    def __init__(self, owner_id: str, documents_total: int, bytes_total: int):
+        self.id = f"job_{uuid.uuid4().hex[:12]}"
+        self.owner_id = owner_id
+        self.status = ValidationJobStatus.QUEUED
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.errors: List[Dict[str, Any]] = []
+
+        self.documents_total = documents_total
+        self.documents_done = 0
+        self.bytes_total = bytes_total
+        self.invalid_records = 0
+        self.error_count = 0
+
+        # 已完成文档的累计值
+        self._records_done = 0
+        self._records_total = 0
+        self._bytes_done = 0
+        # 当前文档的进度
+        self._current_size = 0
+        self._current_done = 0
+        self._current_total: Optional[int] = None
+
+        self._started_monotonic: Optional[float] = None
+        self._finished_monotonic: Optional[float] = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._future = None
+
+    # 进度上报（在工作线程中调用）
+    def start_document(self, file_size: int):
+        """开始校验一个文档"""
+        with self._lock:
+            self._current_size = file_size or 0
+            self._current_done = 0
+            self._current_total = None
+
+    def update_document(self, records_done: int, records_total: Optional[int]):
+        """更新当前文档的记录进度"""
+        with self._lock:
+            self._current_done = records_done
+            self._current_total = records_total
+
+    def finish_document(self, records: int = 0, invalid_records: int = 0, error_count: int = 0):
+        """完成一个文档的校验"""
+        with self._lock:
+            self.documents_done += 1
+            self._records_done += records
+            self._records_total += records
+            self._bytes_done += self._current_size
+            self.invalid_records += invalid_records
+            self.error_count += error_count
+            self._current_size = 0
+            self._current_done = 0
+            self._current_total = None
+
+    def finish_documents(self, documents: int, records: int = 0, invalid_records: int = 0,
+                         error_count: int = 0, bytes_done: int = 0):
+        """一次完成多个文档（并行处理时使用，不经过 start_document）"""
+        with self._lock:
+            self.documents_done += documents
+            self._records_done += records
+            self._records_total += records
+            self._bytes_done += bytes_done
+            self.invalid_records += invalid_records
+            self.error_count += error_count
+
+    def is_cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """已请求取消时抛出 ValidationJobCancelled"""
+        if self._cancel_event.is_set():
+            raise ValidationJobCancelled()
+
+    def snapshot(self) -> ValidationJobInfo:
+        """生成当前状态快照"""
+        with self._lock:
+            records_done = self._records_done + self._current_done
+            records_total = self._records_total + (self._current_total or 0)
+
+            # 以字节数估算整体进度，当前文档按记录比例折算
+            bytes_done = float(self._bytes_done)
+            if self._current_total:
+                bytes_done += self._current_size * min(self._current_done / self._current_total, 1.0)
+            if self.status == ValidationJobStatus.SUCCEEDED:
+                fraction = 1.0
+            elif self.bytes_total > 0:
+                fraction = min(bytes_done / self.bytes_total, 1.0)
+            elif self.documents_total > 0:
+                fraction = self.documents_done / self.documents_total
+            else:
+                fraction = 0.0
+
+            elapsed = 0.0
+            if self._started_monotonic is not None:
+                end = self._finished_monotonic or time.monotonic()
+                elapsed = end - self._started_monotonic
+            eta = None
+            if self.status == ValidationJobStatus.RUNNING and fraction > 0:
+                eta = round(elapsed / fraction * (1 - fraction), 2)
+
+            progress = ValidationJobProgress(
+                documents_total=self.documents_total,
+                documents_done=self.documents_done,
+                records_total=records_total,
+                records_done=records_done,
+                invalid_records=self.invalid_records,
+                error_count=self.error_count,
+                bytes_total=self.bytes_total,
+                bytes_done=int(bytes_done),
+                percentage=round(fraction * 100, 2),
+                elapsed_seconds=round(elapsed, 2),
+                eta_seconds=eta
+            )
+
+            return ValidationJobInfo(
+                job_id=self.id,
+                status=self.status,
+                created_at=self.created_at,
+                started_at=self.started_at,
+                finished_at=self.finished_at,
+                progress=progress,
+                result=self.result or None,
+                error=self.error,
+                errors=self.errors or None
+            )
+
+
+class ValidationJobManager:
+    """后台校验任务管理器，通过线程池限制全局并发数"""
+
+    def __init__(self, max_workers: int = 2, retention_seconds: int = 3600):
+        self.max_workers = max(1, max_workers)
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="validation-job"
+        )
+        self._jobs: Dict[str, ValidationJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner_id: str, func: Callable[[ValidationJob], Dict[str, Any]],
+               documents_total: int = 0, bytes_total: int = 0) -> ValidationJob:
+        """提交后台任务，func(job) 的返回值作为任务结果"""
+        self._prune()
+
+        job = ValidationJob(owner_id, documents_total, bytes_total)
+        with self._lock:
+            self._jobs[job.id] = job
+        job._future = self._executor.submit(self._run, job, func)
+        return job
+
+    def get(self, job_id: str) -> Optional[ValidationJob]:
+        """获取任务"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """请求取消任务，已结束的任务返回False"""
+        job = self.get(job_id)
+        if not job or job.status not in (ValidationJobStatus.QUEUED, ValidationJobStatus.RUNNING):
+            return False
+
+        job._cancel_event.set()
+        # 尚未开始执行的任务直接从线程池队列中移除
+        if job._future is not None and job._future.cancel():
+            self._finish(job, ValidationJobStatus.CANCELLED)
+        return True
+
+    def _run(self, job: ValidationJob, func: Callable[[ValidationJob], Dict[str, Any]]):
+        """在工作线程中执行任务"""
+        if job.is_cancelled():
+            self._finish(job, ValidationJobStatus.CANCELLED)
+            return
+
+        with job._lock:
+            job.status = ValidationJobStatus.RUNNING
+            job.started_at = datetime.now()
+            job._started_monotonic = time.monotonic()
+
+        try:
+            result = func(job)
+            job.result = result or {}
+            self._finish(job, ValidationJobStatus.SUCCEEDED)
+        except ValidationJobCancelled:
+            self._finish(job, ValidationJobStatus.CANCELLED)
+        except ValidationJobError as e:
+            job.error = e.message
+            job.errors = e.errors
+            job.result = e.result
+            self._finish(job, ValidationJobStatus.FAILED)
+        except Exception as e:
+            job.error = f"校验任务执行异常: {str(e)}"
+            self._finish(job, ValidationJobStatus.FAILED)
+
+    def _finish(self, job: ValidationJob, status: ValidationJobStatus):
+        """标记任务结束"""
+        with job._lock:
+            job.status = status
+            job.finished_at = datetime.now()
+            job._finished_monotonic = time.monotonic()
+
+    def _prune(self):
+        """清理超过保留期的已结束任务"""
+        now = datetime.now()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None
+                and (now - job.finished_at).total_seconds() > self.retention_seconds
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+校验错误报告
+按字段路径和错误类型聚合统计，每组只保留前若干条示例；
+逐条记录的完整错误以NDJSON流式写入报告文件，供事后下载。
+过期的报告由 prune_reports 按最后修改时间清理。
+"""
+
+import json
+import re
+import reprlib
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .simple_document_validator import SimpleDocumentValidator
+
+# 错误中输入值的最大显示长度
+MAX_INPUT_LENGTH = 100
+
+_REPORT_ID_PATTERN = re.compile(r"^report_[0-9a-f]{12}$")
+
+# 有界的repr：大对象只展开前几层、前几项，避免为展示错误而完整序列化输入
+_input_repr = reprlib.Repr()
+_input_repr.maxlevel = 2
+_input_repr.maxdict = 5
+_input_repr.maxlist = 5
+_input_repr.maxstring = MAX_INPUT_LENGTH
+_input_repr.maxother = MAX_INPUT_LENGTH
+
+
+def truncate_input(value: Any, max_length: int = MAX_INPUT_LENGTH) -> Optional[str]:
+    """将错误中的输入值转换为长度受限的字符串"""
+    if value is None:
+        return None
+    try:
+        text = value if isinstance(value, str) else _input_repr.repr(value)
+    except Exception:
+        return "无法显示"
+    if len(text) > max_length:
+        return f"{text[:max_length]}...（共{len(text)}字符）" if isinstance(value, str) else f"{text[:max_length]}..."
+    return text
+
+
+class ValidationReport:
+    """一次文档校验的错误报告"""
+
+    def __init__(self, reports_dir: Path, owner_id: str, examples_per_group: int = 3):
+        self.report_id = f"report_{uuid.uuid4().hex[:12]}"
+        self.owner_id = owner_id
+        self.examples_per_group = examples_per_group
+        self.created_at = datetime.now()
+        self.path = Path(reports_dir) / f"{self.report_id}.ndjson"
+        self.summary_path = Path(reports_dir) / f"{self.report_id}.json"
+
+        self.total_records = 0
+        self.invalid_records = 0
+        self.error_count = 0
+        self.files: List[Dict[str, Any]] = []
+        self._groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._by_field: Dict[str, int] = {}
+        self._by_type: Dict[str, int] = {}
+        self._file = None
+
+    def error_callback(self, file_path: str) -> Callable[[Dict[str, Any]], None]:
+        """返回把某个文件未通过的记录逐条写入报告的回调（作为 validate_file 的 error_callback）"""
+        def add(result: Dict[str, Any]):
+            self.add_record_errors(file_path, result.get("index", result.get("line_number", 0)), result)
+        return add
+
+    def add_file_result(self, file_path: str, validation_result: Dict[str, Any]):
+        """记录一个文档文件的校验结果（validate_file 的返回值）
+
+        校验时已通过 error_callback 写入错误的，返回值中没有逐条结果，这里只统计记录数。
+        """
+        total = validation_result.get("total", 0)
+        invalid_count = validation_result.get("invalid_count", 0)
+        self.total_records += total
+        self.invalid_records += invalid_count
+        self.files.append({"file_path": file_path, "total": total, "invalid_count": invalid_count})
+        if invalid_count <= 0:
+            return
+
+        for result in validation_result.get("results", []):
+            if not result.get("valid"):
+                index = result.get("index", result.get("line_number", 0))
+                self.add_record_errors(file_path, index, result)
+
+    def add_record_errors(self, file_path: str, index: int, result: Dict[str, Any]):
+        """记录单条记录的错误：写入报告文件并计入聚合统计"""
+        errors = []
+        for detail in result.get("error_details") or []:
+            loc = ".".join(str(item) for item in detail.get("loc", []))
+            errors.append({
+                "field": SimpleDocumentValidator.normalize_field_path(loc) if loc else "",
+                "loc": list(detail.get("loc", [])),
+                "type": detail.get("type", ""),
+                "message": detail.get("msg", ""),
+                "input": truncate_input(detail.get("input"))
+            })
+        if not errors:
+            errors.append({
+                "field": "",
+                "loc": [],
+                "type": "invalid_record",
+                "message": result.get("error") or "未知错误",
+                "input": None
+            })
+
+        for error in errors:
+            self._count(file_path, index, error)
+
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(json.dumps(
+            {"file_path": file_path, "index": index, "errors": errors},
+            ensure_ascii=False, default=str
+        ))
+        self._file.write("\n")
+
+    def _count(self, file_path: str, index: int, error: Dict[str, Any]):
+        """更新聚合统计"""
+        self.error_count += 1
+        field, error_type = error["field"], error["type"]
+        self._by_field[field] = self._by_field.get(field, 0) + 1
+        self._by_type[error_type] = self._by_type.get(error_type, 0) + 1
+
+        group = self._groups.get((field, error_type))
+        if group is None:
+            group = {"field": field, "type": error_type, "message": error["message"], "count": 0, "examples": []}
+            self._groups[(field, error_type)] = group
+        group["count"] += 1
+        if len(group["examples"]) < self.examples_per_group:
+            group["examples"].append({"file_path": file_path, "index": index, "input": error["input"]})
+
+    def close(self):
+        """结束写入。有错误时保存汇总文件，没有错误时不留下任何文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.error_count:
+            with open(self.summary_path, "w", encoding="utf-8") as f:
+                json.dump({**self.summary(), "owner_id": self.owner_id}, f, ensure_ascii=False, indent=2, default=str)
+
+    def summary(self, max_groups: Optional[int] = None) -> Dict[str, Any]:
+        """聚合统计结果，错误组按出现次数从多到少排列"""
+        groups = sorted(self._groups.values(), key=lambda group: group["count"], reverse=True)
+        return {
+            "report_id": self.report_id,
+            "created_at": self.created_at.isoformat(),
+            "total_records": self.total_records,
+            "invalid_records": self.invalid_records,
+            "error_count": self.error_count,
+            "files": self.files,
+            "by_field": self._by_field,
+            "by_type": self._by_type,
+            "group_count": len(groups),
+            "groups": groups[:max_groups] if max_groups is not None else groups
+        }
+
+
+def report_paths(reports_dir: Path, report_id: str) -> Optional[Tuple[Path, Path]]:
+    """返回报告的 (NDJSON文件, 汇总文件) 路径，ID不合法时返回None"""
+    if not _REPORT_ID_PATTERN.match(report_id):
+        return None
+    return Path(reports_dir) / f"{report_id}.ndjson", Path(reports_dir) / f"{report_id}.json"
+
+
+def prune_reports(reports_dir: Path, retention_seconds: int) -> int:
+    """删除最后修改时间超过保留期的报告（NDJSON文件与汇总文件一起删除），返回删除的报告数"""
+    reports_dir = Path(reports_dir)
+    if retention_seconds <= 0 or not reports_dir.exists():
+        return 0
+    deadline = time.time() - retention_seconds
+    modified: Dict[str, float] = {}
+    for path in reports_dir.glob("report_*"):
+        if path.suffix not in (".json", ".ndjson") or not _REPORT_ID_PATTERN.match(path.stem):
+            continue
+        try:
+            modified[path.stem] = max(modified.get(path.stem, 0), path.stat().st_mtime)
+        except FileNotFoundError:
+            pass
+    removed = 0
+    for report_id, mtime in modified.items():
+        if mtime < deadline:
+            for path in report_paths(reports_dir, report_id):
+                path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def load_report_summary(reports_dir: Path, report_id: str) -> Optional[Dict[str, Any]]:
+    """读取报告汇总，不存在时返回None"""
+    paths = report_paths(reports_dir, report_id)
+    if not paths or not paths[1].exists():
+        return None
+    with open(paths[1], "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式ZIP打包
+边读取文件边压缩、边产出ZIP数据，不在内存或磁盘中生成完整的压缩包：
+- 输出流不可回退，每个文件的CRC和大小写在数据之后的数据描述符中（zipfile 自动处理）
+- 已压缩格式（图片、压缩包等）直接存储，其他文件用deflate压缩
+- 文件或压缩包超过4GB、文件数超过65535时使用ZIP64扩展
+内存占用只与读取块大小有关，第一个文件开始压缩时客户端就能收到数据。
+"""
+
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, List, Set, Tuple
+
+# 每次读取文件的块大小
+CHUNK_SIZE = 64 * 1024
+
+# 本身已压缩、再用deflate压缩几乎没有收益的文件类型
+STORED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".pdf", ".docx", ".xlsx", ".pptx",
+    ".mp3", ".mp4", ".mov"
+}
+
+# ZIP格式能表示的最早时间
+_ZIP_MIN_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+class _ChunkSink:
+    """zipfile 的输出目标：只追加，不支持回退，产出的数据由生成器取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(filename: str) -> int:
+    """按文件类型选择存储或deflate压缩"""
+    return zipfile.ZIP_STORED if Path(filename).suffix.lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def _unique_name(name: str, used: Set[str]) -> str:
+    """压缩包内文件名重复时追加序号：a.json、a (2).json ..."""
+    candidate, index = name, 1
+    stem, suffix = Path(name).stem, Path(name).suffix
+    while candidate in used:
+        index += 1
+        candidate = f"{stem} ({index}){suffix}"
+    used.add(candidate)
+    return candidate
+
+
+def iter_zip(files: Iterable[Tuple[Path, str]]) -> Iterator[bytes]:
+    """将 (文件路径, 压缩包内文件名) 依次写入ZIP，流式产出压缩包数据"""
+    sink = _ChunkSink()
+    used: Set[str] = set()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for path, name in files:
+            stat = path.stat()
+            info = zipfile.ZipInfo(_unique_name(name, used), max(time.localtime(stat.st_mtime)[:6], _ZIP_MIN_DATE))
+            info.compress_type = compress_type_for(name)
+            # 预先给出文件大小，超过4GB时 zipfile 自动为该文件使用ZIP64
+            info.file_size = stat.st_size
+            with open(path, 'rb') as source, archive.open(info, 'w') as target:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = sink.take()
+                    if data:
+                        yield data
+            data = sink.take()
+            if data:
+                yield data
+    # 中央目录
+    yield sink.take()
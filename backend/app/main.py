@@ -1,3 +1,5 @@
+import threading
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, HTMLResponse
@@ -6,7 +8,14 @@ from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 
 from .config import settings, ensure_data_directories
 from .api import api_router
+from .api.annotations import prewarm_templates
+from .core.change_log import get_change_log
 from .core.security import create_initial_admin
+from .core.template_worker import get_template_worker_pool
+from .core.logger import setup_logging
+
+# 初始化日志
+setup_logging()
 
 # 确保数据目录存在
 ensure_data_directories()
@@ -37,6 +46,33 @@ app.add_middleware(
 app.include_router(api_router)
 
 
+@app.on_event("startup")
+async def start_template_workers():
+    """预先启动模板工作进程"""
+    if settings.template_worker_enabled:
+        get_template_worker_pool().start()
+
+
+@app.on_event("startup")
+async def start_template_prewarm():
+    """在后台预热最近任务使用的模板，不阻塞启动"""
+    if settings.template_prewarm_enabled:
+        threading.Thread(target=prewarm_templates, name="template-prewarm", daemon=True).start()
+
+
+@app.on_event("startup")
+async def load_change_log():
+    """加载数据变更日志，首次启动时根据已有标注文件生成"""
+    get_change_log()
+
+
+@app.on_event("shutdown")
+async def stop_template_workers():
+    """关闭模板工作进程"""
+    if settings.template_worker_enabled:
+        get_template_worker_pool().close()
+
+
 @app.get("/docs", include_in_schema=False)
 async def custom_swagger_ui_html():
     """自定义Swagger UI页面，使用国内CDN"""
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from enum import Enum
 
 
@@ -36,12 +36,43 @@ class FileUpload(BaseModel):
     message: str
 
 
+class PreviewUnit(str, Enum):
+    """分页预览的单位"""
+    BYTES = "bytes"
+    RECORDS = "records"  # JSONL的行、JSON顶层数组的元素
+
+
+class ChunkedUploadCreate(BaseModel):
+    """创建分片上传请求模型"""
+    filename: str = Field(..., min_length=1)
+    file_type: FileType
+    total_size: int = Field(..., ge=0)
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")  # 整个文件的SHA-256，完成上传时核对
+
+
+class ChunkedUploadStatus(BaseModel):
+    """分片上传进度模型"""
+    upload_id: str
+    filename: str
+    file_type: FileType
+    total_size: int
+    chunk_size: int  # 单个分片的大小上限
+    received: int  # 已连续接收的字节数，下一个分片从这里开始
+    sha256: Optional[str] = None  # 全部接收后为已接收内容的SHA-256
+    expires_at: float  # 会话过期时间（时间戳），每次上传分片后顺延
+
+
 class FilePreview(BaseModel):
     """文件预览模型"""
     filename: str
     content: str
     file_type: str
     file_size: int
+    unit: PreviewUnit = PreviewUnit.BYTES
+    offset: int = 0  # 本次内容的起始位置（字节位置或记录序号）
+    length: int = 0  # 本次内容对应的字节数或记录数
+    next_offset: Optional[int] = None  # 下一页的起始位置，已到文件末尾时为None
+    total_records: Optional[int] = None  # 按记录预览时的记录总数，文件没有记录索引时为None
 
 
 class FileListResponse(BaseModel):
@@ -66,12 +97,21 @@ class TemplateValidationResponse(BaseModel):
     annotation_fields: Optional[List[Dict[str, Any]]] = None
 
 
+class BatchFileUploadResult(BaseModel):
+    """批量上传中单个文件的结果"""
+    filename: str
+    success: bool
+    file_id: Optional[str] = None
+    error: Optional[str] = None
+
+
 class BatchFileUpload(BaseModel):
     """批量文件上传响应模型"""
     successful_uploads: List[FileUpload]
     failed_uploads: List[Dict[str, str]]
     total_uploaded: int
     total_failed: int
+    results: List[BatchFileUploadResult] = []  # 按提交顺序的每个文件的结果
 
 
 class FileDownloadInfo(BaseModel):
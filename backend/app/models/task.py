@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from pydantic import BaseModel, Field
 from enum import Enum
 
@@ -26,6 +26,7 @@ class TaskDocument(BaseModel):
     status: DocumentStatus = DocumentStatus.PENDING
     file_size: Optional[int] = None
     created_at: Optional[datetime] = None
+    needs_rework: bool = False  # 重新校验未通过，需要返工
 
 
 class TaskTemplate(BaseModel):
@@ -107,4 +108,81 @@ class TaskStatistics(BaseModel):
     pending_tasks: int
     in_progress_tasks: int
     completed_tasks: int
-    my_tasks: int  # 分配给当前用户的任务数 
\ No newline at end of file
+    my_tasks: int  # 分配给当前用户的任务数 
+
+
+class ValidationJobStatus(str, Enum):
+    """后台校验任务状态枚举"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class ValidationJobProgress(BaseModel):
+    """后台校验任务进度模型"""
+    documents_total: int = 0
+    documents_done: int = 0
+    records_total: int = 0  # 已知的记录总数（文档打开后才能确定）
+    records_done: int = 0
+    invalid_records: int = 0
+    error_count: int = 0
+    bytes_total: int = 0
+    bytes_done: int = 0
+    percentage: float = 0.0
+    elapsed_seconds: float = 0.0
+    eta_seconds: Optional[float] = None  # 预计剩余时间（秒）
+
+
+class ValidationJobInfo(BaseModel):
+    """后台校验任务响应模型"""
+    job_id: str
+    status: ValidationJobStatus
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    progress: ValidationJobProgress
+    result: Optional[Dict[str, Any]] = None  # 成功时包含创建的任务ID
+    error: Optional[str] = None
+    errors: Optional[List[Dict[str, Any]]] = None
+
+
+class RevalidationRequest(BaseModel):
+    """批量重新校验请求模型"""
+    template_path: Optional[str] = None  # 按模板重新校验时指定，校验所有使用该模板的任务
+    mark_rework: bool = True  # 是否将未通过的文档标记为需要返工
+
+
+class MigrationPlanRequest(BaseModel):
+    """模板迁移计划请求模型"""
+    old_template_path: str
+    new_template_path: str
+
+
+class MigrationJobRequest(MigrationPlanRequest):
+    """模板迁移任务请求模型"""
+    task_ids: Optional[List[str]] = None  # 为空时迁移所有使用旧模板的任务
+    operations: Optional[List[Dict[str, Any]]] = None  # 调整后的迁移操作，为空时按模板差异自动生成
+    dry_run: bool = False  # 只统计会被改写的文件，不写入
+    switch_template: bool = True  # 迁移完成且没有失败文件时，将任务模板切换为新模板
+
+
+class ExportFormat(str, Enum):
+    """导出格式枚举"""
+    JSONL = "jsonl"
+    CSV = "csv"  # 按模板标注字段展开的表格
+    TSV = "tsv"
+
+
+class ExportRequest(BaseModel):
+    """任务数据导出请求模型"""
+    format: ExportFormat = ExportFormat.JSONL
+    stream: bool = False  # 直接以流式响应返回数据，不生成导出文件
+    gzip: bool = False  # 是否gzip压缩
+    since: Optional[Union[int, str]] = None  # 水位（变更序号或ISO格式时间），只导出之后有变更的文档
+
+
+class BatchExportRequest(ExportRequest):
+    """多任务数据导出请求模型"""
+    task_ids: List[str] = Field(..., min_length=1)